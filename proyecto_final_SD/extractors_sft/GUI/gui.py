@@ -2,14 +2,12 @@ import sys
 import os
 from pathlib import Path
 import subprocess
-import io
 import contextlib
 from typing import List, Any, Optional
+import threading
 import traceback
 
-import pika
 import json
-import time
 import datetime
 
 current_dir = Path(__file__).resolve().parent
@@ -24,10 +22,13 @@ from PyQt5.QtWidgets import (
     QFileDialog, QTextEdit, QLabel, QProgressBar, QListWidget, QListWidgetItem,
     QFrame, QStatusBar, QMessageBox, QSizePolicy, QTabWidget, QSpacerItem
 )
-from PyQt5.QtCore import QThread, pyqtSignal, Qt, QSize
+from PyQt5.QtCore import QThread, QTimer, pyqtSignal, Qt, QSize
 from PyQt5.QtGui import QFont, QPixmap, QDragEnterEvent, QDragLeaveEvent, QDropEvent
 
-from main import procesar_archivos, load_config, resource_path
+from main import procesar_archivos, procesar_lote, load_config, resource_path, start_main_metrics_server
+from progress import BatchProgress, LineWriter, LogRingBuffer, describe_progress
+from logger import flush_logs
+from transport import STATUS_QUEUE_NAME, TransportUnavailable, configure_transport, get_transport
 
 APP_TITLE = "GRUPO CEPAS INTL. - Procesador de Archivos PDF v2.0"
 HEADER_TITLE_TEXT = "Procesador de Archivos PDF"
@@ -48,6 +49,7 @@ STATUS_SELECTION_CANCELLED = "Selección de archivos cancelada."
 STATUS_PROCESSING_STARTED = "Iniciando procesamiento..."
 STATUS_PROCESSING_COMPLETE = "Procesamiento completo."
 STATUS_PROCESSING_ERROR = "Error durante el procesamiento. Revisa el registro."
+STATUS_WAITING_LOCAL_SERVICE = "Envío terminado. Esperando al servicio local: {0}"
 MSG_WARN_NO_PDFS = "Por favor, seleccione o arrastre archivos PDF para procesar."
 MSG_ERR_OPEN_FOLDER_TITLE = "Error al abrir carpeta"
 MSG_ERR_OPEN_FILE_TITLE = "Error al abrir archivo"
@@ -77,6 +79,10 @@ BORDER_COLOR = "#D1D5DB"
 INPUT_BORDER_FOCUS_COLOR = PRIMARY_COLOR
 PROGRESS_BAR_BACKGROUND_COLOR = "#E5E7EB"
 DRAG_DROP_BORDER_COLOR = "#9CA3AF"
+# El registro se actualiza por tandas cada UI_REFRESH_MS y conserva como mucho LOG_MAX_LINES líneas.
+UI_REFRESH_MS = 200
+LOG_MAX_LINES = 5000
+
 GENERAL_BORDER_RADIUS = "6px"
 SLIM_BORDER_RADIUS = "4px"
 
@@ -103,142 +109,124 @@ DRAG_DROP_FRAME_STYLE_ACTIVE = f"""
     }}
 """
 
-class RabbitMQConsumerThread(QThread):
+class StatusConsumerThread(QThread):
     file_generated_signal = pyqtSignal(str)
     log_signal = pyqtSignal(str)
+    status_event_signal = pyqtSignal(dict)
 
-    def __init__(self, rabbitmq_host: str, queue_name: str):
+    def __init__(self, queue_name: str):
         super().__init__()
-        self.rabbitmq_host = rabbitmq_host
         self.queue_name = queue_name
         self._running = True
-        self.connection = None
-        self.channel = None
+        self._stop_event = threading.Event()
 
     def run(self):
-        while self._running:
+        def callback(ch, method, properties, body):
             try:
-                if self.connection is None or not self.connection.is_open:
-                    self.connection = pika.BlockingConnection(pika.ConnectionParameters(host=self.rabbitmq_host))
-                    self.channel = self.connection.channel()
-                    self.channel.queue_declare(queue=self.queue_name, durable=True)
-                    self.log_signal.emit(f"GUI Consumer: Conectado a RabbitMQ. Escuchando '{self.queue_name}'...")
-
-                def callback(ch, method, properties, body):
-                    if not self._running:
-                        ch.stop_consuming()
-                        return
-
-                    try:
-                        event = json.loads(body)
-
-                        if event.get("type") == "file_generated" and event.get("generated_file_path"):
-                            generated_file_path = event["generated_file_path"]
-                            self.file_generated_signal.emit(generated_file_path)
-                            self.log_signal.emit(f"GUI Consumer: Archivo generado detectado: {Path(generated_file_path).name}")
-                        ch.basic_ack(method.delivery_tag)
-                    except Exception as e:
-                        self.log_signal.emit(f"GUI Consumer ERROR en callback: {e}\n{traceback.format_exc()}")
-                        ch.basic_nack(method.delivery_tag, requeue=True)
-
-                if self.channel and self.channel.is_open:
-                    self.channel.basic_consume(queue=self.queue_name, on_message_callback=callback, auto_ack=False)
-                    self.channel.start_consuming()
-                else:
-                    self.log_signal.emit("GUI Consumer: Canal no disponible o cerrado, reintentando conexión...")
-                    time.sleep(1)
+                event = json.loads(body)
+                self.status_event_signal.emit(event)
+
+                if event.get("type") == "file_generated" and event.get("generated_file_path"):
+                    generated_file_path = event["generated_file_path"]
+                    self.file_generated_signal.emit(generated_file_path)
+                    self.log_signal.emit(f"GUI Consumer: Archivo generado detectado: {Path(generated_file_path).name}")
+                elif event.get("type") == "waiting_for_capacity":
+                    self.log_signal.emit(f"GUI Consumer: Cola llena ({event.get('queue_depth')} mensajes, {event.get('consumer_count')} consumidor(es)), "
+                                         f"envío en pausa hasta bajar a {event.get('low_watermark')}...")
+                elif event.get("type") == "capacity_available":
+                    self.log_signal.emit(f"GUI Consumer: Envío reanudado tras esperar {event.get('waited_seconds')} s por capacidad.")
+                elif event.get("type") == "capacity_unavailable":
+                    self.log_signal.emit(f"GUI Consumer: {Path(event.get('pdf_path') or '').name} no se envió tras esperar {event.get('waited_seconds')} s por capacidad ({event.get('reason')}).")
+                elif event.get("type") in ("pdf_processing_timeout", "pdf_rejected"):
+                    self.log_signal.emit(f"GUI Consumer: {Path(event.get('pdf_path') or '').name} cancelado: {event.get('error_message')}")
+                elif event.get("type") == "pdf_processing_retry":
+                    self.log_signal.emit(f"GUI Consumer: {Path(event.get('pdf_path') or '').name} falló (intento {event.get('attempt')} de {event.get('max_attempts')}), se reintentará.")
+                ch.basic_ack(method.delivery_tag)
+            except Exception as e:
+                self.log_signal.emit(f"GUI Consumer ERROR en callback: {e}\n{traceback.format_exc()}")
+                ch.basic_nack(method.delivery_tag, requeue=True)
 
-            except pika.exceptions.AMQPConnectionError as e:
-                self.log_signal.emit(f"GUI Consumer ERROR: No se pudo conectar a RabbitMQ: {e}. Reintentando en 5s...")
-                self._close_connection()
-                time.sleep(5)
+        transport = get_transport()
+        while self._running:
+            try:
+                self.log_signal.emit(f"GUI Consumer: Escuchando '{self.queue_name}' ({transport.describe()})...")
+                transport.consume(self.queue_name, callback, self._stop_event)
+            except TransportUnavailable as e:
+                self.log_signal.emit(f"GUI Consumer ERROR: {e}. Reintentando en 5s...")
+                self._stop_event.wait(5)
             except Exception as e:
                 self.log_signal.emit(f"GUI Consumer ERROR CRÍTICO: {e}\n{traceback.format_exc()}")
-                self._close_connection()
-                time.sleep(5)
+                self._stop_event.wait(5)
         self.log_signal.emit("GUI Consumer: Hilo de consumo finalizado.")
 
     def stop(self):
         self.log_signal.emit("GUI Consumer: Solicitando detener hilo...")
         self._running = False
-        if self.channel and self.channel.is_open:
-            try:
-                self.connection.add_callback_threadsafe(self.channel.stop_consuming)
-            except Exception as e:
-                self.log_signal.emit(f"GUI Consumer: Error al intentar detener consumo: {e}")
-        self._close_connection()
-
-    def _close_connection(self):
-        if self.connection and self.connection.is_open:
-            self.log_signal.emit("GUI Consumer: Cerrando conexión RabbitMQ...")
-            try:
-                self.connection.close()
-            except Exception as e:
-                self.log_signal.emit(f"GUI Consumer: Error al cerrar conexión: {e}")
-            self.connection = None
-            self.channel = None
+        self._stop_event.set()
 
 class Worker(QThread):
     log_signal = pyqtSignal(str)
     done_signal = pyqtSignal(int, int, list)
-    progress_signal = pyqtSignal(int)
 
-    def __init__(self, pdf_paths: List[Path], output_dir: Path, config: Any):
+    def __init__(self, pdf_paths: List[Path], output_dir: Path, config: Any, progress: BatchProgress, log_buffer: LogRingBuffer):
         super().__init__()
         self.pdf_paths = pdf_paths
         self.output_dir = output_dir
         self.config = config
+        self.progress = progress
+        self.log_buffer = log_buffer
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        # Corta el envío de lo que falta, también si está esperando capacidad de la cola.
+        self.cancel_event.set()
 
     def run(self):
+        from batch_output import resolve_batch_mode
+
         total_pdfs = len(self.pdf_paths)
         if total_pdfs == 0:
-            self.progress_signal.emit(0)
             self.done_signal.emit(0, 0, [])
             return
 
+        batch_mode = resolve_batch_mode((self.config or {}).get("batch_output", {}).get("mode"))
         initial_files_in_output = set()
         try:
             self.output_dir.mkdir(parents=True, exist_ok=True)
-            initial_files_in_output = {f.name for f in self.output_dir.iterdir() if f.is_file()}
+            if not batch_mode:
+                initial_files_in_output = {f.name for f in self.output_dir.iterdir() if f.is_file()}
         except OSError as e:
             self.log_signal.emit(f"Error Crítico: No se pudo acceder o crear el directorio de salida '{self.output_dir}': {e}")
-            self.progress_signal.emit(100)
             self.done_signal.emit(0, total_pdfs, [])
             return
 
-        log_buffer = io.StringIO()
+        # La salida de main va línea por línea al buffer acotado que la ventana vacía periódicamente, y el avance
+        # de cada archivo llega por el callback progress.
+        writer = LineWriter(self.log_buffer)
         newly_generated_files: List[Path] = []
-        log_output_from_main = ""
 
         try:
             self.log_signal.emit(f"Iniciando procesamiento de {total_pdfs} PDF(s)...")
-            with contextlib.redirect_stdout(log_buffer):
-                procesar_archivos(self.pdf_paths, self.output_dir, self.config)
-
-            log_output_from_main = log_buffer.getvalue()
-            if log_output_from_main:
-                self.log_signal.emit(log_output_from_main.strip())
-
-            current_files_in_output = {self.output_dir / f.name for f in self.output_dir.iterdir() if f.is_file()}
-            for file_path in current_files_in_output:
-                if file_path.name not in initial_files_in_output:
-                    if file_path.suffix.lower() in ('.xlsx', '.txt'):
-                        newly_generated_files.append(file_path)
-
-            if not (self.config and self.config.get("simulated_config")):
-                 self.progress_signal.emit(100)
+            with contextlib.redirect_stdout(writer):
+                if batch_mode:
+                    newly_generated_files = procesar_lote(self.pdf_paths, self.output_dir, self.config, batch_mode, progress=self.progress.handle_event)
+                else:
+                    procesar_archivos(self.pdf_paths, self.output_dir, self.config, progress=self.progress.handle_event, cancel=self.cancel_event)
+
+            if not batch_mode:
+                current_files_in_output = {self.output_dir / f.name for f in self.output_dir.iterdir() if f.is_file()}
+                for file_path in current_files_in_output:
+                    if file_path.name not in initial_files_in_output:
+                        if file_path.suffix.lower() in ('.xlsx', '.txt', '.parquet', '.csv', '.ndjson'):
+                            newly_generated_files.append(file_path)
         except Exception as e:
             self.log_signal.emit(f"ERROR CRÍTICO DURANTE EL PROCESAMIENTO: {type(e).__name__} - {e}")
             detailed_error_info = traceback.format_exc()
             self.log_signal.emit(detailed_error_info)
-            log_output_before_crash = log_buffer.getvalue()
-            if log_output_before_crash and not log_output_from_main:
-                 self.log_signal.emit("Salida (antes del error):\n" + log_output_before_crash.strip())
         finally:
-            if not (self.config and self.config.get("simulated_config")):
-                self.progress_signal.emit(100)
-            elif total_pdfs > 0 :
-                 self.progress_signal.emit(100)
+            # Los registros encolados durante la redirección siguen yendo a writer aunque se escriban después.
+            flush_logs()
+            writer.flush()
             self.done_signal.emit(len(newly_generated_files), total_pdfs, newly_generated_files)
 
 class PDFProcessorMainWindow(QMainWindow):
@@ -264,16 +252,22 @@ class PDFProcessorMainWindow(QMainWindow):
         self.pdf_paths: List[Path] = []
         self.worker_thread: Optional[Worker] = None
         self.processing_had_error = False
+        self.progress_tracker: Optional[BatchProgress] = None
+        self._shown_progress_version = -1
+        self.log_buffer = LogRingBuffer(LOG_MAX_LINES)
         self._apply_stylesheet()
         self._init_ui()
+        self.ui_timer = QTimer(self)
+        self.ui_timer.setInterval(UI_REFRESH_MS)
+        self.ui_timer.timeout.connect(self._flush_ui)
         self.setAcceptDrops(True)
         self.status_bar.showMessage(STATUS_APP_READY)
 
-        RABBITMQ_HOST = 'localhost'
-        RABBITMQ_STATUS_QUEUE_NAME = 'system_status_queue'
-        self.consumer_thread = RabbitMQConsumerThread(RABBITMQ_HOST, RABBITMQ_STATUS_QUEUE_NAME)
+        configure_transport(self.config.get("transport"))
+        self.consumer_thread = StatusConsumerThread(STATUS_QUEUE_NAME)
         self.consumer_thread.file_generated_signal.connect(self._add_generated_file_to_list)
         self.consumer_thread.log_signal.connect(self.log)
+        self.consumer_thread.status_event_signal.connect(self._handle_status_event)
         self.consumer_thread.start()
 
     def _apply_stylesheet(self) -> None:
@@ -400,6 +394,7 @@ class PDFProcessorMainWindow(QMainWindow):
         log_layout.setContentsMargins(0, 2, 0, 0)
         self.log_output = QTextEdit()
         self.log_output.setReadOnly(True)
+        self.log_output.document().setMaximumBlockCount(LOG_MAX_LINES)
         self.log_output.setFont(QFont("Menlo", 10) if sys.platform == "darwin" else QFont("Consolas", 10))
         self.log_output.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         self.log_output.setMinimumHeight(150)
@@ -504,15 +499,53 @@ class PDFProcessorMainWindow(QMainWindow):
             self._update_generated_files_buttons_state()
             return
         self.log(f"Archivos de salida se guardarán en: {self.output_dir.resolve()}")
-        self.worker_thread = Worker(list(self.pdf_paths), self.output_dir, self.config)
+        self.log_buffer.drain()
+        self.progress_tracker = BatchProgress(self.pdf_paths)
+        self._shown_progress_version = -1
+        self.worker_thread = Worker(list(self.pdf_paths), self.output_dir, self.config, self.progress_tracker, self.log_buffer)
         self.worker_thread.log_signal.connect(self.handle_worker_log)
-        self.worker_thread.progress_signal.connect(self.update_progress)
         self.worker_thread.done_signal.connect(self.processing_finished_ui_update)
         self.worker_thread.start()
+        self.ui_timer.start()
 
     def update_progress(self, value: int) -> None:
         self.progress_bar.setValue(value)
 
+    def _handle_status_event(self, event: dict) -> None:
+        # Finalizaciones asíncronas del servicio local: se cuentan aquí y se pintan en el próximo _flush_ui.
+        if self.progress_tracker:
+            self.progress_tracker.handle_event(event)
+
+    def _flush_ui(self) -> None:
+        lines, dropped = self.log_buffer.drain()
+        if dropped:
+            lines.insert(0, f"... {dropped} línea(s) de registro omitidas ...")
+        if lines:
+            if any("ERROR CRÍTICO" in line.upper() or "ERROR:" in line.upper() for line in lines):
+                self.processing_had_error = True
+            timestamp = datetime.datetime.now().strftime('%H:%M:%S')
+            self.log_output.append("\n".join(f"[{timestamp}] {line.strip()}" for line in lines))
+            self.log_output.verticalScrollBar().setValue(self.log_output.verticalScrollBar().maximum())
+
+        if not self.progress_tracker:
+            self.ui_timer.stop()
+            return
+        if self.progress_tracker.version != self._shown_progress_version:
+            self._shown_progress_version = self.progress_tracker.version
+            snapshot = self.progress_tracker.snapshot()
+            self.update_progress(snapshot["percent"])
+            if self.worker_thread is not None:
+                self.status_bar.showMessage(describe_progress(snapshot))
+            elif snapshot["finished"]:
+                self._processing_complete()
+            else:
+                self.status_bar.showMessage(STATUS_WAITING_LOCAL_SERVICE.format(describe_progress(snapshot)))
+
+    def _processing_complete(self) -> None:
+        self.ui_timer.stop()
+        self.progress_tracker = None
+        self.status_bar.showMessage(STATUS_PROCESSING_ERROR if self.processing_had_error else STATUS_PROCESSING_COMPLETE)
+
     def log(self, message: str) -> None:
         if hasattr(self, 'log_output') and self.log_output:
              self.log_output.append(f"[{datetime.datetime.now().strftime('%H:%M:%S')}] {message.strip()}")
@@ -526,6 +559,7 @@ class PDFProcessorMainWindow(QMainWindow):
             self.processing_had_error = True
 
     def processing_finished_ui_update(self, processed_file_count_from_worker: int, total_pdfs_processed: int, generated_file_paths: List[Path]) -> None:
+        self._flush_ui()
         self.log(f"\nProcesamiento finalizado.")
         actual_generated_count = len(generated_file_paths)
         if total_pdfs_processed > 0 :
@@ -541,13 +575,21 @@ class PDFProcessorMainWindow(QMainWindow):
                 self.generated_files_list.addItem(item)
         elif total_pdfs_processed > 0 and not self.processing_had_error:
             self.log("El proceso principal no generó nuevos archivos directamente en esta ejecución (posiblemente encolados).")
+        # done_signal se emite al final de run(): se espera a que el hilo termine antes de soltar la referencia.
+        if self.worker_thread is not None:
+            self.worker_thread.wait()
         self.worker_thread = None
         self._update_process_button_state()
         self._update_generated_files_buttons_state()
-        if self.processing_had_error:
-            self.status_bar.showMessage(STATUS_PROCESSING_ERROR)
+        snapshot = self.progress_tracker.snapshot() if self.progress_tracker else None
+        if snapshot and not snapshot["finished"] and snapshot["in_flight"]:
+            # Quedan documentos en el servicio local: la barra sigue avanzando con system_status_queue.
+            self.update_progress(snapshot["percent"])
+            self.status_bar.showMessage(STATUS_WAITING_LOCAL_SERVICE.format(describe_progress(snapshot)))
         else:
-            self.status_bar.showMessage(STATUS_PROCESSING_COMPLETE)
+            if snapshot:
+                self.update_progress(100)
+            self._processing_complete()
 
     def _add_generated_file_to_list(self, file_path_str: str) -> None:
         file_path_obj = Path(file_path_str)
@@ -638,8 +680,9 @@ class PDFProcessorMainWindow(QMainWindow):
             reply = QMessageBox.question(self, MSG_PROCESSING_ONGOING_EXIT_TITLE, MSG_PROCESSING_ONGOING_EXIT_TEXT,
                                            QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
             if reply == QMessageBox.Yes:
+                self.worker_thread.cancel()
                 if self.consumer_thread and self.consumer_thread.isRunning():
-                    self.log("Cerrando hilo consumidor de RabbitMQ...")
+                    self.log("Cerrando hilo consumidor de eventos de estado...")
                     self.consumer_thread.stop()
                     self.consumer_thread.wait(5000)
                     if self.consumer_thread.isRunning():
@@ -649,7 +692,7 @@ class PDFProcessorMainWindow(QMainWindow):
                 event.ignore()
         else:
             if self.consumer_thread and self.consumer_thread.isRunning():
-                self.log("Cerrando hilo consumidor de RabbitMQ...")
+                self.log("Cerrando hilo consumidor de eventos de estado...")
                 self.consumer_thread.stop()
                 self.consumer_thread.wait(5000)
                 if self.consumer_thread.isRunning():
@@ -667,4 +710,5 @@ if __name__ == "__main__":
         print(f"Advertencia: No se pudieron establecer las fuentes preferidas ({e}). Usando fuente del sistema.")
     window = PDFProcessorMainWindow()
     window.show()
+    QTimer.singleShot(0, start_main_metrics_server)
     sys.exit(app.exec_())
\ No newline at end of file
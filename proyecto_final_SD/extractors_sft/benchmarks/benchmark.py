@@ -0,0 +1,222 @@
+import argparse
+import datetime
+import json
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+EXTRACTORS_SFT_ROOT = BENCHMARKS_DIR.parent
+SRC_DIR = EXTRACTORS_SFT_ROOT / "src"
+HENDERSON_DIR = EXTRACTORS_SFT_ROOT.parent / "henderson_microservice"
+
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+from memory_guard import RssSampler
+
+DEFAULT_DATA_DIR = EXTRACTORS_SFT_ROOT / "data"
+DEFAULT_RESULTS_DIR = BENCHMARKS_DIR / "results"
+DEFAULT_BASELINE = BENCHMARKS_DIR / "baseline.json"
+DEFAULT_THRESHOLD = 0.20
+
+STAGES = ("detection", "extraction", "transform", "to_excel", "write_artifacts")
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+def timed(func, *args):
+    with RssSampler() as sampler:
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+    return result, elapsed, sampler.peak
+
+
+def load_henderson_extractor():
+    if str(HENDERSON_DIR) not in sys.path:
+        sys.path.insert(0, str(HENDERSON_DIR))
+    try:
+        from app_h import extract_henderson_logic
+        return lambda pdf_path: extract_henderson_logic(Path(pdf_path).read_bytes())
+    except Exception as e:
+        print(f"ADVERTENCIA: No se pudo importar el extractor de Henderson ({e}); se omitirán sus PDFs.")
+        return None
+
+
+def vendor_of(extractor_name: str) -> str:
+    if extractor_name == "call_henderson_microservice":
+        return "henderson"
+    return extractor_name.replace("extract_", "")
+
+
+def run_benchmark(data_dir: Path, repeticiones: int, stages=STAGES) -> dict:
+    import pdfplumber
+    from main import get_extractor_for, load_config
+    from transformer import transform
+    from amounts import format_amount_columns
+    from excel_generator import to_excel
+    from output_sinks import write_artifacts, write_atomically
+
+    config = load_config()
+    henderson_extractor = load_henderson_extractor()
+    pdfs = sorted(data_dir.glob("*.pdf"))
+    muestras = {}
+
+    def registrar(stage, vendor, elapsed, rss, pages, rows):
+        entrada = muestras.setdefault((stage, vendor), {"latencias": [], "pages": 0, "rows": 0, "peak_rss": 0})
+        entrada["latencias"].append(elapsed)
+        entrada["pages"] += pages
+        entrada["rows"] += rows
+        entrada["peak_rss"] = max(entrada["peak_rss"], rss)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for pdf_path in pdfs:
+            with pdfplumber.open(pdf_path) as pdf:
+                pages = len(pdf.pages)
+
+            for _ in range(repeticiones):
+                extractor_func, elapsed, rss = timed(get_extractor_for, pdf_path, config)
+                extractor_name = extractor_func.__name__
+                vendor = vendor_of(extractor_name)
+                if "detection" in stages:
+                    registrar("detection", vendor, elapsed, rss, pages, 0)
+
+                if extractor_name == "call_henderson_microservice":
+                    if henderson_extractor is None:
+                        break
+                    extractor_func = henderson_extractor
+
+                df, elapsed, rss = timed(extractor_func, pdf_path)
+                rows = len(df)
+                if "extraction" in stages:
+                    registrar("extraction", vendor, elapsed, rss, pages, rows)
+
+                if extractor_name != "extract_GDU" and any("Monto" in col for col in df.columns):
+                    df, elapsed, rss = timed(transform, df)
+                    if "transform" in stages:
+                        registrar("transform", vendor, elapsed, rss, pages, rows)
+
+                if df.empty:
+                    continue
+
+                # Igual que en el pipeline: el Excel se escribe en un temporal y se renombra.
+                output_file = Path(tmp_dir) / f"{pdf_path.stem}_output.xlsx"
+                frame = format_amount_columns(df)
+                _, elapsed, rss = timed(write_atomically, output_file, lambda tmp: to_excel(frame, str(tmp)))
+                if "to_excel" in stages:
+                    registrar("to_excel", vendor, elapsed, rss, pages, rows)
+
+                # Etapa de salida completa de un documento: Excel y validación en paralelo desde el DataFrame.
+                _, elapsed, rss = timed(write_artifacts, df, Path(tmp_dir), pdf_path.stem, ["xlsx"], pdf_path.name, extractor_name)
+                if "write_artifacts" in stages:
+                    registrar("write_artifacts", vendor, elapsed, rss, pages, rows)
+
+    resultados = {}
+    for (stage, vendor), entrada in sorted(muestras.items()):
+        latencias = entrada["latencias"]
+        total = sum(latencias)
+        resultados[f"{stage}/{vendor}"] = {
+            "stage": stage,
+            "vendor": vendor,
+            "samples": len(latencias),
+            "p50_seconds": percentile(latencias, 50),
+            "p95_seconds": percentile(latencias, 95),
+            "mean_seconds": total / len(latencias),
+            "pages_per_second": entrada["pages"] / total if total else 0.0,
+            "rows_per_second": entrada["rows"] / total if total else 0.0,
+            "peak_rss_mb": round(entrada["peak_rss"] / (1024 * 1024), 1),
+        }
+
+    return {
+        "generated_at": datetime.datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "data_dir": str(data_dir),
+        "documents": len(pdfs),
+        "repetitions": repeticiones,
+        "results": resultados,
+    }
+
+
+def compare_with_baseline(actual: dict, baseline: dict, threshold: float, metric: str = "p50_seconds") -> list[str]:
+    regresiones = []
+    for key, base in baseline.get("results", {}).items():
+        medido = actual["results"].get(key)
+        if not medido or not base.get(metric):
+            continue
+        cambio = (medido[metric] - base[metric]) / base[metric]
+        if cambio > threshold:
+            regresiones.append(f"{key}: {metric} {base[metric]:.4f}s -> {medido[metric]:.4f}s (+{cambio:.0%})")
+    return regresiones
+
+
+def print_report(reporte: dict):
+    print(f"{'etapa/proveedor':<32}{'n':>4}{'p50 s':>10}{'p95 s':>10}{'pág/s':>10}{'filas/s':>11}{'RSS MB':>9}")
+    for key, r in reporte["results"].items():
+        print(f"{key:<32}{r['samples']:>4}{r['p50_seconds']:>10.4f}{r['p95_seconds']:>10.4f}"
+              f"{r['pages_per_second']:>10.1f}{r['rows_per_second']:>11.1f}{r['peak_rss_mb']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de detección, extractores, transform, to_excel y write_artifacts sobre el corpus de PDFs.")
+    parser.add_argument("--data", type=Path, default=DEFAULT_DATA_DIR, help="Directorio con los PDFs del corpus")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Repeticiones por documento")
+    parser.add_argument("--salida", type=Path, default=None, help="Archivo JSON de resultados")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="JSON de referencia para comparar")
+    parser.add_argument("--umbral", type=float, default=DEFAULT_THRESHOLD, help="Regresión tolerada (0.20 = 20%%)")
+    parser.add_argument("--metrica", default="p50_seconds", choices=["p50_seconds", "p95_seconds", "mean_seconds"])
+    parser.add_argument("--guardar-baseline", action="store_true", help="Guardar este resultado como nuevo baseline")
+    parser.add_argument("--almacen-texto", type=Path, default=None,
+                        help="Leer el texto de las páginas de este almacén (mide la re-extracción); por defecto se parsea siempre el PDF")
+    args = parser.parse_args()
+
+    from text_store import configure_text_store
+    configure_text_store(enabled=args.almacen_texto is not None, path=args.almacen_texto)
+    # Se mide el parseo en este proceso, sin el proceso aislado de deadlines.py.
+    from deadlines import configure_deadlines
+    configure_deadlines(enabled=False)
+    # write_artifacts agrega cada documento al índice histórico: las repeticiones no deben quedar registradas.
+    from reference_index import configure_reference_index
+    configure_reference_index(enabled=False)
+
+    reporte = run_benchmark(args.data, args.repeticiones)
+    print_report(reporte)
+
+    salida = args.salida or DEFAULT_RESULTS_DIR / f"benchmark_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    salida.parent.mkdir(parents=True, exist_ok=True)
+    salida.write_text(json.dumps(reporte, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"\nResultados guardados en: {salida}")
+
+    if args.guardar_baseline:
+        args.baseline.write_text(json.dumps(reporte, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"Baseline actualizado: {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print(f"Sin baseline en {args.baseline}; usar --guardar-baseline para crearlo.")
+        return 0
+
+    regresiones = compare_with_baseline(reporte, json.loads(args.baseline.read_text(encoding="utf-8")), args.umbral, args.metrica)
+    if regresiones:
+        print(f"\nREGRESIONES (umbral {args.umbral:.0%}):")
+        for r in regresiones:
+            print(f"  {r}")
+        return 1
+
+    print(f"\nSin regresiones respecto al baseline (umbral {args.umbral:.0%}).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
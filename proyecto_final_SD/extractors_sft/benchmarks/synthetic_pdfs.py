@@ -0,0 +1,412 @@
+import argparse
+import json
+import random
+import sys
+import zlib
+from pathlib import Path
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+EXTRACTORS_SFT_ROOT = BENCHMARKS_DIR.parent
+SRC_DIR = EXTRACTORS_SFT_ROOT / "src"
+
+DEFAULT_OUTPUT_DIR = BENCHMARKS_DIR / "synthetic"
+
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+MARGIN_TOP = 800
+MARGIN_LEFT = 40
+LINE_HEIGHT = 14
+FONT_SIZE = 9
+ROWS_PER_PAGE = 48
+
+
+class SimplePdf:
+    # Escritor PDF mínimo (Helvetica + WinAnsiEncoding), suficiente para que pdfplumber extraiga texto y tablas.
+    def __init__(self, title: str = "", producer: str = "FinExtract synthetic generator"):
+        self.pages = []
+        self.title = title
+        self.producer = producer
+
+    @staticmethod
+    def _escape(text: str) -> bytes:
+        raw = text.encode("cp1252", errors="replace")
+        return raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+    def add_page(self, lines: list[str], table: list[list[str]] = None, column_x: list[int] = None):
+        ops = [b"BT", f"/F1 {FONT_SIZE} Tf".encode()]
+        y = MARGIN_TOP
+        for line in lines:
+            ops.append(f"1 0 0 1 {MARGIN_LEFT} {y} Tm".encode() + b" (" + self._escape(line) + b") Tj")
+            y -= LINE_HEIGHT
+        ops.append(b"ET")
+
+        if table:
+            top = y - LINE_HEIGHT
+            ops.append(b"0.5 w")
+            for i in range(len(table) + 1):
+                row_y = top - i * LINE_HEIGHT
+                ops.append(f"{column_x[0]} {row_y} m {column_x[-1]} {row_y} l S".encode())
+            bottom = top - len(table) * LINE_HEIGHT
+            for x in column_x:
+                ops.append(f"{x} {top} m {x} {bottom} l S".encode())
+            ops.append(b"BT")
+            ops.append(f"/F1 {FONT_SIZE} Tf".encode())
+            for i, row in enumerate(table):
+                baseline = top - i * LINE_HEIGHT - 10
+                for col, value in enumerate(row):
+                    ops.append(f"1 0 0 1 {column_x[col] + 3} {baseline} Tm".encode() + b" (" + self._escape(value) + b") Tj")
+            ops.append(b"ET")
+
+        self.pages.append(b"\n".join(ops))
+
+    def save(self, path: Path):
+        objects = []
+
+        def add(obj: bytes) -> int:
+            objects.append(obj)
+            return len(objects)
+
+        catalog_id = add(b"")
+        pages_id = add(b"")
+        font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+        info_id = add(b"<< /Title (" + self._escape(self.title) + b") /Producer (" + self._escape(self.producer) + b") >>")
+
+        page_ids = []
+        for content in self.pages:
+            data = zlib.compress(content)
+            content_id = add(f"<< /Length {len(data)} /Filter /FlateDecode >>\nstream\n".encode() + data + b"\nendstream")
+            page_ids.append(add(
+                f"<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+                f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {content_id} 0 R >>".encode()
+            ))
+
+        objects[catalog_id - 1] = f"<< /Type /Catalog /Pages {pages_id} 0 R >>".encode()
+        kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+        objects[pages_id - 1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode()
+
+        out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = []
+        for i, obj in enumerate(objects, start=1):
+            offsets.append(len(out))
+            out += f"{i} 0 obj\n".encode() + obj + b"\nendobj\n"
+
+        xref_offset = len(out)
+        out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+        for offset in offsets:
+            out += f"{offset:010d} 00000 n \n".encode()
+        out += f"trailer\n<< /Size {len(objects) + 1} /Root {catalog_id} 0 R /Info {info_id} 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+        Path(path).write_bytes(bytes(out))
+
+
+def fmt_eu(cents: int) -> str:
+    entero, dec = divmod(abs(cents), 100)
+    texto = f"{entero:,}".replace(",", ".") + f",{dec:02d}"
+    return f"-{texto}" if cents < 0 else texto
+
+
+def fmt_plain(cents: int) -> str:
+    entero, dec = divmod(abs(cents), 100)
+    return f"-{entero},{dec:02d}" if cents < 0 else f"{entero},{dec:02d}"
+
+
+def fmt_us(cents: int) -> str:
+    entero, dec = divmod(abs(cents), 100)
+    texto = f"{entero:,}.{dec:02d}"
+    return f"-{texto}" if cents < 0 else texto
+
+
+def ref_digits(rng: random.Random, length: int) -> str:
+    # Primer dígito entre 1 y 6: "a7" es palabra clave de macro_ops y no debe aparecer en otros proveedores.
+    return str(rng.randint(1, 6)) + "".join(str(rng.randint(0, 9)) for _ in range(length - 1))
+
+
+def unique_refs(rng: random.Random, count: int, length: int) -> list[str]:
+    refs = set()
+    while len(refs) < count:
+        refs.add(ref_digits(rng, length))
+    return sorted(refs)
+
+
+def paginate(header: list[str], body: list[str], pages: int) -> list[list[str]]:
+    per_page = max(ROWS_PER_PAGE - len(header), 1)
+    if len(body) > pages * per_page:
+        raise ValueError(f"{len(body)} líneas no entran en {pages} páginas")
+    result = []
+    for i in range(pages):
+        chunk = body[i * per_page:(i + 1) * per_page]
+        result.append((header if i < 2 else header[:1]) + chunk + [f"Página {i + 1} de {pages}"])
+    return result
+
+
+def rows_for(pages: int, header_lines: int) -> int:
+    return pages * max(ROWS_PER_PAGE - header_lines, 1)
+
+
+def gen_polakof(rng, pages):
+    header = ["POLAKOF Y CIA S.A.", "Detalle de documentos cancelados", ""]
+    refs = unique_refs(rng, rows_for(pages, len(header)), 5)
+    expected, body = [], []
+    for ref in refs:
+        ref = f"A{ref}" if rng.random() < 0.2 else ref
+        monto = rng.randint(-90000, 90000) or 100
+        body.append(f"Documento {ref}: {fmt_us(monto)} UYU")
+        expected.append({"Referencia": ref, "Monto": monto})
+    return paginate(header, body, pages), expected
+
+
+def gen_macro_ops(rng, pages):
+    header = ["MACROMERCADO MAYORISTA S.A.", "Detalle de pago - Facturas proveedor", "Fecha Documento Importe Neto"]
+    refs = unique_refs(rng, rows_for(pages, len(header)), 5)
+    expected, body = [], []
+    for ref in refs:
+        neto = rng.randint(1000, 9000000)
+        bruto = int(neto * 1.22)
+        body.append(f"17/01/2025 A{ref} {fmt_eu(bruto)} {fmt_eu(neto)}")
+        expected.append({"Referencia": f"A{ref}", "Monto": neto})
+    return paginate(header, body, pages), expected
+
+
+def gen_ussel_ops(rng, pages):
+    header = ["Estimado proveedor:", "Le informamos el pago correspondiente a la Orden Nº 104522", ""]
+    refs = unique_refs(rng, rows_for(pages, len(header)) // 2, 6)
+    expected, body = [], []
+    for ref in refs:
+        original = rng.randint(-500000, 5000000) or 100
+        body.append(f"FAC Nº {ref} por $ {fmt_eu(original)}")
+        retencion = None
+        if rng.random() < 0.8:
+            retencion = -round(original * 0.09)
+            body.append(f"RR Nº {ref} por $ {fmt_eu(retencion)}")
+        expected.append({"Referencia": ref, "Monto Original": original, "Retención": retencion})
+    return paginate(header, body, pages), expected
+
+
+def gen_bowerey(rng, pages):
+    header = ["Bowerey S.A.", "Comprobante de retenciones", ""]
+    refs = unique_refs(rng, rows_for(pages, len(header)) // 2, 6)
+    expected, body = [], []
+    for ref in refs:
+        importe = rng.randint(10000, 5000000)
+        iva = round(importe * 0.22)
+        retencion = round(iva * 0.6)
+        body.append(f"Glosa {ref}z")
+        body.append(f"Importe {fmt_eu(importe)} IVA {fmt_eu(iva)} Retenido {fmt_eu(retencion)}")
+        expected.append({"Referencia": ref, "Monto": retencion})
+    return paginate(header, body, pages), expected
+
+
+def gen_ussel_res(rng, pages):
+    header = ["e-Resguardo", "Obligaciones tributarias - Dto. 134/2009", ""]
+    refs = unique_refs(rng, rows_for(pages, len(header)), 6)
+    expected, body = [], []
+    for ref in refs:
+        monto = rng.randint(1000, 3000000)
+        body.append(f"FA-{ref} Retención IVA $ {fmt_eu(monto)}")
+        expected.append({"Referencia": ref, "Monto": monto})
+    return paginate(header, body, pages), expected
+
+
+def gen_tata(rng, pages):
+    header = ["TATA S.A.", "e-Resguardo de retenciones", ""]
+    # Igual que los e-Resguardos reales: líneas de la cuenta 2183165, su total y al final la sección de referencias.
+    total_rows = (rows_for(pages, len(header)) - 4) // 2
+    refs = unique_refs(rng, total_rows, 6)
+    montos = [rng.randint(1000, 9000000) for _ in refs]
+    expected, body = [], []
+    for ref, monto in zip(refs, montos):
+        body.append(f"2183165 50,000 {fmt_eu(monto * 2)} {fmt_eu(monto)}")
+        expected.append({"Referencia": ref, "Monto": monto})
+    body.append(f"2183165 {fmt_eu(sum(montos))}")
+    body.append("INFORMACIÓN DE REFERENCIA")
+    for ref in refs:
+        body.append(f"No electrónico, Fac: A{ref}, Fch:")
+    body.append("Resolución DGI Nro. 2379/2012")
+    return paginate(header, body, pages), expected
+
+
+def gen_gdu(rng, pages):
+    header = ["GDU S.A. - LIQUIDACION DE PAGOS", "Total pagos en pesos uruguayos", "Tipo Documento Importe Descuento Retencion"]
+    refs = unique_refs(rng, rows_for(pages, len(header)) - 1, 6)
+    expected, body = [], []
+    for ref in refs:
+        tipo = rng.choices(["FA", "NC", "C.ASU"], weights=[80, 10, 10])[0]
+        monto = rng.randint(10000, 3000000)
+        if tipo == "C.ASU":
+            ref_pdf = f"{ref[:4]}-{rng.randint(0, 9)}"
+            body.append(f"C.ASU {ref_pdf} {fmt_plain(monto)}")
+            expected.append({"Referencia": ref_pdf, "Monto": monto, "Descuento": 0, "Retención": 0, "Tipo": "C.ASU"})
+            continue
+        descuento = -round(monto * 0.097)
+        retencion = -round(monto * 0.09)
+        ref_pdf = f"{ref}-{rng.randint(0, 9)}"
+        if tipo == "FA":
+            body.append(f"Fact {ref_pdf} {fmt_plain(monto)} {fmt_plain(descuento)} {fmt_plain(retencion)}")
+            referencia = f"A-0{ref}"
+        else:
+            monto, descuento, retencion = -monto, -descuento, -retencion
+            body.append(f"Devol {ref_pdf} {fmt_plain(monto)} {fmt_plain(descuento)} {fmt_plain(retencion)}")
+            referencia = ref_pdf
+        expected.append({"Referencia": referencia, "Monto": monto, "Descuento": descuento, "Retención": retencion, "Tipo": tipo})
+    body.append(f"Total General......: $ {fmt_plain(sum(r['Monto'] for r in expected))}")
+    return paginate(header, body, pages), expected
+
+
+HENDERSON_COLUMNS_X = [40, 100, 160, 240, 440, 555]
+
+
+def gen_henderson(rng, pages):
+    header = ["HENDERSON Y CIA", "Sistema MAGMA WIS - Listado de pagos", ""]
+    per_page = ROWS_PER_PAGE - len(header) - 3
+    refs = unique_refs(rng, pages * per_page, 6)
+    expected, tables = [], []
+    for i in range(pages):
+        table = [["Fecha", "Tipo", "Numero", "Descripcion", "Importe"]]
+        for ref in refs[i * per_page:(i + 1) * per_page]:
+            monto = rng.randint(-50000, 5000000) or 100
+            table.append(["14/02/2025", "FC", ref, "Factura proveedor", fmt_us(monto)])
+            expected.append({"Referencia": ref, "Monto": monto})
+        tables.append(table)
+    return [header for _ in range(pages)], expected, tables
+
+
+def gen_macro_res(rng, pages):
+    header = ["MACROMERCADO MAYORISTA S.A.", "Resguardo de retenciones - CFE 182", "Documento Base Retencion"]
+    refs = unique_refs(rng, rows_for(pages, len(header)), 6)
+    expected, body = [], []
+    for ref in refs:
+        prefijo = "A1" if rng.random() < 0.9 else "A2"
+        referencia = f"{prefijo}{ref[1:]}"
+        base = rng.randint(10000, 9000000)
+        retencion = round(base * 0.11)
+        body.append(f"{referencia} CFE {fmt_eu(base)} {fmt_eu(retencion)}")
+        expected.append({"Referencia": referencia, "_base": base, "Retención": retencion})
+
+    prefijos = [r["Referencia"][:2] for r in expected]
+    mayoritario = max(set(prefijos), key=prefijos.count)
+    for r in expected:
+        base = r.pop("_base")
+        # Mismo ajuste que extract_res_macro para prefijos no mayoritarios.
+        r["Monto"] = base if r["Referencia"][:2] == mayoritario else (base * 122 + 50) // 100
+        r["Ajustado"] = "No" if r["Referencia"][:2] == mayoritario else "Sí"
+    return paginate(header, body, pages), expected
+
+
+GENERATORS = {
+    "polakof": (gen_polakof, "extract_polakof"),
+    "macro_ops": (gen_macro_ops, "extract_ops_macro"),
+    "ussel_ops": (gen_ussel_ops, "extract_ops_ussel"),
+    "bowerey": (gen_bowerey, "extract_bowerey"),
+    "ussel_res": (gen_ussel_res, "extract_res_ussel"),
+    "tata": (gen_tata, "extract_tata"),
+    "gdu": (gen_gdu, "extract_GDU"),
+    "henderson": (gen_henderson, "extract_henderson"),
+    "macro_res": (gen_macro_res, "extract_res_macro"),
+}
+
+AMOUNT_FIELDS = ["Monto", "Monto Original", "Descuento", "Retención"]
+
+
+def expected_totals(expected: list[dict]) -> dict:
+    totales = {}
+    for campo in AMOUNT_FIELDS:
+        valores = [r[campo] for r in expected if campo in r and r[campo] is not None]
+        if valores:
+            totales[campo] = sum(valores)
+    return totales
+
+
+def generate(vendor: str, pages: int, output_dir: Path, seed: int = 0) -> tuple[Path, Path]:
+    generator, extractor_name = GENERATORS[vendor]
+    rng = random.Random(f"{vendor}-{pages}-{seed}")
+    result = generator(rng, pages)
+    page_lines, expected = result[0], result[1]
+    tables = result[2] if len(result) > 2 else None
+
+    pdf = SimplePdf(title=f"Sintetico {vendor} {pages} paginas")
+    for i, lines in enumerate(page_lines):
+        if tables:
+            pdf.add_page(lines, tables[i], HENDERSON_COLUMNS_X)
+        else:
+            pdf.add_page(lines)
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    pdf_path = output_dir / f"sintetico_{vendor}_{pages}p_s{seed}.pdf"
+    pdf.save(pdf_path)
+
+    expected_path = pdf_path.with_suffix(".expected.json")
+    expected_path.write_text(json.dumps({
+        "vendor": vendor,
+        "extractor": extractor_name,
+        "pages": pages,
+        "seed": seed,
+        "amounts_in": "cents",
+        "rows": expected,
+        "row_count": len(expected),
+        "totals": expected_totals(expected),
+    }, indent=1, ensure_ascii=False), encoding="utf-8")
+    return pdf_path, expected_path
+
+
+def verify(pdf_path: Path, expected_path: Path) -> list[str]:
+    if str(SRC_DIR) not in sys.path:
+        sys.path.insert(0, str(SRC_DIR))
+    from main import get_extractor_for, load_config
+    from output_sinks import amounts_to_cents
+
+    esperado = json.loads(expected_path.read_text(encoding="utf-8"))
+    errores = []
+
+    extractor_func = get_extractor_for(pdf_path, load_config())
+    detectado = "extract_henderson" if extractor_func.__name__ == "call_henderson_microservice" else extractor_func.__name__
+    if detectado != esperado["extractor"]:
+        return [f"detección: se esperaba {esperado['extractor']} y se obtuvo {detectado}"]
+
+    if detectado == "extract_henderson":
+        sys.path.insert(0, str(EXTRACTORS_SFT_ROOT.parent / "henderson_microservice"))
+        from app_h import extract_henderson_logic
+        df = extract_henderson_logic(pdf_path.read_bytes())
+    else:
+        df = extractor_func(pdf_path)
+
+    if "Referencia" in df.columns:
+        df = df[df["Referencia"].astype(str) != "TOTAL:"]
+    if len(df) != esperado["row_count"]:
+        errores.append(f"filas: se esperaban {esperado['row_count']} y se obtuvieron {len(df)}")
+
+    for campo, total in esperado["totals"].items():
+        if campo not in df.columns:
+            errores.append(f"columna faltante: {campo}")
+            continue
+        obtenido = int(amounts_to_cents(df[campo]).fillna(0).sum())
+        if obtenido != total:
+            errores.append(f"total {campo}: se esperaba {total} y se obtuvo {obtenido} (centavos)")
+
+    refs_esperadas = sorted(str(r["Referencia"]) for r in esperado["rows"])
+    refs_obtenidas = sorted(df["Referencia"].astype(str)) if "Referencia" in df.columns else []
+    if refs_esperadas != refs_obtenidas:
+        errores.append("las referencias extraídas no coinciden con las esperadas")
+    return errores
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera PDFs sintéticos con el formato de cada proveedor y sus filas esperadas.")
+    parser.add_argument("--proveedor", action="append", choices=sorted(GENERATORS), help="Proveedor a generar (repetible); por defecto todos")
+    parser.add_argument("--paginas", type=int, default=10, help="Cantidad de páginas por PDF")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--salida", type=Path, default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--verificar", action="store_true", help="Detectar y extraer cada PDF generado y comparar con lo esperado")
+    args = parser.parse_args()
+
+    fallos = 0
+    for vendor in args.proveedor or sorted(GENERATORS):
+        pdf_path, expected_path = generate(vendor, args.paginas, args.salida, args.semilla)
+        print(f"Generado: {pdf_path.name}")
+        if args.verificar:
+            errores = verify(pdf_path, expected_path)
+            fallos += bool(errores)
+            print(f"  {'OK' if not errores else 'ERROR: ' + '; '.join(errores)}")
+    return 1 if fallos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+# Los montos viajan por el pipeline como centavos enteros (Int64 de pandas, admite nulos).
+# Se formatean a texto ("1234,56") recién en la salida: Excel, validación escrita, etc.
+AMOUNT_COLUMNS = ["Monto", "Monto Original", "Descuento", "Retención"]
+CENTS_DTYPE = "Int64"
+
+# Signo, parte entera y hasta 2 decimales. La parte entera va sin separadores o en grupos de miles de
+# exactamente 3 dígitos, todos con el mismo separador; el separador decimal (uno solo) tiene que ser el otro.
+# Con 3 dígitos tras el separador se interpreta como miles: "1.234" y "1,234" son 1234. Lo que no encaja
+# ("1,2,3", "1.234,567", "1.234.56") queda como nulo en vez de convertirse en otro número.
+_AMOUNT_PATTERN = r"^(?P<signo>-?)(?P<entero>\d{1,3}(?P<miles>[.,])\d{3}(?:(?P=miles)\d{3})*|\d*)(?:(?!(?P=miles))[.,](?P<decimales>\d{1,2}))?$"
+
+
+def parse_amounts(values) -> pd.Series:
+    texto = pd.Series(values, dtype="string") if not isinstance(values, pd.Series) else values.astype("string")
+    texto = texto.str.replace(r"[\s$_]", "", regex=True)
+
+    partes = texto.str.extract(_AMOUNT_PATTERN)
+    entero = partes["entero"].str.replace(r"[.,]", "", regex=True)
+    decimales = partes["decimales"].fillna("").str.pad(2, side="right", fillchar="0")
+
+    valido = partes["entero"].notna() & ((entero != "") | (partes["decimales"].notna()))
+    entero = entero.where(entero != "", "0")
+
+    cents = pd.Series(pd.NA, index=texto.index, dtype=CENTS_DTYPE)
+    if valido.any():
+        magnitud = pd.to_numeric(entero[valido]).astype("int64") * 100 + pd.to_numeric(decimales[valido]).astype("int64")
+        signo = np.where(partes.loc[valido, "signo"] == "-", -1, 1)
+        cents[valido] = magnitud * signo
+    return cents
+
+
+def parse_amount(value: str):
+    cents = parse_amounts([value]).iloc[0]
+    return None if pd.isna(cents) else int(cents)
+
+
+def amounts_to_cents(series: pd.Series) -> pd.Series:
+    # Enteros: ya son centavos. Flotantes: unidades (ej. la respuesta JSON de Henderson). Texto: se parsea.
+    if pd.api.types.is_integer_dtype(series.dtype):
+        return series.astype(CENTS_DTYPE)
+    if pd.api.types.is_float_dtype(series.dtype):
+        return (series * 100).round().astype(CENTS_DTYPE)
+    return parse_amounts(series)
+
+
+def scale_cents(cents: pd.Series, factor_percent: int) -> pd.Series:
+    # Aplica un factor expresado en porcentaje entero (122 = x1,22) redondeando la mitad hacia afuera.
+    cents = cents.astype(CENTS_DTYPE)
+    return (cents.abs() * factor_percent + 50) // 100 * np.sign(cents)
+
+
+def format_amounts(cents: pd.Series) -> pd.Series:
+    cents = amounts_to_cents(cents)
+    absoluto = cents.abs()
+    texto = (absoluto // 100).astype("string") + "," + (absoluto % 100).astype("string").str.zfill(2)
+    texto = texto.where(cents >= 0, "-" + texto)
+    return texto.astype(object).where(cents.notna(), None)
+
+
+def format_amount(cents) -> str:
+    if cents is None or pd.isna(cents):
+        return ""
+    cents = int(cents)
+    entero, decimales = divmod(abs(cents), 100)
+    return f"{'-' if cents < 0 else ''}{entero},{decimales:02d}"
+
+
+def format_amount_columns(df: pd.DataFrame) -> pd.DataFrame:
+    formateado = df.copy()
+    for col in AMOUNT_COLUMNS:
+        if col in formateado.columns:
+            formateado[col] = format_amounts(formateado[col])
+    return formateado
@@ -0,0 +1,185 @@
+import threading
+import time
+
+from logger import log_event
+from pipeline_metrics import LazyMetric
+from transport import get_transport, job_queue_name
+
+# Control de envío a las colas de trabajo (una por extractor): antes de publicar se consulta (de forma pasiva)
+# la profundidad de la cola del extractor y la cantidad de consumidores. Si se llega a la marca alta, se deja de publicar hasta que la
+# cola baje a la marca baja. Con per_consumer, las marcas se multiplican por la cantidad de consumidores.
+# La espera tiene tope: max_wait_seconds en total, o no_consumer_seconds si la cola sigue sin consumidores
+# (nadie la va a vaciar). Al vencer, el documento falla y los siguientes de esa cola fallan sin volver a esperar
+# mientras siga llena. 0 = sin tope.
+DEFAULT_BACKPRESSURE = {
+    "enabled": True,
+    "high_watermark": 200,
+    "low_watermark": 50,
+    "per_consumer": False,
+    "poll_seconds": 2.0,
+    "max_wait_seconds": 600,
+    "no_consumer_seconds": 30,
+}
+
+MAIN_SUBMISSION_QUEUE_DEPTH = LazyMetric(
+    'Gauge',
+    'main_submission_queue_depth',
+    'Last observed depth of the extractor job queue before submitting.',
+    multiprocess_mode='livemostrecent'
+)
+
+MAIN_BACKPRESSURE_WAIT_SECONDS_TOTAL = LazyMetric(
+    'Counter',
+    'main_backpressure_wait_seconds_total',
+    'Total time submissions waited for queue capacity.'
+)
+
+
+class CapacityUnavailable(Exception):
+    # reason: "timeout", "no_consumers" o "cancelled".
+    def __init__(self, message: str, reason: str, waited_seconds: float):
+        super().__init__(message)
+        self.reason = reason
+        self.waited_seconds = waited_seconds
+
+
+def queue_stats(queue_name: str) -> tuple[int, int]:
+    return get_transport().queue_stats(queue_name)
+
+
+def job_queue_stats(extractor_names: list[str]) -> tuple[int, int]:
+    # Profundidad sumada de las colas de esos extractores; como consumidores, los de la cola más atendida.
+    stats = [queue_stats(job_queue_name(extractor_name)) for extractor_name in extractor_names]
+    return sum(depth for depth, _ in stats), max((consumers for _, consumers in stats), default=0)
+
+
+class SubmissionThrottle:
+    def __init__(self, settings: dict = None, queue_name: str = None, cancel: threading.Event = None):
+        settings = {**DEFAULT_BACKPRESSURE, **(settings or {})}
+        self.enabled = bool(settings["enabled"])
+        self.high_watermark = int(settings["high_watermark"])
+        self.low_watermark = min(int(settings["low_watermark"]), self.high_watermark)
+        self.per_consumer = bool(settings["per_consumer"])
+        self.poll_seconds = float(settings["poll_seconds"])
+        self.max_wait_seconds = float(settings["max_wait_seconds"])
+        self.no_consumer_seconds = float(settings["no_consumer_seconds"])
+        self.queue_name = queue_name
+        # cancel.set() (ej. al cerrar la GUI) corta la espera.
+        self.cancel = cancel or threading.Event()
+        self.exhausted = None
+
+        self.depth = None
+        self.consumers = 0
+        self.waited_seconds = 0.0
+        self._last_poll = 0.0
+
+    def watermarks(self) -> tuple[int, int]:
+        factor = max(self.consumers, 1) if self.per_consumer else 1
+        return self.high_watermark * factor, self.low_watermark * factor
+
+    def _poll(self):
+        self.depth, self.consumers = queue_stats(self.queue_name)
+        self._last_poll = time.monotonic()
+        MAIN_SUBMISSION_QUEUE_DEPTH.set(self.depth)
+
+    def wait_for_capacity(self, notify=None) -> float:
+        # notify(tipo_evento, datos) publica el estado de espera ("waiting_for_capacity", "capacity_available" o
+        # "capacity_unavailable").
+        # Lanza CapacityUnavailable si la espera vence o se cancela.
+        if not self.enabled:
+            return 0.0
+        if self.cancel.is_set():
+            raise CapacityUnavailable(f"Envío a '{self.queue_name}' cancelado.", "cancelled", 0.0)
+
+        # Entre consultas se estima la profundidad sumando lo publicado; se consulta la cola solo si la
+        # estimación llega a la marca alta o si la última consulta quedó vieja.
+        high, low = self.watermarks()
+        if self.depth is not None and self.depth < high and time.monotonic() - self._last_poll < self.poll_seconds:
+            return 0.0
+
+        try:
+            self._poll()
+        except Exception as e:
+            log_event(f"ADVERTENCIA: No se pudo consultar la profundidad de '{self.queue_name}' ({type(e).__name__}: {e}). Se publica sin control de capacidad.")
+            self.depth = None
+            return 0.0
+
+        high, low = self.watermarks()
+        if self.depth < high:
+            self.exhausted = None
+            return 0.0
+        if self.exhausted:
+            # Una espera anterior de esta cola ya venció y la cola sigue llena: no se vuelve a esperar.
+            raise CapacityUnavailable(f"Cola '{self.queue_name}' sigue llena ({self.depth} mensajes, {self.consumers} consumidor(es)) tras una espera vencida.", self.exhausted, 0.0)
+
+        start_time = time.monotonic()
+        datos = {"queue_depth": self.depth, "consumer_count": self.consumers, "high_watermark": high, "low_watermark": low}
+        log_event(f"Cola '{self.queue_name}' con {self.depth} mensajes y {self.consumers} consumidor(es): se pausa el envío hasta bajar a {low}.")
+        if notify:
+            notify("waiting_for_capacity", datos)
+
+        sin_consumidores_desde = None
+        while True:
+            if self.cancel.wait(self.poll_seconds):
+                self._give_up("cancelled", f"Envío a '{self.queue_name}' cancelado mientras esperaba capacidad.", start_time, datos, notify)
+            try:
+                self._poll()
+            except Exception as e:
+                log_event(f"ADVERTENCIA: No se pudo consultar la profundidad de '{self.queue_name}' ({type(e).__name__}: {e}). Se reanuda el envío.")
+                self.depth = None
+                break
+            high, low = self.watermarks()
+            if self.depth <= low:
+                break
+            ahora = time.monotonic()
+            if self.consumers == 0:
+                if sin_consumidores_desde is None:
+                    log_event(f"ADVERTENCIA: '{self.queue_name}' no tiene consumidores; el envío sigue en pausa hasta que se inicie un servicio local.")
+                    sin_consumidores_desde = ahora
+                if self.no_consumer_seconds and ahora - sin_consumidores_desde >= self.no_consumer_seconds:
+                    self._give_up("no_consumers", f"'{self.queue_name}' sigue sin consumidores tras {ahora - sin_consumidores_desde:.0f} s: ningún servicio local atiende este extractor.", start_time, datos, notify)
+            else:
+                sin_consumidores_desde = None
+            if self.max_wait_seconds and ahora - start_time >= self.max_wait_seconds:
+                self._give_up("timeout", f"'{self.queue_name}' no bajó a {low} mensajes en {self.max_wait_seconds:.0f} s ({self.depth} en cola).", start_time, datos, notify)
+
+        waited = time.monotonic() - start_time
+        self.waited_seconds += waited
+        MAIN_BACKPRESSURE_WAIT_SECONDS_TOTAL.inc(waited)
+        log_event(f"Capacidad disponible en '{self.queue_name}' tras {waited:.1f} s ({self.depth if self.depth is not None else '?'} mensajes).")
+        if notify:
+            notify("capacity_available", {**datos, "queue_depth": self.depth, "waited_seconds": round(waited, 3)})
+        return waited
+
+    def _give_up(self, reason: str, message: str, start_time: float, datos: dict, notify):
+        waited = time.monotonic() - start_time
+        self.waited_seconds += waited
+        MAIN_BACKPRESSURE_WAIT_SECONDS_TOTAL.inc(waited)
+        if reason != "cancelled":
+            self.exhausted = reason
+        log_event(f"ADVERTENCIA: {message}")
+        if notify:
+            notify("capacity_unavailable", {**datos, "queue_depth": self.depth, "reason": reason, "waited_seconds": round(waited, 3)})
+        raise CapacityUnavailable(message, reason, waited)
+
+    def submitted(self):
+        if self.depth is not None:
+            self.depth += 1
+
+
+class ExtractorThrottles:
+    # Un control por cola de extractor: cada cola tiene sus propios consumidores y se vacía a su ritmo.
+    def __init__(self, settings: dict = None, cancel: threading.Event = None):
+        self.settings = settings
+        self.cancel = cancel or threading.Event()
+        self._throttles = {}
+
+    def for_extractor(self, extractor_name: str) -> SubmissionThrottle:
+        throttle = self._throttles.get(extractor_name)
+        if throttle is None:
+            throttle = self._throttles[extractor_name] = SubmissionThrottle(self.settings, job_queue_name(extractor_name), self.cancel)
+        return throttle
+
+    @property
+    def waited_seconds(self) -> float:
+        return sum(throttle.waited_seconds for throttle in self._throttles.values())
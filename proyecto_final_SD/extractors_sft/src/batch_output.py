@@ -0,0 +1,115 @@
+from pathlib import Path
+import pandas as pd
+
+from amounts import AMOUNT_COLUMNS, amounts_to_cents, format_amount_columns
+from excel_generator import open_excel_writer, write_styled_sheet
+from output_sinks import write_atomically
+from reference_index import reference_rows
+from validator import NO_WARNINGS_MESSAGE, validation_messages
+
+BATCH_MODES = ("per_vendor", "normalized")
+
+SUMMARY_SHEET_NAME = "Resumen"
+VALIDATION_SHEET_NAME = "Validación"
+NORMALIZED_SHEET_NAME = "Datos"
+
+
+def resolve_batch_mode(mode) -> str:
+    if not mode or str(mode).lower() in ("off", "none", "false"):
+        return None
+    mode = str(mode).lower()
+    if mode not in BATCH_MODES:
+        print(f"ADVERTENCIA: Modo de lote no soportado '{mode}', se usará 'per_vendor'.")
+        return "per_vendor"
+    return mode
+
+
+def vendor_label(extractor_name: str) -> str:
+    if extractor_name == "call_henderson_microservice":
+        return "henderson"
+    return extractor_name.replace("extract_", "")
+
+
+def build_batch_frame(results: list[tuple[str, str, pd.DataFrame]]) -> pd.DataFrame:
+    frames = []
+    for pdf_name, extractor_name, df in results:
+        datos = df[df["Referencia"].astype(str) != "TOTAL:"]
+        datos = datos.assign(Documento=pdf_name, Proveedor=vendor_label(extractor_name))
+        frames.append(datos)
+
+    batch_df = pd.concat(frames, ignore_index=True)
+    columnas = ["Documento", "Proveedor"] + [c for c in batch_df.columns if c not in ("Documento", "Proveedor")]
+    return batch_df[columnas]
+
+
+def build_summary(batch_df: pd.DataFrame) -> pd.DataFrame:
+    montos = {col: amounts_to_cents(batch_df[col]) for col in AMOUNT_COLUMNS if col in batch_df.columns}
+    base = pd.DataFrame({"Proveedor": batch_df["Proveedor"], "Documento": batch_df["Documento"], **montos})
+
+    resumen = base.groupby("Proveedor", sort=True).agg(
+        Documentos=("Documento", "nunique"),
+        Filas=("Documento", "size"),
+        **{col: (col, "sum") for col in montos}
+    ).reset_index()
+
+    total = {"Proveedor": "TOTAL:", "Documentos": base["Documento"].nunique(), "Filas": len(base)}
+    total.update({col: resumen[col].sum() for col in montos})
+    resumen = pd.concat([resumen, pd.DataFrame([total])], ignore_index=True)
+
+    for col in montos:
+        resumen[col] = resumen[col].astype("int64") / 100
+    return resumen
+
+
+def build_validation(results: list[tuple[str, str, pd.DataFrame]]) -> pd.DataFrame:
+    filas = []
+    # Los documentos del lote entran al índice histórico recién con el Excel escrito: las referencias repetidas
+    # entre documentos del mismo lote se cruzan acá.
+    vistas = {}
+    for pdf_name, extractor_name, df in results:
+        mensajes = validation_messages(df, pdf_name, extractor_name)[1:]
+        referencias = reference_rows(df) if extractor_name and "Referencia" in df.columns else None
+        if referencias is not None:
+            propias = {}
+            for clave, ref in zip(referencias["clave"], referencias["referencia"]):
+                for documento_previo in vistas.get((extractor_name, clave), []):
+                    mensajes.append(f"Referencia {ref} también aparece en {documento_previo} (mismo lote)")
+                propias.setdefault((extractor_name, clave), pdf_name)
+            for clave, documento in propias.items():
+                vistas.setdefault(clave, []).append(documento)
+
+        # Solo advertencias reales: un documento sin observaciones no ocupa filas en la hoja.
+        for mensaje in mensajes:
+            if mensaje == NO_WARNINGS_MESSAGE:
+                continue
+            filas.append({"Documento": pdf_name, "Proveedor": vendor_label(extractor_name), "Validación": mensaje})
+    return pd.DataFrame(filas, columns=["Documento", "Proveedor", "Validación"])
+
+
+def write_batch_workbook(results: list[tuple[str, str, pd.DataFrame]], output_path: Path, mode: str) -> bool:
+    def escribir(tmp_path: Path) -> bool:
+        batch_df = build_batch_frame(results)
+        writer = open_excel_writer(str(tmp_path))
+
+        write_styled_sheet(writer, build_summary(batch_df), SUMMARY_SHEET_NAME)
+        write_styled_sheet(writer, build_validation(results), VALIDATION_SHEET_NAME)
+
+        batch_df = format_amount_columns(batch_df)
+        if mode == "normalized":
+            write_styled_sheet(writer, batch_df, NORMALIZED_SHEET_NAME)
+        else:
+            for proveedor, datos in batch_df.groupby("Proveedor", sort=True):
+                datos = datos.dropna(axis=1, how="all").drop(columns=["Proveedor"])
+                write_styled_sheet(writer, datos, proveedor[:31])
+
+        writer.close()
+        return True
+
+    try:
+        if not write_atomically(output_path, escribir):
+            return False
+        print(f"Excel de lote generado: {output_path}")
+        return True
+    except Exception as e:
+        print(f"Error al guardar Excel de lote en {output_path}: {e}")
+        return False
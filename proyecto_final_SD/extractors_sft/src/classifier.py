@@ -0,0 +1,173 @@
+import fnmatch
+import time
+from pathlib import Path
+
+from extractor_registry import DETECTION_PAGES, is_registered
+from logger import log_event
+
+# Clasificación por huellas baratas del PDF (nombre de archivo, diccionario Info del trailer, tamaño de la
+# primera página y fuentes de sus recursos). No hace análisis de layout: solo lee la estructura del PDF.
+DEFAULT_MIN_CONFIDENCE = 0.9
+PAGE_SIZE_TOLERANCE = 2.0
+
+
+def _decode(value) -> str:
+    from pdfminer.pdftypes import resolve1
+    from pdfminer.psparser import PSLiteral
+    from pdfminer.utils import decode_text
+
+    value = resolve1(value)
+    if isinstance(value, bytes):
+        return decode_text(value)
+    if isinstance(value, PSLiteral):
+        return str(value.name)
+    return str(value) if value is not None else ""
+
+
+def read_fingerprint(pdf_path: Path) -> dict:
+    from pdfminer.pdfdocument import PDFDocument
+    from pdfminer.pdfpage import PDFPage
+    from pdfminer.pdfparser import PDFParser
+    from pdfminer.pdftypes import resolve1
+
+    pdf_path = Path(pdf_path)
+    fingerprint = {"filename": pdf_path.name.lower(), "metadata": {}, "page_size": None, "pages": 0, "fonts": []}
+
+    with open(pdf_path, "rb") as f:
+        document = PDFDocument(PDFParser(f))
+        for info in document.info:
+            for key, value in info.items():
+                fingerprint["metadata"][key.lower()] = _decode(value).strip().lower()
+
+        pages = resolve1(document.catalog.get("Pages"))
+        fingerprint["pages"] = int(resolve1(pages.get("Count", 0))) if pages else 0
+
+        first_page = next(PDFPage.create_pages(document), None)
+        if first_page is not None:
+            x0, y0, x1, y1 = first_page.mediabox
+            width, height = abs(x1 - x0), abs(y1 - y0)
+            if first_page.rotate % 180:
+                width, height = height, width
+            fingerprint["page_size"] = (round(width, 1), round(height, 1))
+
+            fonts = resolve1((first_page.resources or {}).get("Font")) or {}
+            nombres = set()
+            for font in fonts.values():
+                base_font = _decode(resolve1(font).get("BaseFont"))
+                # Las fuentes embebidas como subconjunto llevan un prefijo aleatorio ("ABCDEE+CourierNewPSMT").
+                nombres.add(base_font.split("+", 1)[-1].lower())
+            fingerprint["fonts"] = sorted(nombres)
+
+    return fingerprint
+
+
+def matches_fingerprint(fingerprint: dict, rule: dict) -> bool:
+    patrones = rule.get("filename")
+    if patrones and not any(fnmatch.fnmatch(fingerprint["filename"], p.lower()) for p in patrones):
+        return False
+
+    for key, esperado in rule.get("metadata", {}).items():
+        if esperado.lower() not in fingerprint["metadata"].get(key.lower(), ""):
+            return False
+
+    page_size = rule.get("page_size")
+    if page_size:
+        actual = fingerprint["page_size"]
+        if not actual or any(abs(a - e) > PAGE_SIZE_TOLERANCE for a, e in zip(actual, page_size)):
+            return False
+
+    for font in rule.get("fonts", []):
+        if not any(font.lower() in nombre for nombre in fingerprint["fonts"]):
+            return False
+
+    return True
+
+
+def classify_by_fingerprint(pdf_path: Path, config: dict) -> tuple[str, float, list[str]]:
+    settings = config.get("fingerprints", {})
+    if not settings.get("enabled", True) or not settings.get("rules"):
+        return None, 0.0, ["huellas desactivadas"]
+
+    min_confidence = float(settings.get("min_confidence", DEFAULT_MIN_CONFIDENCE))
+    start_time = time.perf_counter()
+    try:
+        fingerprint = read_fingerprint(pdf_path)
+    except Exception as e:
+        return None, 0.0, [f"huellas ilegibles ({type(e).__name__}: {e})"]
+
+    candidatos = {}
+    for rule in settings["rules"]:
+        if matches_fingerprint(fingerprint, rule):
+            extractor_name = rule.get("extractor")
+            confianza = float(rule.get("confidence", min_confidence))
+            if confianza > candidatos.get(extractor_name, (0.0, ""))[0]:
+                candidatos[extractor_name] = (confianza, rule.get("name", extractor_name))
+
+    elapsed_ms = (time.perf_counter() - start_time) * 1000
+    if not candidatos:
+        return None, 0.0, [f"sin huellas coincidentes ({elapsed_ms:.1f} ms)"]
+
+    ordenados = sorted(candidatos.items(), key=lambda item: item[1][0], reverse=True)
+    extractor_name, (confianza, regla) = ordenados[0]
+    camino = [f"huella '{regla}' -> {extractor_name} ({confianza:.2f})"]
+    camino += [f"huella '{r}' -> {e} ({c:.2f})" for e, (c, r) in ordenados[1:]]
+    camino.append(f"{elapsed_ms:.1f} ms")
+
+    segundo = ordenados[1][1][0] if len(ordenados) > 1 else 0.0
+    if confianza < min_confidence or segundo >= min_confidence:
+        camino.insert(0, "huellas ambiguas o con baja confianza")
+        return None, confianza, camino
+
+    return extractor_name, confianza, camino
+
+
+def classify_by_keywords(text_content: str, config: dict) -> str:
+    for rule in config.get("rules", []):
+        keywords = rule.get("keywords", [])
+        require_all = rule.get("all", True)
+        if not keywords: continue
+        condition = all(k.lower() in text_content for k in keywords) if require_all else any(k.lower() in text_content for k in keywords)
+        if condition and is_registered(rule.get("extractor")):
+            return rule.get("extractor")
+    return None
+
+
+def classify_document(pdf_path: Path, config: dict) -> tuple[str, float, list[str]]:
+    from pdf_pages import iter_document_texts
+
+    extractor_name, confianza, camino = classify_by_fingerprint(pdf_path, config)
+    if extractor_name and is_registered(extractor_name):
+        return extractor_name, confianza, camino
+
+    text_content = ""
+    try:
+        for ptext in iter_document_texts(pdf_path, DETECTION_PAGES):
+            if ptext:
+                text_content += ptext.lower() + " "
+    except Exception as e:
+        return "extract_henderson", 0.0, camino + [f"error extrayendo texto para detección ({e}), Henderson por defecto"]
+
+    extractor_name = classify_by_keywords(text_content, config)
+    if extractor_name:
+        return extractor_name, 1.0, camino + ["palabras clave"]
+    return "extract_henderson", 0.0, camino + ["sin coincidencias, Henderson por defecto"]
+
+
+def log_classification(pdf_name: str, extractor_name: str, confidence: float, path: list[str]):
+    log_event(f"Clasificación de {pdf_name}: {extractor_name} (confianza {confidence:.2f}) vía {' | '.join(path)}")
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Muestra las huellas de PDFs y la clasificación que producen.")
+    parser.add_argument("pdfs", nargs="+", type=Path)
+    parser.add_argument("--config", type=Path, default=Path(__file__).resolve().parent.parent / "config" / "config.json")
+    args = parser.parse_args()
+
+    config = json.loads(args.config.read_text(encoding="utf-8"))
+    for pdf in args.pdfs:
+        extractor_name, confianza, camino = classify_by_fingerprint(pdf, config)
+        print(f"{pdf.name}: {extractor_name or 'palabras clave'} ({confianza:.2f}) - {' | '.join(camino)}")
+        print(f"    {json.dumps(read_fingerprint(pdf), ensure_ascii=False)}")
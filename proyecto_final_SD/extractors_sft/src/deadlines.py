@@ -0,0 +1,306 @@
+import contextlib
+import importlib
+import os
+import threading
+import time
+from pathlib import Path
+
+from logger import flush_logs, log_event
+from pipeline_metrics import LazyMetric, collect_extraction_stats, merge_extraction_stats
+from profiler import active_profile, capture_profile
+
+# Plazos por documento. Algunos PDFs mal formados dejan a pdfminer analizando layout durante minutos, así que
+# la detección y la extracción corren en un proceso hijo que se mata al vencer el plazo (y se vuelve a lanzar
+# para el documento siguiente). El plazo de extracción escala con las páginas y se ajusta por extractor:
+#   plazo = min(base_seconds + per_page_seconds * páginas, max_seconds)
+# Antes de parsear, un chequeo barato (tamaño, páginas, contraseña) rechaza los casos obvios.
+# FINEXTRACT_DEADLINES=0 desactiva plazos y aislamiento; FINEXTRACT_ISOLATION=inline corre en el mismo proceso
+# (sin poder cortar la extracción; solo se registra el exceso).
+DEADLINES_ENV_VAR = "FINEXTRACT_DEADLINES"
+ISOLATION_ENV_VAR = "FINEXTRACT_ISOLATION"
+ISOLATION_PROCESS = "process"
+ISOLATION_INLINE = "inline"
+
+DEFAULT_DEADLINES = {
+    "enabled": True,
+    "isolation": ISOLATION_PROCESS,
+    "base_seconds": 20.0,
+    "per_page_seconds": 2.0,
+    "max_seconds": 600.0,
+    "detection_seconds": 30.0,
+    "vendors": {},
+    "preflight": {
+        "max_pages": 300,
+        "max_file_mb": 50,
+        "reject_password_protected": True,
+    },
+}
+
+_DISABLED_VALUES = ("0", "false", "off", "no")
+_settings = {
+    **DEFAULT_DEADLINES,
+    "enabled": os.environ.get(DEADLINES_ENV_VAR, "").lower() not in _DISABLED_VALUES,
+    "isolation": os.environ.get(ISOLATION_ENV_VAR, ISOLATION_PROCESS).lower(),
+}
+
+PIPELINE_DEADLINE_EXCEEDED_TOTAL = LazyMetric(
+    'Counter',
+    'pdf_pipeline_deadline_exceeded_total',
+    'Documents whose detection or extraction was cancelled after exceeding its deadline.',
+    ['stage', 'extractor']
+)
+
+PIPELINE_DEADLINE_USAGE_RATIO = LazyMetric(
+    'Histogram',
+    'pdf_pipeline_deadline_usage_ratio',
+    'Fraction of the deadline used by detection or extraction (1.0 = deadline exceeded).',
+    ['stage', 'extractor'],
+    buckets=[0.01, 0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0]
+)
+
+PIPELINE_PREFLIGHT_REJECTED_TOTAL = LazyMetric(
+    'Counter',
+    'pdf_pipeline_preflight_rejected_total',
+    'Documents rejected by the pre-flight check before parsing.',
+    ['reason']
+)
+
+PIPELINE_ISOLATION_RESTARTS_TOTAL = LazyMetric(
+    'Counter',
+    'pdf_pipeline_isolation_restarts_total',
+    'Isolated extraction processes started (first start, after a deadline kill, a crash or a memory recycle).',
+    ['reason']
+)
+
+
+class DeadlineExceeded(TimeoutError):
+    def __init__(self, stage: str, seconds: float):
+        super().__init__(f"Se superó el plazo de {seconds:.0f} s en la etapa '{stage}'; el documento se canceló.")
+        self.stage = stage
+        self.seconds = seconds
+
+
+class PreflightRejected(ValueError):
+    def __init__(self, reason: str, message: str, info: dict):
+        super().__init__(message)
+        self.reason = reason
+        self.info = info
+
+
+class IsolatedError(RuntimeError):
+    def __init__(self, error_type: str, message: str, child_traceback: str):
+        super().__init__(f"{error_type}: {message}")
+        self.error_type = error_type
+        self.child_traceback = child_traceback
+
+
+def configure_deadlines(settings: dict = None, enabled: bool = None, isolation: str = None) -> dict:
+    for key, value in (settings or {}).items():
+        if key == "preflight":
+            _settings["preflight"] = {**DEFAULT_DEADLINES["preflight"], **value}
+        else:
+            _settings[key] = value
+    if enabled is not None:
+        _settings["enabled"] = bool(enabled)
+    if isolation is not None:
+        _settings["isolation"] = isolation
+    return dict(_settings)
+
+
+def deadline_settings() -> dict:
+    return dict(_settings)
+
+
+def deadline_for(extractor_name: str, pages: int = None) -> float:
+    settings = {**_settings, **_settings.get("vendors", {}).get(extractor_name, {})}
+    seconds = float(settings["base_seconds"]) + float(settings["per_page_seconds"]) * max(pages or 1, 1)
+    return min(seconds, float(settings["max_seconds"]))
+
+
+def preflight(pdf_path: Path) -> dict:
+    from pdfminer.pdfdocument import PDFDocument, PDFPasswordIncorrect
+    from pdfminer.pdfparser import PDFParser
+    from pdfminer.pdftypes import resolve1
+
+    pdf_path = Path(pdf_path)
+    limits = _settings["preflight"]
+    info = {"size_bytes": pdf_path.stat().st_size, "pages": None, "encrypted": False}
+    if not _settings["enabled"]:
+        return info
+
+    def rechazar(reason, message):
+        PIPELINE_PREFLIGHT_REJECTED_TOTAL.labels(reason=reason).inc()
+        raise PreflightRejected(reason, f"{pdf_path.name} rechazado: {message}", info)
+
+    if limits.get("max_file_mb") and info["size_bytes"] > float(limits["max_file_mb"]) * 1024 * 1024:
+        rechazar("file_size", f"pesa {info['size_bytes'] / (1024 * 1024):.1f} MB (máximo {limits['max_file_mb']} MB).")
+
+    # Solo estructura (xref, catálogo y árbol de páginas): no hay análisis de layout.
+    try:
+        with open(pdf_path, "rb") as f:
+            document = PDFDocument(PDFParser(f))
+            info["encrypted"] = document.encryption is not None
+            pages = resolve1(document.catalog.get("Pages"))
+            info["pages"] = int(resolve1(pages.get("Count", 0))) if pages else 0
+    except PDFPasswordIncorrect:
+        info["encrypted"] = True
+        if limits.get("reject_password_protected", True):
+            rechazar("password", "está protegido con contraseña.")
+        return info
+    except Exception as e:
+        rechazar("unreadable", f"no se pudo leer la estructura del PDF ({type(e).__name__}: {e}).")
+
+    if not info["pages"]:
+        rechazar("no_pages", "no tiene páginas.")
+    if limits.get("max_pages") and info["pages"] > int(limits["max_pages"]):
+        rechazar("page_count", f"tiene {info['pages']} páginas (máximo {limits['max_pages']}).")
+    return info
+
+
+def _child_loop(conn):
+    import traceback
+
+    from memory_guard import RssSampler, current_rss
+
+    while True:
+        try:
+            module_name, func_name, args, perfilar = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        # Las métricas de parseo (páginas, tiempo de pdfplumber) y el perfil de la llamada vuelven en la respuesta:
+        # el padre las registra como si la extracción hubiera corrido en su proceso.
+        extras = {}
+        try:
+            func = getattr(importlib.import_module(module_name), func_name)
+            with RssSampler(0.05) as sampler, collect_extraction_stats() as extraccion, capture_profile(perfilar) as perfil:
+                try:
+                    result = func(*args)
+                finally:
+                    extras["extraction"] = extraccion
+                    extras["profile"] = perfil
+            # El padre puede matar este proceso apenas recibe la respuesta: lo registrado se escribe antes.
+            flush_logs()
+            conn.send(("ok", result, sampler.peak, current_rss(), extras))
+        except KeyboardInterrupt:
+            return
+        except Exception as e:
+            flush_logs()
+            conn.send(("error", (type(e).__name__, str(e), traceback.format_exc()), 0, current_rss(), extras))
+
+
+class IsolatedRunner:
+    def __init__(self, max_rss_bytes: int = 0):
+        self.max_rss_bytes = max_rss_bytes
+        self.last_peak_rss = 0
+        self._process = None
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _start(self, reason: str):
+        import multiprocessing
+
+        # spawn en todas las plataformas: el proceso padre tiene hilos (pika, Qt) y fork no es seguro.
+        context = multiprocessing.get_context("spawn")
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(target=_child_loop, args=(child_conn,), daemon=True, name="finextract-extraccion")
+        self._process.start()
+        child_conn.close()
+        PIPELINE_ISOLATION_RESTARTS_TOTAL.labels(reason=reason).inc()
+
+    def stop(self):
+        if self._process is None:
+            return
+        if self._process.is_alive():
+            self._process.kill()
+        self._process.join(5)
+        self._conn.close()
+        self._process = None
+        self._conn = None
+
+    def call(self, func, args: tuple, seconds: float, stage: str):
+        perfil = active_profile()
+        with self._lock:
+            self.last_peak_rss = 0
+            if self._process is None or not self._process.is_alive():
+                self._start("start" if self._process is None else "crash")
+            self._conn.send((func.__module__, func.__name__, args, perfil is not None))
+            # Mientras el hijo trabaja, el perfil del padre solo vería la espera en el pipe: se pausa.
+            with perfil.paused() if perfil else contextlib.nullcontext():
+                respondio = self._conn.poll(seconds)
+            if not respondio:
+                self.stop()
+                self._start("deadline")
+                raise DeadlineExceeded(stage, seconds)
+            try:
+                estado, payload, peak_rss, rss, extras = self._conn.recv()
+            except (EOFError, OSError):
+                self.stop()
+                self._start("crash")
+                raise RuntimeError(f"El proceso aislado de '{stage}' terminó inesperadamente.")
+
+            merge_extraction_stats(extras.get("extraction"))
+            if perfil:
+                perfil.add_stats(extras.get("profile", {}).get("stats"))
+            self.last_peak_rss = peak_rss
+            if self.max_rss_bytes and rss >= self.max_rss_bytes:
+                log_event(f"Proceso aislado de extracción con {rss / (1024 * 1024):.0f} MB, se reemplaza.")
+                self.stop()
+                self._start("memory")
+
+        if estado == "error":
+            raise IsolatedError(*payload)
+        return payload
+
+
+_runner = None
+_runner_lock = threading.Lock()
+# Los hilos de consumo del transporte local tienen cada uno su proceso aislado, para extraer en paralelo.
+_thread_runner = threading.local()
+
+
+def use_thread_runner(runner: IsolatedRunner = None):
+    _thread_runner.runner = runner
+
+
+def get_runner() -> IsolatedRunner:
+    global _runner
+    runner = getattr(_thread_runner, "runner", None)
+    if runner is not None:
+        return runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = IsolatedRunner()
+        return _runner
+
+
+def isolated_peak_rss() -> int:
+    runner = getattr(_thread_runner, "runner", None) or _runner
+    return runner.last_peak_rss if runner else 0
+
+
+def shutdown_isolation():
+    if _runner:
+        _runner.stop()
+
+
+def run_with_deadline(func, args: tuple, seconds: float, stage: str, extractor_name: str = None):
+    if not _settings["enabled"]:
+        return func(*args)
+
+    extractor_name = extractor_name or "unknown"
+    start_time = time.perf_counter()
+    try:
+        if _settings["isolation"] == ISOLATION_PROCESS:
+            result = get_runner().call(func, args, seconds, stage)
+        else:
+            result = func(*args)
+    except DeadlineExceeded:
+        PIPELINE_DEADLINE_EXCEEDED_TOTAL.labels(stage=stage, extractor=extractor_name).inc()
+        PIPELINE_DEADLINE_USAGE_RATIO.labels(stage=stage, extractor=extractor_name).observe(1.0)
+        raise
+
+    elapsed = time.perf_counter() - start_time
+    PIPELINE_DEADLINE_USAGE_RATIO.labels(stage=stage, extractor=extractor_name).observe(min(elapsed / seconds, 1.0))
+    if elapsed > seconds:
+        log_event(f"ADVERTENCIA: '{stage}' de {extractor_name} tardó {elapsed:.1f} s, más que su plazo de {seconds:.0f} s (sin aislamiento no se puede cortar).")
+    return result
@@ -1,15 +1,10 @@
-import pdfplumber
 import pandas as pd
 import re
+from amounts import AMOUNT_COLUMNS, parse_amounts
+from extractor_registry import page_spec
+from pdf_pages import iter_document_texts
 
 def extract_GDU(pdf_path) -> pd.DataFrame:
-    def parse_monto(txt):
-        return float(txt.replace(".", "").replace(",", "."))
-
-    def format_coma(x):
-        entero, decimales = f"{abs(x):.2f}".split(".")
-        return f"-{entero},{decimales}" if x < 0 else f"{entero},{decimales}"
-
     def formatear_referencia_fa(ref: str) -> str:
         ref_nro = ref.split("-")[0]
         if len(ref_nro) == 8:
@@ -24,82 +19,65 @@ def extract_GDU(pdf_path) -> pd.DataFrame:
             return ref_nro  # fallback
 
     rows = []
-    total_monto = total_descuento = total_retencion = 0.0
-
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text()
-            if not text:
-                continue
-
-            for line in text.splitlines():
-                ref_match = re.search(r"(\d{4,8}-\d)", line)
-                if not ref_match:
-                    continue
-                referencia_pdf = ref_match.group(1)
-
-                montos = re.findall(r"-?\d{1,8},\d{2}", line)
-                if not montos:
-                    continue
-
-                if "C.ASU" in line:
-                    tipo = "C.ASU"
-                elif "Fact" in line:
-                    tipo = "FA"
-                elif "Devol" in line:
-                    tipo = "NC"
-                else:
-                    tipo = ""
 
-                try:
-                    monto = parse_monto(montos[0])
-                except ValueError:
-                    continue
+    for text in iter_document_texts(pdf_path, page_spec("extract_GDU")):
+        if not text:
+            continue
 
-                if tipo == "C.ASU":
-                    total_monto += monto
-                    rows.append({
-                        "Referencia": referencia_pdf,
-                        "Monto": format_coma(monto),
-                        "Descuento": "0,00",
-                        "Retención": "0,00",
-                        "Tipo": "C.ASU"
-                    })
-                    continue
-
-                if len(montos) < 3:
-                    continue
-
-                try:
-                    descuento = parse_monto(montos[1])
-                    retencion = parse_monto(montos[2])
-                except ValueError:
-                    continue
+        for line in text.splitlines():
+            ref_match = re.search(r"(\d{4,8}-\d)", line)
+            if not ref_match:
+                continue
+            referencia_pdf = ref_match.group(1)
 
-                total_monto += monto
-                total_descuento += descuento
-                total_retencion += retencion
+            montos = re.findall(r"-?\d{1,8},\d{2}", line)
+            if not montos:
+                continue
 
-                if tipo == "FA":
-                    referencia_final = formatear_referencia_fa(referencia_pdf)
-                else:
-                    referencia_final = referencia_pdf
+            if "C.ASU" in line:
+                tipo = "C.ASU"
+            elif "Fact" in line:
+                tipo = "FA"
+            elif "Devol" in line:
+                tipo = "NC"
+            else:
+                tipo = ""
 
+            if tipo == "C.ASU":
                 rows.append({
-                    "Referencia": referencia_final,
-                    "Monto": format_coma(monto),
-                    "Descuento": format_coma(descuento),
-                    "Retención": format_coma(retencion),
-                    "Tipo": tipo
+                    "Referencia": referencia_pdf,
+                    "Monto": montos[0],
+                    "Descuento": "0,00",
+                    "Retención": "0,00",
+                    "Tipo": "C.ASU"
                 })
+                continue
 
-    if rows:
-        rows.append({
-            "Referencia": "TOTAL:",
-            "Monto": format_coma(total_monto),
-            "Descuento": format_coma(total_descuento),
-            "Retención": format_coma(total_retencion),
-            "Tipo": ""
-        })
+            if len(montos) < 3:
+                continue
 
-    return pd.DataFrame(rows)
+            if tipo == "FA":
+                referencia_final = formatear_referencia_fa(referencia_pdf)
+            else:
+                referencia_final = referencia_pdf
+
+            rows.append({
+                "Referencia": referencia_final,
+                "Monto": montos[0],
+                "Descuento": montos[1],
+                "Retención": montos[2],
+                "Tipo": tipo
+            })
+
+    df = pd.DataFrame(rows)
+    if df.empty:
+        return df
+
+    columnas = [c for c in AMOUNT_COLUMNS if c in df.columns]
+    for col in columnas:
+        df[col] = parse_amounts(df[col])
+
+    total = {"Referencia": "TOTAL:", "Tipo": ""}
+    total.update({col: df[col].sum() for col in columnas})
+    df = pd.concat([df, pd.DataFrame([total]).astype({col: "Int64" for col in columnas})], ignore_index=True)
+    return df
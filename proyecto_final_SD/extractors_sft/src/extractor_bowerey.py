@@ -1,35 +1,31 @@
-import pdfplumber
 import pandas as pd
 import re
+from amounts import parse_amounts
+from extractor_registry import page_spec
+from pdf_pages import iter_document_texts
 
 def extract_bowerey(pdf_path) -> pd.DataFrame:
     referencias = []
     montos = []
 
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text()
-            if not text:
-                continue
+    for text in iter_document_texts(pdf_path, page_spec("extract_bowerey")):
+        if not text:
+            continue
 
-            glosa_matches = re.findall(r"[Gg]losa\s+(\d{5,8})z(?:\d*[A-Z]*)?", text)
-            referencias.extend(glosa_matches)
+        glosa_matches = re.findall(r"[Gg]losa\s+(\d{5,8})z(?:\d*[A-Z]*)?", text)
+        referencias.extend(glosa_matches)
 
-            for line in text.splitlines():
-                posibles = re.findall(r"\d{1,3}(?:\.\d{3})*,\d{2}", line)
-                if len(posibles) == 3:
-                    valor_retencion = posibles[2]
-                    try:
-                        monto = float(valor_retencion.replace(".", "").replace(",", "."))
-                        montos.append(monto)
-                    except ValueError:
-                        continue
+        for line in text.splitlines():
+            posibles = re.findall(r"\d{1,3}(?:\.\d{3})*,\d{2}", line)
+            if len(posibles) == 3:
+                montos.append(posibles[2])
 
+    montos = parse_amounts(montos).dropna().tolist()
     min_len = min(len(referencias), len(montos))
     referencias = referencias[:min_len]
     montos = montos[:min_len]
 
     return pd.DataFrame({
         "Referencia": referencias,
-        "Monto": montos
+        "Monto": pd.array(montos, dtype="Int64")
     })
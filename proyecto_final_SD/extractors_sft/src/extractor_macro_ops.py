@@ -1,14 +1,14 @@
-import pdfplumber
 import pandas as pd
 import re
+from amounts import parse_amounts
+from extractor_registry import page_spec
+from pdf_pages import iter_document_texts
 
 def extract_ops_macro(pdf_path) -> pd.DataFrame:
     text = ""
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
+    for page_text in iter_document_texts(pdf_path, page_spec("extract_ops_macro")):
+        if page_text:
+            text += page_text + "\n"
 
     rows = []
     for line in text.splitlines():
@@ -16,13 +16,11 @@ def extract_ops_macro(pdf_path) -> pd.DataFrame:
         monto_match = re.findall(r"-?\d{1,3}(?:\.\d{3})*,\d{2}", line)
 
         if ref_match and monto_match:
-            ref = ref_match.group(0).strip()
-            bruto = monto_match[-1].strip()  
-            try:
-                monto = float(bruto.replace(".", "").replace(",", "."))
-                rows.append({"Referencia": ref, "Monto": monto})
-            except ValueError:
-                continue
+            rows.append({"Referencia": ref_match.group(0).strip(), "Monto": monto_match[-1].strip()})
 
-    return pd.DataFrame(rows)
+    df = pd.DataFrame(rows)
+    if df.empty:
+        return df
+    df["Monto"] = parse_amounts(df["Monto"])
+    return df.dropna(subset=["Monto"]).reset_index(drop=True)
 
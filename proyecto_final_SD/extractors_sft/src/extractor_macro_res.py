@@ -1,56 +1,46 @@
-import pdfplumber
 import pandas as pd
 import re
 from collections import Counter
+from amounts import parse_amounts, scale_cents
+from extractor_registry import page_spec
+from pdf_pages import iter_document_texts
 
 def extract_res_macro(pdf_path) -> pd.DataFrame:
-    def format_monto(x):
-        return f"-{int(abs(x))},{str(abs(x)).split('.')[-1][:2]}" if x < 0 else f"{int(x)},{str(x).split('.')[-1][:2]}"
-
-    rows = []
     prefixes = []
+    candidatas = []
+
+    # Una sola pasada por el PDF: el prefijo mayoritario se calcula sobre las líneas ya leídas.
+    for text in iter_document_texts(pdf_path, page_spec("extract_res_macro")):
+        if not text:
+            continue
 
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text()
-            if not text:
+        for line in text.splitlines():
+            ref_match = re.search(r"\bA\d{5,8}\b", line)
+            if not ref_match:
                 continue
+            prefixes.append(ref_match.group(0)[:2])
 
-            for line in text.splitlines():
-                ref_match = re.search(r"\bA\d{5,8}\b", line)
-                if ref_match:
-                    prefixes.append(ref_match.group(0)[:2])
+            montos = re.findall(r"-?\d{1,3}(?:\.\d{3})*,\d{2}", line)
+            if len(montos) >= 2:
+                candidatas.append((ref_match.group(0), montos))
 
     if not prefixes:
         return pd.DataFrame()
 
     mayoritario = Counter(prefixes).most_common(1)[0][0]
 
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text()
-            if not text:
-                continue
-
-            for line in text.splitlines():
-                ref_match = re.search(r"\bA\d{5,8}\b", line)
-                montos = re.findall(r"-?\d{1,3}(?:\.\d{3})*,\d{2}", line)
-
-                if not ref_match or len(montos) < 2:
-                    continue
-
-                ref = ref_match.group(0)
-                base = float(montos[-2].replace(".", "").replace(",", "."))
-                ret = float(montos[-1].replace(".", "").replace(",", "."))
-
-                monto = base if ref[:2] == mayoritario else round(base * 1.22, 2)
-                ajustado = "No" if ref[:2] == mayoritario else "Sí"
-
-                rows.append({
-                    "Referencia": ref,
-                    "Monto": monto,
-                    "Retención": format_monto(ret),
-                    "Ajustado": ajustado
-                })
+    if not candidatas:
+        return pd.DataFrame()
 
-    return pd.DataFrame(rows)
\ No newline at end of file
+    referencias = pd.Series([ref for ref, _ in candidatas])
+    base = parse_amounts([montos[-2] for _, montos in candidatas])
+    retencion = parse_amounts([montos[-1] for _, montos in candidatas])
+    es_mayoritario = referencias.str[:2] == mayoritario
+
+    # Las referencias con prefijo minoritario vienen sin IVA: se ajusta la base x1,22.
+    return pd.DataFrame({
+        "Referencia": referencias,
+        "Monto": base.where(es_mayoritario, scale_cents(base, 122)),
+        "Retención": retencion,
+        "Ajustado": es_mayoritario.map({True: "No", False: "Sí"})
+    })
\ No newline at end of file
@@ -1,23 +1,20 @@
-import pdfplumber
 import pandas as pd
 import re
+from amounts import parse_amounts
+from extractor_registry import page_spec
+from pdf_pages import iter_document_texts
 
 def extract_polakof(pdf_path) -> pd.DataFrame:
     text = ""
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
+    for page_text in iter_document_texts(pdf_path, page_spec("extract_polakof")):
+        if page_text:
+            text += page_text + "\n"
 
     pattern = r"Documento\s+([A]?\d+):\s+([-\d.,]+)\s+UYU"
     matches = re.findall(pattern, text)
 
-    rows = []
-    for ref, monto in matches:
-        try:
-            monto_float = float(monto.replace(",", ""))
-            rows.append({"Referencia": ref.strip(), "Monto": monto_float})
-        except ValueError:
-            continue  
-    return pd.DataFrame(rows)
+    df = pd.DataFrame([{"Referencia": ref.strip(), "Monto": monto} for ref, monto in matches])
+    if df.empty:
+        return df
+    df["Monto"] = parse_amounts(df["Monto"])
+    return df.dropna(subset=["Monto"]).reset_index(drop=True)
@@ -0,0 +1,82 @@
+import importlib
+import threading
+
+# Registro único de extractores. La clave es el nombre que usan config.json y los mensajes de la cola.
+#   vendor:  proveedor (etiqueta de salidas y métricas)
+#   module:  módulo que define la función con el mismo nombre; se importa recién al primer uso
+#   backend: "pdfplumber" (se ejecuta en este proceso) o "henderson_http" (microservicio de Henderson)
+#   content: "text" o "tables", lo que el extractor necesita de cada página
+#   pages:   páginas a parsear (ver pdf_pages.py): "all", {"first": N}, {"ranges": "1-3"}, {"until": "marcador"}
+EXTRACTOR_SPECS = {
+    "extract_polakof": {"vendor": "polakof", "module": "extractor_polakof", "backend": "pdfplumber", "content": "text", "pages": "all"},
+    "extract_tata": {"vendor": "tata", "module": "extractor_tata", "backend": "pdfplumber", "content": "text", "pages": {"until": "Resolución"}},
+    "extract_ops_macro": {"vendor": "macro_ops", "module": "extractor_macro_ops", "backend": "pdfplumber", "content": "text", "pages": "all"},
+    "extract_res_macro": {"vendor": "macro_res", "module": "extractor_macro_res", "backend": "pdfplumber", "content": "text", "pages": "all"},
+    "extract_bowerey": {"vendor": "bowerey", "module": "extractor_bowerey", "backend": "pdfplumber", "content": "text", "pages": "all"},
+    "extract_res_ussel": {"vendor": "ussel_res", "module": "extractor_ussel_res", "backend": "pdfplumber", "content": "text", "pages": "all"},
+    "extract_ops_ussel": {"vendor": "ussel_ops", "module": "extractor_ussel_ops", "backend": "pdfplumber", "content": "text", "pages": "all"},
+    "extract_GDU": {"vendor": "gdu", "module": "extractor_GDU", "backend": "pdfplumber", "content": "text", "pages": {"until": "Total General"}},
+    "extract_henderson": {"vendor": "henderson", "module": None, "backend": "henderson_http", "content": "tables", "pages": "all"},
+}
+
+LOCAL_BACKEND = "pdfplumber"
+HENDERSON_BACKEND = "henderson_http"
+
+# Páginas que se leen para detectar el proveedor con las reglas de config.json.
+DETECTION_PAGES = {"first": 2}
+
+_loaded = {}
+_lock = threading.Lock()
+
+
+def get_spec(extractor_name: str) -> dict:
+    if extractor_name not in EXTRACTOR_SPECS:
+        raise KeyError(f"Extractor '{extractor_name}' no registrado.")
+    return EXTRACTOR_SPECS[extractor_name]
+
+
+def page_spec(extractor_name: str):
+    return get_spec(extractor_name)["pages"]
+
+
+def available_extractors(backend: str = None) -> list[str]:
+    return [name for name, spec in EXTRACTOR_SPECS.items() if backend is None or spec["backend"] == backend]
+
+
+def is_registered(extractor_name: str) -> bool:
+    return extractor_name in EXTRACTOR_SPECS
+
+
+def is_local(extractor_name: str) -> bool:
+    return is_registered(extractor_name) and EXTRACTOR_SPECS[extractor_name]["backend"] == LOCAL_BACKEND
+
+
+def resolve_extractor_names(names) -> list[str]:
+    if not names:
+        return available_extractors(LOCAL_BACKEND)
+    if isinstance(names, str):
+        names = names.split(",")
+    resolved = []
+    for name in (n.strip() for n in names):
+        if not name:
+            continue
+        if not is_local(name):
+            print(f"ADVERTENCIA: Extractor '{name}' no registrado o no ejecutable localmente, se ignorará.")
+            continue
+        resolved.append(name)
+    return resolved
+
+
+def load_extractor(extractor_name: str):
+    extractor_func = _loaded.get(extractor_name)
+    if extractor_func is not None:
+        return extractor_func
+
+    if not is_local(extractor_name):
+        raise KeyError(f"Extractor '{extractor_name}' no registrado o no ejecutable localmente.")
+
+    with _lock:
+        if extractor_name not in _loaded:
+            module = importlib.import_module(EXTRACTOR_SPECS[extractor_name]["module"])
+            _loaded[extractor_name] = getattr(module, extractor_name)
+    return _loaded[extractor_name]
@@ -1,15 +1,16 @@
-import pdfplumber
 import pandas as pd
 import re
+from amounts import parse_amounts
+from extractor_registry import page_spec
+from pdf_pages import iter_document_texts
 
 def extract_tata(pdf_path) -> pd.DataFrame:
     referencias = []
     montos = []
 
-    with pdfplumber.open(pdf_path) as pdf:
-        text = ""
-        for page in pdf.pages:
-            text += page.extract_text() + "\n"
+    text = ""
+    for page_text in iter_document_texts(pdf_path, page_spec("extract_tata")):
+        text += (page_text or "") + "\n"
 
     ref_section = re.search(r"INFORMACIÓN DE REFERENCIA(.+?)Resolución", text, re.DOTALL)
     if ref_section:
@@ -25,18 +26,14 @@ def extract_tata(pdf_path) -> pd.DataFrame:
             if parts:
                 posible_monto = parts[-1]
                 if re.match(r"\d{1,3}(?:\.\d{3})*,\d{2}", posible_monto):
-                    try:
-                        monto_float = float(posible_monto.replace(".", "").replace(",", "."))
-                        montos.append(monto_float)
-                    except ValueError:
-                        continue
+                    montos.append(posible_monto)
+
+    montos = parse_amounts(montos).dropna().tolist()
 
     # Emparejar referencias y montos
     cantidad = min(len(referencias), len(montos))
-    data = [
-        {"Referencia": referencias[i], "Monto": montos[i]}
-        for i in range(cantidad)
-    ]
-
-    return pd.DataFrame(data)
+    return pd.DataFrame({
+        "Referencia": referencias[:cantidad],
+        "Monto": pd.array(montos[:cantidad], dtype="Int64")
+    })
 
@@ -1,12 +1,8 @@
 import re
 import pandas as pd
-import pdfplumber
-from decimal import Decimal, InvalidOperation
-
-def format_decimal_value(monto: Decimal) -> str:
-    rounded = monto.quantize(Decimal("0.01"))
-    formatted_str = f"{abs(rounded):.2f}".replace(".", ",")
-    return f"-{formatted_str}" if monto < 0 else formatted_str
+from amounts import parse_amounts
+from extractor_registry import page_spec
+from pdf_pages import iter_document_texts
 
 def extract_ops_ussel(pdf_path) -> pd.DataFrame:
     pattern = re.compile(
@@ -14,27 +10,21 @@ def extract_ops_ussel(pdf_path) -> pd.DataFrame:
         r"(-?(?:\d{1,3}(?:\.\d{3})+|\d+)(?:[.,]\d+)?)"
     )
     
-    with pdfplumber.open(pdf_path) as pdf:
-        text = "\n".join(page.extract_text() for page in pdf.pages if page.extract_text())
+    text = "\n".join(t for t in iter_document_texts(pdf_path, page_spec("extract_ops_ussel")) if t)
 
     matches = pattern.findall(text)
     registros = {}
 
     for tipo, ref, monto_str in matches:
-        try:
-            if ',' in monto_str:
-                monto = Decimal(monto_str.replace(".", "").replace(",", "."))
-            else:
-                monto = Decimal(monto_str)
-        except InvalidOperation:
-            continue
-
-        formatted_monto = format_decimal_value(monto)
-
         registro = registros.setdefault(ref, {"Referencia": ref, "Monto Original": None, "Retención": None})
         if tipo == "RR":
-            registro["Retención"] = formatted_monto
+            registro["Retención"] = monto_str
         else:
-            registro["Monto Original"] = formatted_monto
+            registro["Monto Original"] = monto_str
 
-    return pd.DataFrame(registros.values())
+    df = pd.DataFrame(registros.values())
+    if df.empty:
+        return df
+    df["Monto Original"] = parse_amounts(df["Monto Original"])
+    df["Retención"] = parse_amounts(df["Retención"])
+    return df
@@ -1,36 +1,29 @@
-import pdfplumber
 import pandas as pd
 import re
+from amounts import parse_amounts
+from extractor_registry import page_spec
+from pdf_pages import iter_document_texts
 
 def extract_res_ussel(pdf_path) -> pd.DataFrame:
     referencias = []
     montos = []
 
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text()
-            if not text:
-                continue
-
-            for line in text.splitlines():
-                if "FA-" not in line:
-                    continue
+    for text in iter_document_texts(pdf_path, page_spec("extract_res_ussel")):
+        if not text:
+            continue
 
-                ref_match = re.search(r"FA-(\d{5,8})", line)
-                monto_match = re.search(r"\$?\s*(-?\d{1,3}(?:\.\d{3})*,\d{2})", line)
+        for line in text.splitlines():
+            if "FA-" not in line:
+                continue
 
-                if ref_match and monto_match:
-                    referencia = ref_match.group(1)
-                    monto_str = monto_match.group(1)
+            ref_match = re.search(r"FA-(\d{5,8})", line)
+            monto_match = re.search(r"\$?\s*(-?\d{1,3}(?:\.\d{3})*,\d{2})", line)
 
-                    try:
-                        monto = float(monto_str.replace(".", "").replace(",", "."))
-                        referencias.append(referencia)
-                        montos.append(monto)
-                    except ValueError:
-                        continue
+            if ref_match and monto_match:
+                referencias.append(ref_match.group(1))
+                montos.append(monto_match.group(1))
 
     return pd.DataFrame({
         "Referencia": referencias,
-        "Monto": montos
+        "Monto": parse_amounts(montos).array
     })
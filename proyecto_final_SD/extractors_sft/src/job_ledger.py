@@ -0,0 +1,442 @@
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from logger import log_event
+
+EXTRACTORS_SFT_ROOT = Path(__file__).resolve().parent.parent
+
+# Registro local de trabajos: cada PDF de un lote es un trabajo que pasa por submitted -> started ->
+# file_generated -> completed (o error, timeout, rejected). Si la GUI o el servicio local se caen a mitad de un lote,
+# reanudar el lote vuelve a enviar solo los trabajos que no llegaron a completed.
+LEDGER_ENV_VAR = "FINEXTRACT_LEDGER"
+DEFAULT_LEDGER_PATH = EXTRACTORS_SFT_ROOT / "ledger" / "trabajos.sqlite"
+
+SUBMITTED = "submitted"
+STARTED = "started"
+FILE_GENERATED = "file_generated"
+COMPLETED = "completed"
+ERROR = "error"
+TIMEOUT = "timeout"
+REJECTED = "rejected"
+JOB_STATES = (SUBMITTED, STARTED, FILE_GENERATED, COMPLETED, ERROR, TIMEOUT, REJECTED)
+IN_FLIGHT_STATES = (SUBMITTED, STARTED, FILE_GENERATED)
+FINAL_STATES = (COMPLETED, TIMEOUT, REJECTED)
+FAILED_STATES = (ERROR, TIMEOUT, REJECTED)
+
+# Los eventos solo hacen avanzar un trabajo: uno tardío o desordenado (un started que llega después del
+# completed) se ignora. error no es final: el servicio local lo registra al agotar los reintentos, pero un mensaje
+# que RabbitMQ reentrega (worker caído) todavía puede volver a started.
+# Volver a submitted es solo cosa de submit (reenvío o reanudación del lote).
+STATE_ORDER = {SUBMITTED: 0, STARTED: 1, FILE_GENERATED: 2, ERROR: 3, COMPLETED: 3, TIMEOUT: 3, REJECTED: 3}
+
+# Un PDF cuyo contenido ya está en curso en otro trabajo no genera trabajo nuevo: se adjunta al trabajo
+# en curso y recibe sus transiciones. Solo si el lote del trabajo en curso escribe en la misma carpeta, con los
+# mismos formatos y modo: si no, el adjunto nunca tendría su salida. Solo cuentan los trabajos actualizados dentro
+# de la ventana, para que un worker caído no deje documentos bloqueados para siempre. "0" desactiva la deduplicación.
+# Los adjuntos se sueltan cuando el trabajo principal falla o se reenvía; reanudar su lote los procesa por su cuenta.
+DEDUPE_ENV_VAR = "FINEXTRACT_DEDUPE_SECONDS"
+DEFAULT_DEDUPE_WINDOW_SECONDS = 3600
+DEDUPE_GLOBAL = "global"
+DEDUPE_BATCH = "batch"
+
+# Eventos de system_status_queue -> estado del trabajo.
+EVENT_STATES = {
+    "pdf_processing_started": STARTED,
+    "file_generated": FILE_GENERATED,
+    "pdf_processing_completed": COMPLETED,
+    "pdf_processing_error": ERROR,
+    "pdf_processing_timeout": TIMEOUT,
+    "pdf_rejected": REJECTED,
+}
+
+# Eventos que cierran un trabajo o anuncian un archivo: se publican persistentes y la cola de estado local no los
+# descarta aunque esté llena, así el progreso del lote siempre termina.
+PERSISTENT_EVENTS = frozenset(("file_generated", "pdf_processing_completed", "pdf_processing_error", "pdf_processing_timeout", "pdf_rejected"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS lotes (
+    batch_id TEXT PRIMARY KEY,
+    creado REAL NOT NULL,
+    output_dir TEXT NOT NULL,
+    output_formats TEXT,
+    batch_mode TEXT,
+    origen TEXT
+);
+CREATE TABLE IF NOT EXISTS trabajos (
+    job_id TEXT PRIMARY KEY,
+    batch_id TEXT NOT NULL REFERENCES lotes (batch_id),
+    pdf_path TEXT NOT NULL,
+    content_hash TEXT,
+    extractor_name TEXT,
+    estado TEXT NOT NULL,
+    intentos INTEGER NOT NULL DEFAULT 1,
+    error TEXT,
+    adjunto_a TEXT,
+    creado REAL NOT NULL,
+    actualizado REAL NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS trabajos_lote_pdf ON trabajos (batch_id, pdf_path);
+CREATE INDEX IF NOT EXISTS trabajos_lote_estado ON trabajos (batch_id, estado);
+CREATE INDEX IF NOT EXISTS trabajos_estado ON trabajos (estado, actualizado);
+CREATE INDEX IF NOT EXISTS trabajos_hash ON trabajos (content_hash, estado);
+CREATE TABLE IF NOT EXISTS transiciones (
+    job_id TEXT NOT NULL,
+    estado TEXT NOT NULL,
+    momento REAL NOT NULL,
+    detalle TEXT
+);
+CREATE INDEX IF NOT EXISTS transiciones_trabajo ON transiciones (job_id, momento);
+CREATE TABLE IF NOT EXISTS archivos (
+    job_id TEXT NOT NULL,
+    path TEXT NOT NULL,
+    creado REAL NOT NULL,
+    PRIMARY KEY (job_id, path)
+);
+"""
+
+_DISABLED_VALUES = ("0", "false", "off", "no")
+_env_value = os.environ.get(LEDGER_ENV_VAR, "").strip()
+_settings = {
+    "enabled": _env_value.lower() not in _DISABLED_VALUES,
+    "path": Path(_env_value) if _env_value and _env_value.lower() not in _DISABLED_VALUES + ("1", "true", "on", "yes") else DEFAULT_LEDGER_PATH,
+}
+_dedupe_window_seconds = float(os.environ.get(DEDUPE_ENV_VAR, DEFAULT_DEDUPE_WINDOW_SECONDS))
+_ledgers = {}
+_ledgers_lock = threading.Lock()
+
+
+def allowed_transition(actual: str, nuevo: str) -> bool:
+    if actual is None or actual == ERROR or nuevo == actual:
+        return True
+    if actual in FINAL_STATES:
+        return False
+    return STATE_ORDER[nuevo] > STATE_ORDER[actual]
+
+
+def _rows(cursor) -> list[dict]:
+    columnas = [c[0] for c in cursor.description]
+    return [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
+
+
+class JobLedger:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._connection().executescript(_SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        # Registros creados antes de la deduplicación no tienen la columna adjunto_a.
+        connection = self._connection()
+        columnas = {fila[1] for fila in connection.execute("PRAGMA table_info(trabajos)")}
+        indice_hash = connection.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = 'trabajos_hash'").fetchone()
+        with connection:
+            if "adjunto_a" not in columnas:
+                connection.execute("ALTER TABLE trabajos ADD COLUMN adjunto_a TEXT")
+            if indice_hash and "estado" not in indice_hash[0]:
+                connection.execute("DROP INDEX trabajos_hash")
+                connection.execute("CREATE INDEX trabajos_hash ON trabajos (content_hash, estado)")
+            connection.execute("CREATE INDEX IF NOT EXISTS trabajos_adjunto ON trabajos (adjunto_a)")
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def create_batch(self, output_dir: Path, output_formats: list[str] = None, batch_mode: str = None, origen: str = None) -> str:
+        batch_id = f"{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT INTO lotes (batch_id, creado, output_dir, output_formats, batch_mode, origen) VALUES (?, ?, ?, ?, ?, ?)",
+                (batch_id, time.time(), str(Path(output_dir).resolve()), json.dumps(output_formats) if output_formats else None, batch_mode, origen)
+            )
+        return batch_id
+
+    def _in_flight_job(self, connection, doc_hash: str, lote: tuple, batch_id: str = None, excluir: set = ()):
+        # lote: (output_dir, output_formats, batch_mode) del lote que envía; el principal tiene que coincidir.
+        if not doc_hash or not lote or _dedupe_window_seconds <= 0:
+            return None
+        marcadores = ",".join("?" for _ in IN_FLIGHT_STATES)
+        excluidos = ",".join("?" for _ in excluir) or "''"
+        consulta = (
+            "SELECT t.job_id FROM trabajos t JOIN lotes l ON l.batch_id = t.batch_id "
+            f"WHERE t.content_hash = ? AND t.estado IN ({marcadores}) AND t.adjunto_a IS NULL "
+            f"AND t.job_id NOT IN ({excluidos}) AND t.actualizado >= ? "
+            "AND l.output_dir = ? AND l.output_formats IS ? AND l.batch_mode IS ?"
+        )
+        parametros = [doc_hash, *IN_FLIGHT_STATES, *excluir, time.time() - _dedupe_window_seconds, *lote]
+        if batch_id:
+            consulta += " AND t.batch_id = ?"
+            parametros.append(batch_id)
+        fila = connection.execute(consulta + " ORDER BY t.creado LIMIT 1", parametros).fetchone()
+        return fila[0] if fila else None
+
+    def _release_attached(self, connection, job_id: str, ahora: float, reenviados: set):
+        # El trabajo se reenvía: sus adjuntos dejan de seguirlo. Los que se reenvían en este mismo envío vuelven a
+        # evaluarse; el resto queda con error para que reanudar su lote los procese.
+        for adjunto, estado in connection.execute("SELECT job_id, estado FROM trabajos WHERE adjunto_a = ?", (job_id,)).fetchall():
+            if adjunto in reenviados or estado not in IN_FLIGHT_STATES:
+                connection.execute("UPDATE trabajos SET adjunto_a = NULL WHERE job_id = ?", (adjunto,))
+                continue
+            mensaje = f"El trabajo principal {job_id} se reenvió; reanudar el lote de este trabajo para procesarlo."
+            connection.execute(
+                "UPDATE trabajos SET adjunto_a = NULL, estado = ?, error = ?, actualizado = ? WHERE job_id = ?",
+                (ERROR, mensaje, ahora, adjunto)
+            )
+            connection.execute("INSERT INTO transiciones (job_id, estado, momento, detalle) VALUES (?, ?, ?, ?)", (adjunto, ERROR, ahora, mensaje))
+
+    def submit(self, batch_id: str, pdf_paths: list[Path], dedupe: str = DEDUPE_GLOBAL) -> dict:
+        # Idempotente por (lote, PDF): reenviar un PDF del lote reutiliza su job_id y suma un intento.
+        # Con dedupe, un PDF cuyo contenido ya está en curso queda adjunto a ese trabajo (adjunto_a).
+        from text_store import content_hash
+
+        hashes = {}
+        for pdf_path in pdf_paths:
+            pdf_path = str(Path(pdf_path).resolve())
+            try:
+                hashes[pdf_path] = content_hash(pdf_path)
+            except OSError:
+                hashes[pdf_path] = None
+
+        ahora = time.time()
+        trabajos = {}
+        connection = self._connection()
+        with connection:
+            # BEGIN IMMEDIATE toma el lock de escritura antes de buscar trabajos en curso: dos envíos
+            # simultáneos del mismo PDF (desde distintos procesos) no pueden crear trabajo los dos.
+            connection.execute("BEGIN IMMEDIATE")
+            lote = connection.execute("SELECT output_dir, output_formats, batch_mode FROM lotes WHERE batch_id = ?", (batch_id,)).fetchone()
+            existentes = {}
+            for pdf_path in hashes:
+                fila = connection.execute("SELECT job_id, adjunto_a FROM trabajos WHERE batch_id = ? AND pdf_path = ?", (batch_id, pdf_path)).fetchone()
+                if fila:
+                    existentes[pdf_path] = fila
+            reenviados = {fila[0] for fila in existentes.values()}
+            for job_id in reenviados:
+                self._release_attached(connection, job_id, ahora, reenviados)
+
+            # Los reenviados todavía no evaluados no cuentan como trabajos en curso.
+            pendientes = set(reenviados)
+            for pdf_path, doc_hash in hashes.items():
+                fila = existentes.get(pdf_path)
+                job_id = fila[0] if fila else uuid.uuid4().hex
+                pendientes.discard(job_id)
+                # Un adjunto que se reenvía no vuelve al principal que tenía: si ese sigue en curso sin avanzar, se cayó.
+                excluir = pendientes | {job_id} | ({fila[1]} if fila and fila[1] and fila[1] not in reenviados else set())
+                primario = self._in_flight_job(connection, doc_hash, lote, batch_id if dedupe == DEDUPE_BATCH else None, excluir) if dedupe else None
+                if fila:
+                    connection.execute(
+                        "UPDATE trabajos SET estado = ?, content_hash = ?, intentos = intentos + 1, error = NULL, adjunto_a = ?, actualizado = ? WHERE job_id = ?",
+                        (SUBMITTED, doc_hash, primario, ahora, job_id)
+                    )
+                else:
+                    connection.execute(
+                        "INSERT INTO trabajos (job_id, batch_id, pdf_path, content_hash, estado, adjunto_a, creado, actualizado) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (job_id, batch_id, pdf_path, doc_hash, SUBMITTED, primario, ahora, ahora)
+                    )
+                connection.execute(
+                    "INSERT INTO transiciones (job_id, estado, momento, detalle) VALUES (?, ?, ?, ?)",
+                    (job_id, SUBMITTED, ahora, f"adjunto a {primario}" if primario else None)
+                )
+                trabajos[pdf_path] = job_id
+        return trabajos
+
+    def attached_to(self, job_id: str):
+        fila = self._connection().execute("SELECT adjunto_a FROM trabajos WHERE job_id = ?", (job_id,)).fetchone()
+        return fila[0] if fila else None
+
+    def attached_jobs(self, job_id: str) -> list[str]:
+        return [fila[0] for fila in self._connection().execute("SELECT job_id FROM trabajos WHERE adjunto_a = ? ORDER BY creado", (job_id,))]
+
+    def record(self, job_id: str, estado: str, extractor_name: str = None, error: str = None, generated_file: str = None) -> bool:
+        # Devuelve False si el evento llegó tarde y el trabajo ya estaba más adelante.
+        if estado not in JOB_STATES:
+            raise ValueError(f"Estado de trabajo desconocido: '{estado}'")
+        ahora = time.time()
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            fila = connection.execute("SELECT estado FROM trabajos WHERE job_id = ?", (job_id,)).fetchone()
+            if fila and not allowed_transition(fila[0], estado):
+                log_event(f"ADVERTENCIA: Trabajo {job_id} en '{fila[0]}': se ignora el evento tardío '{estado}'.")
+                return False
+            # La transición se replica en los trabajos adjuntos (mismo contenido enviado mientras este estaba en curso).
+            afectados = [job_id] + [
+                fila[0] for fila in connection.execute("SELECT job_id, estado FROM trabajos WHERE adjunto_a = ?", (job_id,))
+                if allowed_transition(fila[1], estado)
+            ]
+            for afectado in afectados:
+                connection.execute(
+                    "UPDATE trabajos SET estado = ?, extractor_name = COALESCE(?, extractor_name), error = ?, actualizado = ? WHERE job_id = ?",
+                    (estado, extractor_name, error, ahora, afectado)
+                )
+                connection.execute(
+                    "INSERT INTO transiciones (job_id, estado, momento, detalle) VALUES (?, ?, ?, ?)",
+                    (afectado, estado, ahora, error or generated_file)
+                )
+                if generated_file:
+                    connection.execute("INSERT OR REPLACE INTO archivos (job_id, path, creado) VALUES (?, ?, ?)", (afectado, generated_file, ahora))
+            if estado in FAILED_STATES:
+                # Los adjuntos ya recibieron el fallo; se sueltan para que reanudar su lote los procese por su cuenta.
+                connection.execute("UPDATE trabajos SET adjunto_a = NULL WHERE adjunto_a = ?", (job_id,))
+        return True
+
+    def get_batch(self, batch_id: str) -> dict:
+        lotes = _rows(self._connection().execute("SELECT * FROM lotes WHERE batch_id = ?", (batch_id,)))
+        if not lotes:
+            return None
+        lote = lotes[0]
+        lote["output_formats"] = json.loads(lote["output_formats"]) if lote["output_formats"] else None
+        return lote
+
+    def batches(self, limit: int = 20) -> list[dict]:
+        lotes = _rows(self._connection().execute("SELECT * FROM lotes ORDER BY creado DESC LIMIT ?", (limit,)))
+        for lote in lotes:
+            conteos = self._connection().execute(
+                "SELECT estado, COUNT(*) FROM trabajos WHERE batch_id = ? GROUP BY estado", (lote["batch_id"],)
+            ).fetchall()
+            lote["estados"] = dict(conteos)
+        return lotes
+
+    def jobs(self, batch_id: str = None, estado: str = None, content_hash: str = None) -> list[dict]:
+        condiciones, parametros = [], []
+        for columna, valor in (("batch_id", batch_id), ("estado", estado), ("content_hash", content_hash)):
+            if valor:
+                condiciones.append(f"{columna} = ?")
+                parametros.append(valor)
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        return _rows(self._connection().execute(f"SELECT * FROM trabajos {where} ORDER BY creado", parametros))
+
+    def unfinished_jobs(self, batch_id: str) -> list[dict]:
+        # Los rechazados por el chequeo previo no se reenvían: volverían a rechazarse.
+        return _rows(self._connection().execute(
+            "SELECT * FROM trabajos WHERE batch_id = ? AND estado NOT IN (?, ?) ORDER BY creado", (batch_id, COMPLETED, REJECTED)
+        ))
+
+    def generated_files(self, job_id: str) -> list[str]:
+        return [fila[0] for fila in self._connection().execute("SELECT path FROM archivos WHERE job_id = ? ORDER BY creado", (job_id,))]
+
+    def file_extractors(self) -> dict:
+        # Archivo generado -> extractor que lo produjo (el Excel no guarda el extractor en sus columnas).
+        return dict(self._connection().execute(
+            "SELECT a.path, t.extractor_name FROM archivos a JOIN trabajos t ON t.job_id = a.job_id WHERE t.extractor_name IS NOT NULL ORDER BY a.creado"
+        ).fetchall())
+
+
+def configure_job_ledger(enabled: bool = None, path: str = None) -> dict:
+    if enabled is not None:
+        _settings["enabled"] = bool(enabled)
+    if path is not None:
+        _settings["path"] = Path(path)
+    log_event(f"Registro de trabajos {'ACTIVADO' if _settings['enabled'] else 'desactivado'} ({_settings['path']})")
+    return {"enabled": _settings["enabled"], "path": str(_settings["path"])}
+
+
+def get_job_ledger():
+    if not _settings["enabled"]:
+        return None
+    path = _settings["path"]
+    with _ledgers_lock:
+        if path not in _ledgers:
+            try:
+                _ledgers[path] = JobLedger(path)
+            except (OSError, sqlite3.Error) as e:
+                log_event(f"ADVERTENCIA: No se pudo abrir el registro de trabajos {path} ({e}). Se procesa sin registro.")
+                _ledgers[path] = None
+        return _ledgers[path]
+
+
+def start_batch(pdf_paths: list[Path], output_dir: Path, output_formats: list[str] = None, batch_mode: str = None,
+                origen: str = None, batch_id: str = None, dedupe: str = DEDUPE_GLOBAL) -> tuple[str, dict]:
+    # Devuelve (batch_id, {ruta_pdf_resuelta: job_id}); sin registro disponible, (None, {}).
+    ledger = get_job_ledger()
+    if ledger is None:
+        return None, {}
+    try:
+        batch_id = batch_id or ledger.create_batch(output_dir, output_formats, batch_mode, origen)
+        return batch_id, ledger.submit(batch_id, pdf_paths, dedupe)
+    except sqlite3.Error as e:
+        log_event(f"ADVERTENCIA: No se pudo registrar el lote en el registro de trabajos: {e}")
+        return None, {}
+
+
+def primary_job(job_id: str):
+    # job_id del trabajo en curso al que quedó adjunto este envío, o None si hay que procesarlo.
+    ledger = get_job_ledger() if job_id else None
+    if ledger is None:
+        return None
+    try:
+        return ledger.attached_to(job_id)
+    except sqlite3.Error as e:
+        log_event(f"ADVERTENCIA: No se pudo consultar el trabajo {job_id} en el registro: {e}")
+        return None
+
+
+def attached_job_ids(job_id: str) -> list[str]:
+    ledger = get_job_ledger() if job_id else None
+    if ledger is None:
+        return []
+    try:
+        return ledger.attached_jobs(job_id)
+    except sqlite3.Error:
+        return []
+
+
+def record_job_event(job_id: str, event_type: str, extractor_name: str = None, error_message: str = None, generated_file_path: str = None):
+    estado = EVENT_STATES.get(event_type)
+    ledger = get_job_ledger() if job_id and estado else None
+    if ledger is None:
+        return
+    try:
+        ledger.record(job_id, estado, extractor_name, error_message, generated_file_path)
+    except sqlite3.Error as e:
+        log_event(f"ADVERTENCIA: No se pudo registrar '{event_type}' del trabajo {job_id}: {e}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    # Se usa el módulo importado (no __main__) para compartir la configuración con main.
+    from job_ledger import configure_job_ledger, get_job_ledger
+
+    parser = argparse.ArgumentParser(description="Consulta el registro de trabajos y reanuda lotes interrumpidos.")
+    parser.add_argument("--registro", type=Path, default=None, help=f"Archivo SQLite (por defecto {DEFAULT_LEDGER_PATH} o ${LEDGER_ENV_VAR})")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+    lotes = subparsers.add_parser("lotes", help="Últimos lotes con la cantidad de trabajos por estado")
+    lotes.add_argument("--limite", type=int, default=20)
+    trabajos = subparsers.add_parser("trabajos", help="Trabajos filtrados por lote, estado o hash de contenido")
+    trabajos.add_argument("--lote", default=None)
+    trabajos.add_argument("--estado", default=None, choices=JOB_STATES)
+    trabajos.add_argument("--hash", default=None)
+    reanudar = subparsers.add_parser("reanudar", help="Vuelve a enviar los trabajos no completados de un lote")
+    reanudar.add_argument("lote")
+    args = parser.parse_args()
+
+    configure_job_ledger(enabled=True, path=args.registro)
+    ledger = get_job_ledger()
+    if ledger is None:
+        raise SystemExit(1)
+
+    if args.comando == "lotes":
+        for lote in ledger.batches(args.limite):
+            estados = ", ".join(f"{estado}={n}" for estado, n in sorted(lote["estados"].items()))
+            print(f"{lote['batch_id']}  {lote['origen'] or '-':<6} {lote['batch_mode'] or 'por archivo':<12} {estados}  -> {lote['output_dir']}")
+    elif args.comando == "trabajos":
+        for trabajo in ledger.jobs(args.lote, args.estado, args.hash):
+            print(f"{trabajo['job_id']}  {trabajo['estado']:<15}{trabajo['extractor_name'] or '-':<20}{Path(trabajo['pdf_path']).name}"
+                  f"{'  [adjunto a ' + trabajo['adjunto_a'] + ']' if trabajo['adjunto_a'] else ''}"
+                  f"{'  (' + trabajo['error'] + ')' if trabajo['error'] else ''}")
+    elif args.comando == "reanudar":
+        from main import load_config, reanudar_lote
+        reanudar_lote(args.lote, load_config())
@@ -1,9 +1,8 @@
-import pika
 import json
-import pandas as pd
 from pathlib import Path
 import sys
 import os
+import threading
 import traceback
 import datetime
 import time
@@ -17,93 +16,153 @@ if str(project_root) not in sys.path:
 if str(src_dir) not in sys.path:
     sys.path.insert(0, str(src_dir))
 
-from extractor_polakof import extract_polakof
-from extractor_tata import extract_tata
-from extractor_macro_res import extract_res_macro
-from extractor_macro_ops import extract_ops_macro
-from extractor_bowerey import extract_bowerey
-from extractor_GDU import extract_GDU
-from extractor_ussel_res import extract_res_ussel
-from extractor_ussel_ops import extract_ops_ussel
-
+from extractor_registry import is_local, load_extractor, resolve_extractor_names
+from job_ledger import PERSISTENT_EVENTS, attached_job_ids, record_job_event
 from transformer import transform
-from excel_generator import to_excel
-from validator import validate_excel
-from logger import log_event
-
-from prometheus_client import Counter, Histogram, Gauge, generate_latest, start_http_server
+from output_sinks import VALIDATION_ARTIFACT, write_artifacts
+from logger import configure_logging, log_context, log_event
+from tracing import TRACEPARENT_HEADER, current_span, mark_span_error, record_span, root_span, status_trace_fields
+from pipeline_metrics import METRICS_PORT_ENV_VAR, LazyMetric, metrics_port as resolve_metrics_port, start_metrics_server, stage_timer, extraction_timer, observe_stage, observe_rows, observe_queue_wait
+from profiler import profile_document, install_signal_toggle
+from memory_guard import MemoryGuard
+from deadlines import DeadlineExceeded, IsolatedRunner, PreflightRejected, configure_deadlines, deadline_for, get_runner, isolated_peak_rss, preflight, run_with_deadline, shutdown_isolation, use_thread_runner
+from transport import LOCAL_BACKEND, TRANSPORT_ENV_VAR, TransportUnavailable, configure_transport, get_transport, job_queue_name, reroute_legacy_jobs
+from worker_status import WorkerStatusReporter
 
-RABBITMQ_HOST = 'localhost'
-RABBITMQ_QUEUE_NAME = 'pdf_processing_queue'
 RABBITMQ_STATUS_QUEUE_NAME = 'system_status_queue'
 
 LOCAL_PROCESSOR_PROMETHEUS_METRICS_PORT = 8001
-start_http_server(LOCAL_PROCESSOR_PROMETHEUS_METRICS_PORT)
-print(f"Servidor de métricas de Prometheus para Local Processor iniciado en el puerto: {LOCAL_PROCESSOR_PROMETHEUS_METRICS_PORT}")
 
-LOCAL_PROCESSOR_PDF_PROCESSED_TOTAL = Counter(
+# Permite levantar workers que atienden solo algunos proveedores (ej. "extract_GDU,extract_res_macro").
+# Cada extractor tiene su cola de trabajo y el worker consume solo las de los extractores que atiende.
+SERVED_EXTRACTORS_ENV_VAR = "FINEXTRACT_EXTRACTORS"
+served_extractors = resolve_extractor_names(os.environ.get(SERVED_EXTRACTORS_ENV_VAR))
+
+# Un documento cuyo extractor falla se reintenta al final de su cola hasta FINEXTRACT_MAX_ATTEMPTS veces en total;
+# el intento va en un header del mensaje. Agotados los intentos se confirma y se publica el error final.
+MAX_ATTEMPTS_ENV_VAR = "FINEXTRACT_MAX_ATTEMPTS"
+DEFAULT_MAX_ATTEMPTS = 3
+ATTEMPT_HEADER = "x-finextract-attempt"
+
+# Solo escribe estado si el worker fue lanzado por supervisor.py (FINEXTRACT_WORKER_STATUS_DIR).
+worker_status = WorkerStatusReporter()
+
+# Límites de documentos y memoria tras los cuales el worker se recicla ($FINEXTRACT_MAX_DOCUMENTS, $FINEXTRACT_MAX_RSS_MB).
+memory_guard = MemoryGuard()
+
+LOCAL_PROCESSOR_PDF_PROCESSED_TOTAL = LazyMetric(
+    'Counter',
     'local_processor_pdf_processed_total',
     'Total number of PDFs processed by the local processor service.',
     ['extractor', 'status']
 )
 
-LOCAL_PROCESSOR_PROCESSING_DURATION_SECONDS = Histogram(
+LOCAL_PROCESSOR_PROCESSING_DURATION_SECONDS = LazyMetric(
+    'Histogram',
     'local_processor_pdf_processing_duration_seconds',
     'Duration of PDF processing by the local processor service in seconds.',
     ['extractor']
 )
 
-EXTRACTOR_FUNCTIONS = {
-    "extract_polakof": extract_polakof,
-    "extract_tata": extract_tata,
-    "extract_ops_macro": extract_ops_macro,
-    "extract_res_ussel": extract_res_ussel,
-    "extract_ops_ussel": extract_ops_ussel,
-    "extract_bowerey": extract_bowerey,
-    "extract_GDU": extract_GDU,
-    "extract_res_macro": extract_res_macro,
-}
-
-def publish_status_event(event_type: str, pdf_path: str, extractor_name: str = None, error_message: str = None, generated_file_path: str = None):
+def publish_status_event(event_type: str, pdf_path: str, extractor_name: str = None, error_message: str = None, generated_file_path: str = None, extra: dict = None, job_id: str = None):
+    # Los adjuntos se leen antes de registrar el evento: un fallo los suelta del trabajo.
+    adjuntos = attached_job_ids(job_id)
+    record_job_event(job_id, event_type, extractor_name, error_message, generated_file_path)
+    start_time = time.perf_counter()
     try:
         event_payload = {
             "type": event_type,
             "pdf_path": pdf_path,
             "extractor_name": extractor_name,
             "timestamp": datetime.datetime.now().isoformat(),
+            **status_trace_fields(),
         }
         if error_message:
             event_payload['error_message'] = error_message
         if generated_file_path:
             event_payload['generated_file_path'] = generated_file_path
-
-        connection = pika.BlockingConnection(pika.ConnectionParameters(host=RABBITMQ_HOST))
-        channel = connection.channel()
-        channel.queue_declare(queue=RABBITMQ_STATUS_QUEUE_NAME, durable=True)
-        channel.basic_publish(
-            exchange='',
-            routing_key=RABBITMQ_STATUS_QUEUE_NAME,
-            body=json.dumps(event_payload)
-        )
-        connection.close()
+        if extra:
+            event_payload.update(extra)
+        if job_id:
+            event_payload['job_id'] = job_id
+            if adjuntos:
+                event_payload['attached_job_ids'] = adjuntos
+
+        get_transport().publish(RABBITMQ_STATUS_QUEUE_NAME, json.dumps(event_payload), persistent=event_type in PERSISTENT_EVENTS)
         print(f"DEBUG Local Processor: Publicado evento '{event_type}' para PDF: {pdf_path}. Generado: {generated_file_path or 'N/A'}")
     except Exception as e:
         log_event(f"ERROR: No se pudo publicar evento de estado desde el servicio local a la cola '{RABBITMQ_STATUS_QUEUE_NAME}': {e}")
+    finally:
+        observe_stage("publish_status", extractor_name, time.perf_counter() - start_time)
+
+
+def max_attempts() -> int:
+    try:
+        return max(1, int(os.environ.get(MAX_ATTEMPTS_ENV_VAR, DEFAULT_MAX_ATTEMPTS)))
+    except ValueError:
+        log_event(f"ADVERTENCIA: {MAX_ATTEMPTS_ENV_VAR} inválido ('{os.environ.get(MAX_ATTEMPTS_ENV_VAR)}'), se usa {DEFAULT_MAX_ATTEMPTS}.")
+        return DEFAULT_MAX_ATTEMPTS
+
+
+def attempt_number(method, properties) -> int:
+    # Un mensaje reentregado por el broker (worker caído a mitad del documento) cuenta como un intento más.
+    headers = getattr(properties, 'headers', None) or {}
+    try:
+        anteriores = int(headers.get(ATTEMPT_HEADER) or 0)
+    except (TypeError, ValueError):
+        anteriores = 0
+    return anteriores + 1 + (1 if getattr(method, 'redelivered', False) else 0)
 
 
 def process_message_callback(ch, method, properties, body):
+    try:
+        message = json.loads(body)
+    except Exception:
+        message = {}
+    pdf_name = Path(message.get('pdf_path') or 'unknown').name
+
+    extractor_name = message.get('extractor_name')
+
+    # La traza continúa la del envío (header traceparent del mensaje); sin header, empieza una con el job_id.
+    traceparent = (getattr(properties, 'headers', None) or {}).get(TRACEPARENT_HEADER)
+    worker_status.begin(message.get('enqueued_at'))
+    try:
+        with log_context(document=pdf_name, extractor=extractor_name, job_id=message.get('job_id')), root_span("servicio_local", "servicio_local", message.get('job_id'), traceparent, document=pdf_name, extractor=extractor_name), memory_guard.track(extractor_name), profile_document(pdf_name, extractor_name):
+            handle_message(ch, method, properties, body)
+    finally:
+        worker_status.end()
+
+    # El mensaje ya fue confirmado; se deja de consumir y start_consuming reemplaza el proceso.
+    if memory_guard.should_recycle:
+        ch.stop_consuming()
+
+
+def handle_message(ch, method, properties, body):
     pdf_path_obj = None
     pdf_path_normalized_from_message = 'unknown_path'
     extractor_name = 'unknown'
+    job_id = None
+    queue_timing = {}
 
     start_time = time.time()
     try:
         message = json.loads(body)
         pdf_path_str = message.get('pdf_path')
         extractor_name = message.get('extractor_name')
+        output_formats = message.get('output_formats')
+        job_id = message.get('job_id')
+        queue_wait_seconds = observe_queue_wait(message, extractor_name or 'unknown')
+        queue_timing = {
+            "enqueued_at": message.get("enqueued_at"),
+            "dequeued_at": message.get("dequeued_at"),
+            "queue_wait_seconds": queue_wait_seconds,
+        }
+        raiz = current_span()
+        record_span("queue_wait", message.get("enqueued_at"), message.get("dequeued_at"), raiz.parent_id if raiz else None, extractor=extractor_name)
 
         if not all([pdf_path_str, extractor_name]):
             log_event(f"ERROR: Mensaje incompleto o mal formado recibido por el servicio local: {message}. Ignorando.")
+            record_job_event(job_id, "pdf_processing_error", extractor_name, "Mensaje incompleto o mal formado.")
             ch.basic_ack(method.delivery_tag)
             LOCAL_PROCESSOR_PDF_PROCESSED_TOTAL.labels(extractor=extractor_name or 'unknown', status='error').inc()
             return
@@ -116,91 +175,156 @@ def process_message_callback(ch, method, properties, body):
 
         log_event(f"Servicio Local - Consumiendo mensaje: Procesando '{pdf_path_obj.name}' con '{extractor_name}'")
 
-        if extractor_name not in EXTRACTOR_FUNCTIONS:
+        if not is_local(extractor_name):
             log_event(f"ERROR: Extractor '{extractor_name}' no encontrado en el mapeo local de este servicio. Ignorando mensaje para '{pdf_path_obj.name}'.")
+            record_job_event(job_id, "pdf_processing_error", extractor_name, f"Extractor '{extractor_name}' no disponible en el servicio local.")
             ch.basic_ack(method.delivery_tag)
             LOCAL_PROCESSOR_PDF_PROCESSED_TOTAL.labels(extractor=extractor_name, status='error').inc()
             return
 
-        extractor_func = EXTRACTOR_FUNCTIONS[extractor_name]
+        extractor_func = load_extractor(extractor_name)
 
         if not pdf_path_obj.exists():
             log_event(f"ADVERTENCIA: PDF no encontrado en la ruta especificada por el mensaje: '{pdf_path_obj}'. Marcando mensaje como procesado.")
+            record_job_event(job_id, "pdf_processing_error", extractor_name, "PDF no encontrado.")
             ch.basic_ack(method.delivery_tag)
             LOCAL_PROCESSOR_PDF_PROCESSED_TOTAL.labels(extractor=extractor_name, status='error').inc()
             return
 
-        df = extractor_func(pdf_path_obj)
+        # El mensaje trae páginas y plazo calculados al enviar; si no, se calculan acá.
+        pages = message.get('pages')
+        if pages is None:
+            pages = preflight(pdf_path_obj)["pages"]
+        deadline_seconds = message.get('deadline_seconds') or deadline_for(extractor_name, pages)
+
+        try:
+            with extraction_timer(extractor_name):
+                df = run_with_deadline(extractor_func, (pdf_path_obj,), deadline_seconds, "extraction", extractor_name)
+        finally:
+            memory_guard.note_peak(isolated_peak_rss())
+        observe_rows(extractor_name, len(df))
 
         if extractor_name != "extract_GDU" and any("Monto" in col for col in df.columns):
-            df = transform(df)
+            with stage_timer("transform", extractor_name):
+                df = transform(df)
 
         if df.empty or df["Referencia"].isna().all():
             log_event(f"{pdf_path_obj.name}: sin datos válidos para generar Excel (procesado por servicio local), se omitirá la generación de Excel y validación.")
-            publish_status_event("pdf_processing_completed", pdf_path_normalized_from_message, extractor_name)
+            publish_status_event("pdf_processing_completed", pdf_path_normalized_from_message, extractor_name, extra=queue_timing, job_id=job_id)
             LOCAL_PROCESSOR_PDF_PROCESSED_TOTAL.labels(extractor=extractor_name, status='completed_no_output').inc()
         else:
-            output_excel_filename = f"{pdf_path_obj.stem}_output.xlsx"
-            output_excel_path_local = output_folder_local / output_excel_filename
-            to_excel(df, str(output_excel_path_local))
-            log_event(f"Excel generado por Servicio Local: {output_excel_path_local.name}")
-
-            publish_status_event(
-                "file_generated",
-                pdf_path_normalized_from_message,
-                extractor_name,
-                generated_file_path=str(output_excel_path_local.resolve())
-            )
-
-            validation_filename = f"{pdf_path_obj.stem}_validation.txt"
-            validation_path_local = output_folder_local / validation_filename
-            validate_excel(output_excel_path_local, pdf_path_obj.name)
-            log_event(f"Validación generada por Servicio Local: {validation_path_local.stem}_validation.txt")
-
-            if validation_path_local.exists():
+            # file_generated se publica recién cuando el artefacto quedó renombrado en su ruta final.
+            def publicar_artefacto(tipo, output_path_local):
+                if tipo == VALIDATION_ARTIFACT:
+                    log_event(f"Validación generada por Servicio Local: {output_path_local.name}")
+                else:
+                    log_event(f"Archivo de salida generado por Servicio Local: {output_path_local.name}")
                 publish_status_event(
                     "file_generated",
                     pdf_path_normalized_from_message,
                     extractor_name,
-                    generated_file_path=str(validation_path_local.resolve())
+                    generated_file_path=str(output_path_local.resolve()),
+                    job_id=job_id
                 )
 
-            publish_status_event("pdf_processing_completed", pdf_path_normalized_from_message, extractor_name)
+            write_artifacts(df, output_folder_local, pdf_path_obj.stem, output_formats, pdf_path_obj.name, extractor_name, publicar_artefacto)
+
+            publish_status_event("pdf_processing_completed", pdf_path_normalized_from_message, extractor_name, extra=queue_timing, job_id=job_id)
             LOCAL_PROCESSOR_PDF_PROCESSED_TOTAL.labels(extractor=extractor_name, status='completed').inc()
 
         ch.basic_ack(method.delivery_tag)
         log_event(f"Servicio Local - Procesamiento de '{pdf_path_obj.name}' completado exitosamente.")
 
+    except (PreflightRejected, DeadlineExceeded) as e:
+        # No se reencola: el mismo documento volvería a trabar (o a ser rechazado por) el siguiente worker.
+        if isinstance(e, PreflightRejected):
+            event_type, status, extra = "pdf_rejected", "rejected", {"reason": e.reason, **e.info}
+        else:
+            event_type, status, extra = "pdf_processing_timeout", "timeout", {"stage": e.stage, "deadline_seconds": e.seconds}
+        mark_span_error(e)
+        log_event(f"Servicio Local - '{pdf_path_normalized_from_message}' cancelado ({status}): {e}")
+        publish_status_event(event_type, pdf_path_normalized_from_message, extractor_name, str(e), extra={**queue_timing, **extra}, job_id=job_id)
+        LOCAL_PROCESSOR_PDF_PROCESSED_TOTAL.labels(extractor=extractor_name, status=status).inc()
+        ch.basic_ack(method.delivery_tag)
     except Exception as e:
         error_message = str(e)
+        mark_span_error(e)
         log_event(f"ERROR CRÍTICO en el Servicio de Procesamiento Local para '{pdf_path_normalized_from_message}': {type(e).__name__} - {error_message}")
-        log_event(traceback.format_exc())
+        log_event(traceback.format_exc(), level="ERROR")
+
+        intento, limite = attempt_number(method, properties), max_attempts()
+        if intento < limite:
+            # Se republica al final de la cola con el intento anotado: los demás documentos siguen avanzando.
+            try:
+                headers = {**(getattr(properties, 'headers', None) or {}), ATTEMPT_HEADER: intento}
+                get_transport().publish(method.routing_key, body, headers, persistent=True)
+            except Exception as publish_error:
+                log_event(f"ERROR: No se pudo reencolar '{pdf_path_normalized_from_message}' ({publish_error}), se devuelve a la cola.")
+                ch.basic_nack(method.delivery_tag, requeue=True)
+                return
+            publish_status_event("pdf_processing_retry", pdf_path_normalized_from_message, extractor_name, error_message, extra={**queue_timing, "attempt": intento, "max_attempts": limite}, job_id=job_id)
+            LOCAL_PROCESSOR_PDF_PROCESSED_TOTAL.labels(extractor=extractor_name, status='retry').inc()
+            ch.basic_ack(method.delivery_tag)
+            log_event(f"Mensaje para '{pdf_path_normalized_from_message}' falló en el intento {intento} de {limite}, será reencolado.")
+            return
 
-        publish_status_event("pdf_processing_error", pdf_path_normalized_from_message, extractor_name, error_message)
+        publish_status_event("pdf_processing_error", pdf_path_normalized_from_message, extractor_name, error_message, extra={**queue_timing, "attempt": intento, "max_attempts": limite}, job_id=job_id)
         LOCAL_PROCESSOR_PDF_PROCESSED_TOTAL.labels(extractor=extractor_name, status='error').inc()
-
-        ch.basic_nack(method.delivery_tag, requeue=True)
-        log_event(f"Mensaje para '{pdf_path_normalized_from_message}' NO reconocido (error), será reencolado.")
+        ch.basic_ack(method.delivery_tag)
+        log_event(f"Mensaje para '{pdf_path_normalized_from_message}' descartado tras {intento} intento(s) fallidos.")
     finally:
         duration = time.time() - start_time
         LOCAL_PROCESSOR_PROCESSING_DURATION_SECONDS.labels(extractor=extractor_name).observe(duration)
 
 
-def start_consuming():
+def served_queue_names() -> list[str]:
+    return [job_queue_name(extractor_name) for extractor_name in served_extractors]
+
+
+def start_consuming(extractores=None, max_documents=None, max_rss_mb=None, metrics_port=None):
+    global served_extractors
+    if extractores:
+        served_extractors = resolve_extractor_names(extractores)
+    if max_documents is not None:
+        memory_guard.max_documents = max_documents
+    if max_rss_mb is not None:
+        memory_guard.max_rss_mb = max_rss_mb
+    # El proceso aislado de extracción se reemplaza con el mismo límite de memoria que el worker.
+    get_runner().max_rss_bytes = memory_guard.max_rss_mb * 1024 * 1024
+
+    start_metrics_server(resolve_metrics_port(LOCAL_PROCESSOR_PROMETHEUS_METRICS_PORT) if metrics_port is None else metrics_port, "Local Processor")
+    install_signal_toggle()
+
+    # Solo se importan los extractores que este worker atiende.
+    for extractor_name in served_extractors:
+        load_extractor(extractor_name)
+    log_event(f"Servicio Local - Extractores atendidos: {', '.join(served_extractors) or 'ninguno'}")
+    if not served_extractors:
+        print("ERROR: El servicio local no atiende ningún extractor; revisa --extractores o $FINEXTRACT_EXTRACTORS.")
+        sys.exit(1)
+    worker_status.ready()
+
+    transport = get_transport()
+    if transport.backend == LOCAL_BACKEND:
+        # Las colas del transporte local viven en el proceso de main/GUI, que levanta sus propios hilos de consumo.
+        print(f"ERROR: Con el transporte '{LOCAL_BACKEND}' el servicio local corre dentro de main o la GUI; este proceso aparte necesita {TRANSPORT_ENV_VAR}=rabbitmq.")
+        sys.exit(1)
+
     try:
-        connection = pika.BlockingConnection(pika.ConnectionParameters(host=RABBITMQ_HOST))
-        channel = connection.channel()
-        channel.queue_declare(queue=RABBITMQ_QUEUE_NAME, durable=True)
+        reroute_legacy_jobs(transport)
+        colas = served_queue_names()
+        log_event(f"Servicio de Procesamiento Local iniciado. Esperando mensajes en {len(colas)} cola(s) de trabajo ({transport.describe()}): {', '.join(colas)}")
+        print(f"Servicio de Procesamiento Local iniciado. Esperando mensajes en {len(colas)} cola(s) de trabajo ({transport.describe()})...")
 
-        log_event(f"Servicio de Procesamiento Local iniciado. Esperando mensajes en la cola '{RABBITMQ_QUEUE_NAME}'...")
-        print(f"Servicio de Procesamiento Local iniciado. Esperando mensajes en la cola '{RABBITMQ_QUEUE_NAME}'...")
+        transport.consume(colas, process_message_callback)
 
-        channel.basic_consume(queue=RABBITMQ_QUEUE_NAME, on_message_callback=process_message_callback, auto_ack=False)
-        channel.start_consuming()
+        if memory_guard.should_recycle:
+            shutdown_isolation()
+            memory_guard.recycle(supervised=worker_status.enabled)
 
-    except pika.exceptions.AMQPConnectionError as e:
-        log_event(f"ERROR CRÍTICO de conexión AMQP: Asegúrate de que RabbitMQ esté corriendo en '{RABBITMQ_HOST}'. Error: {e}")
-        print(f"ERROR CRÍTICO de conexión AMQP: Asegúrate de que RabbitMQ esté corriendo en '{RABBITMQ_HOST}'. Error: {e}")
+    except TransportUnavailable as e:
+        log_event(f"ERROR CRÍTICO de conexión AMQP: Asegúrate de que RabbitMQ esté corriendo. Error: {e}")
+        print(f"ERROR CRÍTICO de conexión AMQP: Asegúrate de que RabbitMQ esté corriendo. Error: {e}")
         sys.exit(1)
     except Exception as e:
         log_event(f"ERROR CRÍTICO al iniciar el consumo del servicio local: {e}")
@@ -208,5 +332,56 @@ def start_consuming():
         sys.exit(1)
 
 
+_in_process_workers = []
+_in_process_lock = threading.Lock()
+_in_process_max_rss_bytes = None
+
+
+def _consume_in_process(transport, max_rss_bytes: int):
+    runner = IsolatedRunner(max_rss_bytes)
+    use_thread_runner(runner)
+    try:
+        transport.consume(served_queue_names(), process_message_callback)
+    except Exception as e:
+        log_event(f"ERROR CRÍTICO en un hilo del servicio local: {type(e).__name__} - {e}", level="ERROR")
+    finally:
+        runner.stop()
+
+
+def start_in_process_workers(count: int) -> int:
+    # Transporte local: el servicio corre en hilos del proceso de main/GUI, cada uno con su proceso aislado de
+    # extracción. Ese proceso no se recicla (es el de la aplicación); por memoria se reemplaza el proceso aislado.
+    global _in_process_max_rss_bytes
+    with _in_process_lock:
+        if _in_process_max_rss_bytes is None:
+            _in_process_max_rss_bytes = memory_guard.max_rss_mb * 1024 * 1024
+            memory_guard.max_documents = memory_guard.max_rss_mb = 0
+            for extractor_name in served_extractors:
+                load_extractor(extractor_name)
+            log_event(f"Servicio Local - {count} hilo(s) de consumo en este proceso. Extractores atendidos: {', '.join(served_extractors) or 'ninguno'}")
+
+        _in_process_workers[:] = [hilo for hilo in _in_process_workers if hilo.is_alive()]
+        transport = get_transport()
+        for numero in range(len(_in_process_workers), count):
+            hilo = threading.Thread(target=_consume_in_process, args=(transport, _in_process_max_rss_bytes), daemon=True, name=f"finextract-servicio-local-{numero + 1}")
+            hilo.start()
+            _in_process_workers.append(hilo)
+        return len(_in_process_workers)
+
+
 if __name__ == "__main__":
-    start_consuming()
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Servicio de procesamiento local de PDFs (consumidor de las colas pdf_processing_queue.<extractor> en RabbitMQ).")
+    parser.add_argument("--extractores", default=None, help=f"Extractores a atender separados por coma (por defecto todos, o ${SERVED_EXTRACTORS_ENV_VAR})")
+    parser.add_argument("--max-documentos", type=int, default=None, help="Documentos tras los cuales el worker se recicla (0 = sin límite, por defecto $FINEXTRACT_MAX_DOCUMENTS o 500)")
+    parser.add_argument("--max-rss-mb", type=int, default=None, help="Memoria residente en MB a partir de la cual el worker se recicla (0 = sin límite, por defecto $FINEXTRACT_MAX_RSS_MB o 1536)")
+    parser.add_argument("--puerto-metricas", type=int, default=None, help=f"Puerto de métricas de Prometheus (por defecto ${METRICS_PORT_ENV_VAR} o {LOCAL_PROCESSOR_PROMETHEUS_METRICS_PORT})")
+    args = parser.parse_args()
+
+    from main import load_config
+    config = load_config()
+    configure_logging(config.get("logging"))
+    configure_deadlines(config.get("deadlines"))
+    configure_transport(config.get("transport"))
+    start_consuming(args.extractores, args.max_documentos, args.max_rss_mb, args.puerto_metricas)
\ No newline at end of file
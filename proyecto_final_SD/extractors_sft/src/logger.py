@@ -1,5 +1,414 @@
+import atexit
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime
+from pathlib import Path
 
-def log_event(message: str) -> None:
-    timestamp = datetime.now().strftime("[%Y-%m-%d %H:%M:%S]")
-    print(f"{timestamp} {message}")
+# log_event encola el registro y vuelve: un hilo de fondo formatea y escribe en lotes a la consola y al archivo,
+# así que la extracción no espera a stdout. La cola es acotada; si se llena se descartan los registros nuevos
+# (los ERROR esperan hasta 1 s por lugar) y se cuentan. Cada registro lleva nivel, hora del evento y los campos
+# de log_context (documento, extractor, etapa). Sin nivel explícito, se deduce del texto: "ERROR..." y
+# "ADVERTENCIA..." conservan su severidad. Variables de entorno (las heredan los workers del supervisor):
+#   FINEXTRACT_LOG_LEVEL=DEBUG|INFO|WARNING|ERROR   FINEXTRACT_LOG_FORMAT=text|json (consola)
+#   FINEXTRACT_LOG_FILE=ruta (rotativo, JSON; "{pid}" se reemplaza)   FINEXTRACT_LOG_SAMPLING=DEBUG=0.1,INFO=0.5
+#   FINEXTRACT_LOG_ASYNC=0 escribe en el hilo que llama.
+LOG_LEVEL_ENV_VAR = "FINEXTRACT_LOG_LEVEL"
+LOG_FORMAT_ENV_VAR = "FINEXTRACT_LOG_FORMAT"
+LOG_FILE_ENV_VAR = "FINEXTRACT_LOG_FILE"
+LOG_SAMPLING_ENV_VAR = "FINEXTRACT_LOG_SAMPLING"
+LOG_ASYNC_ENV_VAR = "FINEXTRACT_LOG_ASYNC"
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+_LEVELS = {name: level for level, name in LEVEL_NAMES.items()}
+
+DEFAULT_LOGGING = {
+    "level": "INFO",
+    "console": True,
+    "console_format": "text",
+    "file": None,
+    "file_format": "json",
+    "max_file_mb": 20,
+    "backup_count": 5,
+    "queue_size": 10000,
+    "async": True,
+    "sampling": {},
+}
+
+ERROR_PUT_TIMEOUT_SECONDS = 1.0
+FLUSH_TIMEOUT_SECONDS = 5.0
+
+_DISABLED_VALUES = ("0", "false", "off", "no")
+
+
+def _sampling_from_env(value: str) -> dict:
+    sampling = {}
+    for parte in (value or "").split(","):
+        nivel, _, rate = parte.partition("=")
+        try:
+            sampling[nivel.strip().upper()] = float(rate)
+        except ValueError:
+            continue
+    return sampling
+
+
+def _env_settings() -> dict:
+    # Las variables de entorno mandan sobre config.json: permiten cambiar el registro de un worker sin tocar la
+    # configuración compartida.
+    settings = {}
+    if os.environ.get(LOG_LEVEL_ENV_VAR):
+        settings["level"] = os.environ[LOG_LEVEL_ENV_VAR].upper()
+    if os.environ.get(LOG_FORMAT_ENV_VAR):
+        settings["console_format"] = os.environ[LOG_FORMAT_ENV_VAR].lower()
+    if os.environ.get(LOG_FILE_ENV_VAR):
+        settings["file"] = os.environ[LOG_FILE_ENV_VAR]
+    if os.environ.get(LOG_SAMPLING_ENV_VAR):
+        settings["sampling"] = _sampling_from_env(os.environ[LOG_SAMPLING_ENV_VAR])
+    if os.environ.get(LOG_ASYNC_ENV_VAR, "").lower() in _DISABLED_VALUES:
+        settings["async"] = False
+    return settings
+
+
+_settings = {**DEFAULT_LOGGING, **_env_settings()}
+
+_context_default = {}
+_context = ContextVar("finextract_log_context", default=_context_default)
+_state_lock = threading.Lock()
+_write_lock = threading.Lock()
+_min_level = INFO
+_sampling = {}
+_sinks = []
+_writer = None
+_sampled = Counter()
+_closed = False
+
+_dropped_metric = None
+
+
+def _level_number(level) -> int:
+    if isinstance(level, int):
+        return level
+    return _LEVELS.get(str(level).upper(), INFO)
+
+
+def _infer_level(message: str) -> int:
+    inicio = message.lstrip()[:11].upper()
+    if inicio.startswith("ERROR"):
+        return ERROR
+    if inicio.startswith(("ADVERTENCIA", "WARNING")):
+        return WARNING
+    return INFO
+
+
+def _record_dict(record) -> dict:
+    created, level, message, fields, _ = record
+    return {
+        "ts": datetime.fromtimestamp(created).isoformat(timespec="milliseconds"),
+        "level": LEVEL_NAMES.get(level, str(level)),
+        "pid": os.getpid(),
+        "message": message,
+        **fields,
+    }
+
+
+def format_record(record, fmt: str = "text") -> str:
+    if fmt == "json":
+        return json.dumps(_record_dict(record), ensure_ascii=False, default=str)
+    return f"{datetime.fromtimestamp(record[0]).strftime('[%Y-%m-%d %H:%M:%S]')} {record[2]}"
+
+
+class ConsoleSink:
+    # Escribe en el stdout vigente cuando se registró el evento: la GUI redirige stdout del hilo de trabajo y los
+    # registros encolados durante la redirección tienen que llegar a ella aunque se escriban después.
+    def __init__(self, fmt: str = "text"):
+        self.fmt = fmt
+        self._touched = set()
+
+    def write(self, record):
+        stream = record[4] or sys.stdout
+        try:
+            stream.write(format_record(record, self.fmt) + "\n")
+            self._touched.add(stream)
+        except (OSError, ValueError):
+            pass
+
+    def flush(self):
+        for stream in self._touched:
+            try:
+                stream.flush()
+            except (OSError, ValueError):
+                pass
+        self._touched.clear()
+
+    def close(self):
+        self.flush()
+
+
+class RotatingFileSink:
+    def __init__(self, path, fmt: str = "json", max_bytes: int = 20 * 1024 * 1024, backup_count: int = 5):
+        self.path = Path(str(path).replace("{pid}", str(os.getpid())))
+        self.fmt = fmt
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._size = self._file.tell()
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            origen = self.path.with_name(f"{self.path.name}.{i}")
+            if origen.exists():
+                os.replace(origen, self.path.with_name(f"{self.path.name}.{i + 1}"))
+        if self.backup_count > 0:
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink(missing_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._size = 0
+
+    def write(self, record):
+        linea = format_record(record, self.fmt) + "\n"
+        if self.max_bytes and self._size and self._size + len(linea) > self.max_bytes:
+            self._rotate()
+        self._file.write(linea)
+        self._size += len(linea.encode("utf-8"))
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def _count_dropped(level_name: str, cantidad: int):
+    global _dropped_metric
+    if _dropped_metric is None:
+        from pipeline_metrics import LazyMetric
+        _dropped_metric = LazyMetric(
+            'Counter',
+            'pdf_pipeline_log_records_dropped_total',
+            'Log records discarded because the logging queue was full.',
+            ['level']
+        )
+    _dropped_metric.labels(level=level_name).inc(cantidad)
+
+
+def _write(records):
+    with _write_lock:
+        sinks = list(_sinks)
+        for record in records:
+            for sink in sinks:
+                try:
+                    sink.write(record)
+                except Exception:
+                    pass
+        for sink in sinks:
+            try:
+                sink.flush()
+            except Exception:
+                pass
+
+
+class _LogWriter:
+    def __init__(self, queue_size: int):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = Counter()
+        self._reported = Counter()
+        self._dropped_lock = threading.Lock()
+        self.pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="finextract-log")
+        self._thread.start()
+
+    @property
+    def alive(self) -> bool:
+        return self.pid == os.getpid() and self._thread.is_alive()
+
+    def submit(self, record):
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        if record[1] >= ERROR:
+            try:
+                self.queue.put(record, timeout=ERROR_PUT_TIMEOUT_SECONDS)
+                return
+            except queue.Full:
+                pass
+        with self._dropped_lock:
+            self.dropped[LEVEL_NAMES.get(record[1], str(record[1]))] += 1
+
+    def _drop_report(self):
+        with self._dropped_lock:
+            nuevos = self.dropped - self._reported
+            self._reported = Counter(self.dropped)
+        if not nuevos:
+            return None
+        for level_name, cantidad in nuevos.items():
+            _count_dropped(level_name, cantidad)
+        detalle = ", ".join(f"{cantidad} {nivel}" for nivel, cantidad in sorted(nuevos.items()))
+        return (time.time(), WARNING, f"ADVERTENCIA: Registro - cola llena, se descartaron {sum(nuevos.values())} registro(s) ({detalle}).", {}, None)
+
+    def _run(self):
+        while True:
+            lote = [self.queue.get()]
+            while len(lote) < 500:
+                try:
+                    lote.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            records = [r for r in lote if isinstance(r, tuple)]
+            aviso = self._drop_report()
+            if aviso:
+                records.append(aviso)
+            if records:
+                _write(records)
+            for marca in lote:
+                if isinstance(marca, threading.Event):
+                    marca.set()
+
+    def flush(self, timeout: float):
+        marca = threading.Event()
+        try:
+            self.queue.put(marca, timeout=timeout)
+        except queue.Full:
+            return False
+        return marca.wait(timeout)
+
+
+def _apply_settings():
+    global _min_level, _sampling, _sinks
+    sinks = []
+    if _settings["console"]:
+        sinks.append(ConsoleSink(_settings["console_format"]))
+    if _settings["file"]:
+        try:
+            sinks.append(RotatingFileSink(
+                _settings["file"],
+                _settings["file_format"],
+                int(float(_settings["max_file_mb"]) * 1024 * 1024),
+                int(_settings["backup_count"]),
+            ))
+        except OSError as e:
+            print(f"ADVERTENCIA: No se pudo abrir el archivo de registro '{_settings['file']}' ({e}). Se registra solo en consola.")
+    with _write_lock:
+        anteriores, _sinks = _sinks, sinks
+    for sink in anteriores:
+        try:
+            sink.close()
+        except Exception:
+            pass
+    _min_level = _level_number(_settings["level"])
+    _sampling = {_level_number(nivel): float(rate) for nivel, rate in (_settings.get("sampling") or {}).items()}
+
+
+def configure_logging(settings: dict = None, **overrides) -> dict:
+    if _writer is not None and _writer.alive:
+        _writer.flush(FLUSH_TIMEOUT_SECONDS)
+    with _state_lock:
+        for key, value in {**(settings or {}), **_env_settings(), **overrides}.items():
+            if value is not None:
+                _settings[key] = value
+        _apply_settings()
+    return dict(_settings)
+
+
+def logging_settings() -> dict:
+    return dict(_settings)
+
+
+def _get_writer():
+    global _writer
+    writer = _writer
+    if writer is not None and writer.alive:
+        return writer
+    with _state_lock:
+        if _writer is None or not _writer.alive:
+            _writer = _LogWriter(int(_settings["queue_size"]))
+        return _writer
+
+
+@contextmanager
+def log_context(**fields):
+    # Campos que se agregan a todos los registros del bloque (y de lo que llame): documento, extractor, etapa...
+    token = _context.set({**_context.get(), **{k: v for k, v in fields.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def add_log_fields(**fields):
+    # Completa el log_context más cercano con datos que se conocen a mitad del bloque (ej. el extractor
+    # detectado). Fuera de un log_context no hace nada.
+    contexto = _context.get()
+    if contexto is not _context_default:
+        contexto.update({k: v for k, v in fields.items() if v is not None})
+
+
+def log_event(message: str, level=None, **fields) -> None:
+    message = str(message)
+    level = _infer_level(message) if level is None else _level_number(level)
+    if level < _min_level:
+        return
+    rate = _sampling.get(level)
+    if rate is not None and rate < 1.0 and random.random() >= rate:
+        with _state_lock:
+            _sampled[LEVEL_NAMES.get(level, str(level))] += 1
+        return
+    # Copia del contexto: add_log_fields lo modifica en el lugar y el registro encolado se escribe más tarde.
+    record = (time.time(), level, message, {**_context.get(), **fields}, sys.stdout)
+    if _settings["async"] and not _closed:
+        _get_writer().submit(record)
+    else:
+        _write([record])
+
+
+def flush_logs(timeout: float = FLUSH_TIMEOUT_SECONDS) -> bool:
+    # Espera a que todo lo encolado hasta ahora esté escrito. Llamarlo antes de salir sin pasar por atexit
+    # (os.execv, procesos hijos que se matan) o antes de soltar una redirección de stdout.
+    writer = _writer
+    if writer is None or not writer.alive:
+        return True
+    return writer.flush(timeout)
+
+
+def log_stats() -> dict:
+    writer = _writer
+    with _state_lock:
+        sampled = dict(_sampled)
+    return {
+        "queued": writer.queue.qsize() if writer is not None else 0,
+        "dropped": dict(writer.dropped) if writer is not None else {},
+        "sampled": sampled,
+    }
+
+
+def _shutdown():
+    global _closed
+    flush_logs()
+    _closed = True
+    with _write_lock:
+        for sink in _sinks:
+            try:
+                sink.close()
+            except Exception:
+                pass
+        _sinks.clear()
+        _sinks.append(ConsoleSink(_settings["console_format"]))
+
+
+_apply_settings()
+atexit.register(_shutdown)
@@ -1,28 +1,29 @@
+from __future__ import annotations
+
+import contextlib
 import json
 import os
 import sys
 from pathlib import Path
-import requests
-import pandas as pd
-import pika
+from typing import TYPE_CHECKING
 import datetime
 import time
 
-from prometheus_client import Counter, Gauge, Histogram, generate_latest, start_http_server
-
-from extractor_polakof import extract_polakof
-from extractor_tata import extract_tata
-from extractor_macro_ops import extract_ops_macro
-from extractor_macro_res import extract_res_macro
-from extractor_bowerey import extract_bowerey
-from extractor_ussel_res import extract_res_ussel
-from extractor_ussel_ops import extract_ops_ussel
-from extractor_GDU import extract_GDU
-
-from transformer import transform
-from excel_generator import to_excel
-from validator import validate_excel
-from logger import log_event
+# pandas, requests, pika, pdfplumber y los extractores se importan dentro de las funciones que los usan:
+# la GUI importa este módulo y no debe pagar esos imports antes de mostrar la ventana.
+if TYPE_CHECKING:
+    import pandas as pd
+
+from extractor_registry import HENDERSON_BACKEND, get_spec, is_local, load_extractor
+from classifier import classify_document, log_classification
+from deadlines import DeadlineExceeded, PreflightRejected, configure_deadlines, deadline_for, deadline_settings, preflight, run_with_deadline
+from job_ledger import COMPLETED, DEDUPE_BATCH, PERSISTENT_EVENTS, attached_job_ids, get_job_ledger, primary_job, record_job_event, start_batch
+from logger import add_log_fields, configure_logging, log_context, log_event
+from tracing import annotate_span, mark_span_error, root_span, status_trace_fields, trace_headers, trace_span
+from pipeline_metrics import LazyMetric, metrics_port, start_metrics_server, stage_timer, extraction_timer, observe_stage, observe_rows
+from profiler import profile_document
+from progress import emit_progress
+from transport import LOCAL_BACKEND, configure_transport, get_transport, job_queue_name, transport_settings
 
 MAIN_PY_DIR = Path(__file__).resolve().parent
 EXTRACTORS_SFT_ROOT_LOCAL = MAIN_PY_DIR.parent
@@ -31,30 +32,39 @@ def resource_path(relative_path):
     return str(EXTRACTORS_SFT_ROOT_LOCAL / relative_path)
 
 API_HENDERSON_URL = "http://localhost:5000/extract/henderson"
-RABBITMQ_HOST = 'localhost'
-RABBITMQ_QUEUE_NAME = 'pdf_processing_queue'
 RABBITMQ_STATUS_QUEUE_NAME = 'system_status_queue'
 
-MAIN_PDF_ENQUEUED_TOTAL = Counter(
+MAIN_PDF_ENQUEUED_TOTAL = LazyMetric(
+    'Counter',
     'main_pdf_enqueued_total',
     'Total number of PDFs enqueued for asynchronous processing.'
 )
 
-MAIN_PDF_PROCESSED_TOTAL = Counter(
+MAIN_PDF_PROCESSED_TOTAL = LazyMetric(
+    'Counter',
     'main_pdf_processed_total',
     'Total number of PDFs processed by the main service (completed or error).',
     ['extractor', 'status']
 )
 
-MAIN_PROCESSING_DURATION_SECONDS = Histogram(
+MAIN_PDF_DEDUPLICATED_TOTAL = LazyMetric(
+    'Counter',
+    'main_pdf_deduplicated_total',
+    'Total number of submissions attached to an in-flight job with the same content instead of being processed again.'
+)
+
+MAIN_PROCESSING_DURATION_SECONDS = LazyMetric(
+    'Histogram',
     'main_pdf_processing_duration_seconds',
     'Duration of processing a single PDF file by the main service.',
     ['extractor']
 )
 
 PROMETHEUS_METRICS_PORT = 8000
-start_http_server(PROMETHEUS_METRICS_PORT)
-print(f"Servidor de métricas de Prometheus iniciado en el puerto: {PROMETHEUS_METRICS_PORT}")
+
+
+def start_main_metrics_server() -> bool:
+    return start_metrics_server(metrics_port(PROMETHEUS_METRICS_PORT))
 
 
 def load_config() -> dict:
@@ -69,13 +79,17 @@ def load_config() -> dict:
         return {}
 
 def call_henderson_microservice(pdf_path: Path) -> pd.DataFrame:
+    import pandas as pd
+    import requests
+
     try:
         log_event(f"Intentando conectar con el microservicio de Henderson en: {API_HENDERSON_URL}")
         with open(pdf_path, 'rb') as f:
             files = {'pdf_file': (pdf_path.name, f.read(), 'application/pdf')}
             data = {'pdf_original_path': str(pdf_path.resolve())}
 
-            response = requests.post(API_HENDERSON_URL, files=files, data=data, timeout=60)
+            with stage_timer("henderson_http", "call_henderson_microservice"):
+                response = requests.post(API_HENDERSON_URL, files=files, data=data, headers=trace_headers(), timeout=60)
 
         response.raise_for_status()
 
@@ -103,147 +117,227 @@ def call_henderson_microservice(pdf_path: Path) -> pd.DataFrame:
         log_event(f"ERROR: Error general al interactuar con el microservicio de Henderson: {e}")
         raise Exception(f"Error general al interactuar con el microservicio de Henderson: {e}")
 
+def ensure_local_workers(transport):
+    # Con el transporte local nadie más consume la cola: el servicio local corre en hilos de este proceso.
+    if transport.backend == LOCAL_BACKEND:
+        from local_processor_service import start_in_process_workers
+        start_in_process_workers(int(transport_settings()["local_workers"]))
+
 def publish_message(message_body: dict):
+    start_time = time.perf_counter()
     try:
-        connection = pika.BlockingConnection(pika.ConnectionParameters(host=RABBITMQ_HOST))
-        channel = connection.channel()
-        channel.queue_declare(queue=RABBITMQ_QUEUE_NAME, durable=True)
-        channel.basic_publish(
-            exchange='',
-            routing_key=RABBITMQ_QUEUE_NAME,
-            body=json.dumps(message_body),
-            properties=pika.BasicProperties(
-                delivery_mode=2,
-            )
-        )
+        message_body["enqueued_at"] = time.time()
+        transport = get_transport()
+        transport.publish(job_queue_name(message_body['extractor_name']), json.dumps(message_body), trace_headers(), persistent=True)
+        ensure_local_workers(transport)
         log_event(f"Mensaje publicado a la cola para: {message_body.get('pdf_path')}")
         MAIN_PDF_ENQUEUED_TOTAL.inc()
-        connection.close()
     except Exception as e:
         log_event(f"ERROR al publicar mensaje en la cola de procesamiento: {e}")
         raise
+    finally:
+        observe_stage("publish_job", message_body.get('extractor_name'), time.perf_counter() - start_time)
 
-def publish_status_event(event_type: str, pdf_path: str, extractor_name: str = None, error_message: str = None):
+def publish_status_event(event_type: str, pdf_path: str, extractor_name: str = None, error_message: str = None, job_id: str = None, extra: dict = None):
+    # Los adjuntos se leen antes de registrar el evento: un fallo los suelta del trabajo.
+    adjuntos = attached_job_ids(job_id)
+    record_job_event(job_id, event_type, extractor_name, error_message)
+    start_time = time.perf_counter()
     try:
         event_payload = {
             "type": event_type,
             "pdf_path": pdf_path,
             "extractor_name": extractor_name,
             "timestamp": datetime.datetime.now().isoformat(),
+            **status_trace_fields(),
         }
         if error_message:
             event_payload['error_message'] = error_message
-
-        connection = pika.BlockingConnection(pika.ConnectionParameters(host=RABBITMQ_HOST))
-        channel = connection.channel()
-        channel.queue_declare(queue=RABBITMQ_STATUS_QUEUE_NAME, durable=True)
-        channel.basic_publish(
-            exchange='',
-            routing_key=RABBITMQ_STATUS_QUEUE_NAME,
-            body=json.dumps(event_payload)
-        )
-        connection.close()
+        if extra:
+            event_payload.update(extra)
+        if job_id:
+            event_payload['job_id'] = job_id
+            if adjuntos:
+                event_payload['attached_job_ids'] = adjuntos
+
+        get_transport().publish(RABBITMQ_STATUS_QUEUE_NAME, json.dumps(event_payload), persistent=event_type in PERSISTENT_EVENTS)
     except Exception as e:
         log_event(f"ERROR: No se pudo publicar evento de estado a la cola '{RABBITMQ_STATUS_QUEUE_NAME}': {e}")
+    finally:
+        observe_stage("publish_status", extractor_name, time.perf_counter() - start_time)
 
 
-def get_extractor_for(pdf_path: Path, config: dict):
-    import pdfplumber
-    text_content = ""
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages[:2]:
-                ptext = page.extract_text()
-                if ptext:
-                    text_content += ptext.lower() + " "
-    except Exception as e:
-        log_event(f"Error extrayendo texto de {pdf_path.name} para detección: {e}")
+def resolve_extractor_func(extractor_name: str):
+    if get_spec(extractor_name)["backend"] == HENDERSON_BACKEND:
         return call_henderson_microservice
+    return load_extractor(extractor_name)
+
+def get_extractor_for(pdf_path: Path, config: dict):
+    extractor_name, confianza, camino = run_with_deadline(
+        classify_document, (pdf_path, config), deadline_settings()["detection_seconds"], "detection"
+    )
+    log_classification(pdf_path.name, extractor_name, confianza, camino)
+    return resolve_extractor_func(extractor_name)
+
+def detect_extractor(pdf_path: Path, config: dict):
+    start_time = time.perf_counter()
+    with trace_span("detection") as traza:
+        extractor_func = get_extractor_for(pdf_path, config)
+        if traza is not None:
+            traza.attributes["extractor"] = extractor_func.__name__
+    observe_stage("detection", extractor_func.__name__, time.perf_counter() - start_time)
+    return extractor_func
+
+def extract_dataframe(extractor_func, pdf_path: Path, pages: int = None) -> pd.DataFrame:
+    from transformer import transform
+
+    extractor_name = extractor_func.__name__
+    with extraction_timer(extractor_name):
+        if is_local(extractor_name):
+            df = run_with_deadline(extractor_func, (pdf_path,), deadline_for(extractor_name, pages), "extraction", extractor_name)
+        else:
+            df = extractor_func(pdf_path)
+    observe_rows(extractor_name, len(df))
+
+    if extractor_name != "extract_GDU" and any("Monto" in col for col in df.columns):
+        with stage_timer("transform", extractor_name):
+            df = transform(df)
+    return df
+
+def publish_cancellation(error: Exception, pdf_path: Path, extractor_name: str, job_id: str = None, progress=None):
+    # Rechazo del chequeo previo o plazo vencido: estados propios, distintos de un error de extracción.
+    if isinstance(error, PreflightRejected):
+        event_type, status, extra, mensaje = "pdf_rejected", "rejected", {"reason": error.reason, **error.info}, str(error)
+    else:
+        event_type, status, extra, mensaje = "pdf_processing_timeout", "timeout", {"stage": error.stage, "deadline_seconds": error.seconds}, f"{pdf_path.name}: {error}"
+    mark_span_error(error)
+    print(mensaje)
+    log_event(mensaje)
+    publish_status_event(event_type, str(pdf_path.resolve()), extractor_name, mensaje, job_id=job_id, extra=extra)
+    emit_progress(progress, event_type, pdf_path.resolve(), extractor_name, error_message=mensaje)
+    MAIN_PDF_PROCESSED_TOTAL.labels(extractor=extractor_name, status=status).inc()
+
+def attach_if_in_flight(pdf_path: Path, job_id: str) -> bool:
+    primario = primary_job(job_id)
+    if not primario:
+        return False
+    mensaje = f"{pdf_path.name}: el mismo contenido ya está en proceso (trabajo {primario}), se adjunta a ese trabajo sin volver a procesarlo."
+    print(mensaje)
+    log_event(mensaje)
+    MAIN_PDF_DEDUPLICATED_TOTAL.inc()
+    return True
+
+def process_file(pdf_path: Path, output_folder: Path, config: dict, output_formats: list[str] = None, job_id: str = None, throttle=None, progress=None):
+    if attach_if_in_flight(pdf_path, job_id):
+        emit_progress(progress, "pdf_attached", pdf_path.resolve())
+        return True
+    with log_context(document=pdf_path.name, job_id=job_id), root_span("documento", "main", job_id, document=pdf_path.name), profile_document(pdf_path.name) as perfil:
+        return process_single_file(pdf_path, output_folder, config, output_formats, perfil, job_id, throttle, progress)
+
+def process_single_file(pdf_path: Path, output_folder: Path, config: dict, output_formats: list[str] = None, perfil=None, job_id: str = None, throttle=None, progress=None):
+    from output_sinks import VALIDATION_ARTIFACT, write_artifacts, resolve_output_formats
+    from backpressure import CapacityUnavailable
 
-    mapping = {
-        "extract_GDU": extract_GDU,
-        "extract_ops_ussel": extract_ops_ussel,
-        "extract_res_ussel": extract_res_ussel,
-        "extract_res_macro": extract_res_macro,
-        "extract_ops_macro": extract_ops_macro,
-        "extract_polakof": extract_polakof,
-        "extract_tata": extract_tata,
-        "extract_bowerey": extract_bowerey,
-        "extract_henderson": call_henderson_microservice
-    }
-
-    for rule in config.get("rules", []):
-        keywords = rule.get("keywords", [])
-        require_all = rule.get("all", True)
-        if not keywords: continue
-        condition = all(k.lower() in text_content for k in keywords) if require_all else any(k.lower() in text_content for k in keywords)
-        if condition:
-            extractor_name = rule.get("extractor")
-            if extractor_name in mapping:
-                return mapping[extractor_name]
-
-    return call_henderson_microservice
-
-def process_file(pdf_path: Path, output_folder: Path, config: dict):
     extractor_func = None
     extractor_name = 'unknown_extractor_error'
     pdf_path_normalized = str(pdf_path.resolve())
+    output_formats = resolve_output_formats(output_formats or config.get("output_formats"))
 
     start_time = time.time()
 
     try:
-        extractor_func = get_extractor_for(pdf_path, config)
+        documento = preflight(pdf_path)
+        extractor_func = detect_extractor(pdf_path, config)
         extractor_name = extractor_func.__name__
+        add_log_fields(extractor=extractor_name)
+        annotate_span(extractor=extractor_name)
+        if perfil:
+            perfil.set_extractor(extractor_name)
 
         log_event(f"Procesando archivo: {pdf_path.name}")
         log_event(f"Extractor determinado: {extractor_name}")
 
         if extractor_name == "call_henderson_microservice":
             log_event(f"Iniciando procesamiento SÍNCRONO para Henderson: {pdf_path.name}")
-            publish_status_event("pdf_processing_started", pdf_path_normalized, extractor_name)
+            publish_status_event("pdf_processing_started", pdf_path_normalized, extractor_name, job_id=job_id)
+            emit_progress(progress, "pdf_processing_started", pdf_path_normalized, extractor_name)
 
-            df = extractor_func(pdf_path)
-
-            if extractor_name != "extract_GDU" and any("Monto" in col for col in df.columns):
-                df = transform(df)
+            df = extract_dataframe(extractor_func, pdf_path)
 
             if df.empty or df["Referencia"].isna().all():
                 mensaje = f"{pdf_path.name}: sin datos válidos para generar Excel (Henderson), se omitirá."
                 print(mensaje)
                 log_event(mensaje)
-                publish_status_event("pdf_processing_completed", pdf_path_normalized, extractor_name)
+                publish_status_event("pdf_processing_completed", pdf_path_normalized, extractor_name, job_id=job_id)
+                emit_progress(progress, "pdf_processing_completed", pdf_path_normalized, extractor_name)
                 MAIN_PDF_PROCESSED_TOTAL.labels(extractor=extractor_name, status='completed').inc()
                 return False
 
-            output_file = output_folder / f"{pdf_path.stem}_output.xlsx"
-            to_excel(df, str(output_file))
-            log_event(f"Excel generado: {output_file.name}")
+            def registrar_artefacto(tipo, output_file):
+                if tipo == VALIDATION_ARTIFACT:
+                    log_event(f"Validación generada: {output_file.name}")
+                else:
+                    log_event(f"Archivo de salida generado: {output_file.name}")
+                record_job_event(job_id, "file_generated", extractor_name, generated_file_path=str(output_file.resolve()))
 
-            validate_excel(output_file, pdf_path.name)
-            log_event(f"Validación generada: {output_file.stem}_validation.txt")
-            print(f"{pdf_path.stem}_output.xlsx generado.")
+            generated_files, _ = write_artifacts(df, output_folder, pdf_path.stem, output_formats, pdf_path.name, extractor_name, registrar_artefacto)
+            print(f"{pdf_path.stem}: {', '.join(f.name for f in generated_files) or 'sin archivos'} generado(s).")
 
-            publish_status_event("pdf_processing_completed", pdf_path_normalized, extractor_name)
+            publish_status_event("pdf_processing_completed", pdf_path_normalized, extractor_name, job_id=job_id)
+            emit_progress(progress, "pdf_processing_completed", pdf_path_normalized, extractor_name)
             MAIN_PDF_PROCESSED_TOTAL.labels(extractor=extractor_name, status='completed').inc()
             return True
 
         else:
+            if throttle:
+                # La espera por capacidad de la cola no cuenta en la duración del documento ni entra en su perfil.
+                try:
+                    with perfil.paused() if perfil else contextlib.nullcontext():
+                        start_time += throttle.for_extractor(extractor_name).wait_for_capacity(
+                            lambda tipo, datos: publish_status_event(tipo, pdf_path_normalized, extractor_name, job_id=job_id, extra=datos)
+                        )
+                except CapacityUnavailable as e:
+                    start_time += e.waited_seconds
+                    raise
             log_event(f"Encolando procesamiento ASÍNCRONO para: {pdf_path.name} con {extractor_name}")
-            publish_status_event("pdf_processing_started", pdf_path_normalized, extractor_name)
+            publish_status_event("pdf_processing_started", pdf_path_normalized, extractor_name, job_id=job_id)
 
             message_payload = {
                 "pdf_path": pdf_path_normalized,
                 "extractor_name": extractor_name,
+                "output_formats": output_formats,
+                "pages": documento["pages"],
+                "deadline_seconds": deadline_for(extractor_name, documento["pages"]),
             }
+            if job_id:
+                message_payload["job_id"] = job_id
             publish_message(message_payload)
+            if throttle:
+                throttle.for_extractor(extractor_name).submitted()
+            emit_progress(progress, "pdf_queued", pdf_path_normalized, extractor_name)
             print(f"{pdf_path.name} encolado para procesamiento.")
             return True
 
+    except (PreflightRejected, DeadlineExceeded) as e:
+        publish_cancellation(e, pdf_path, extractor_name, job_id, progress)
+        return False
+    except CapacityUnavailable as e:
+        # Queda con error en el registro: reanudar el lote lo vuelve a enviar.
+        error_msg = f"{pdf_path.name} no se envió: {e}"
+        mark_span_error(e)
+        print(error_msg)
+        log_event(error_msg)
+        publish_status_event("pdf_processing_error", pdf_path_normalized, extractor_name, error_msg, job_id=job_id, extra={"reason": e.reason})
+        emit_progress(progress, "pdf_processing_error", pdf_path_normalized, extractor_name, error_message=error_msg)
+        MAIN_PDF_PROCESSED_TOTAL.labels(extractor=extractor_name, status='capacity_unavailable').inc()
+        return False
     except Exception as e:
         error_msg = f"Error procesando {pdf_path.name}: {e}"
+        mark_span_error(e)
         print(error_msg)
         log_event(error_msg)
-        publish_status_event("pdf_processing_error", pdf_path_normalized, extractor_name, str(e))
+        publish_status_event("pdf_processing_error", pdf_path_normalized, extractor_name, str(e), job_id=job_id)
+        emit_progress(progress, "pdf_processing_error", pdf_path_normalized, extractor_name, error_message=str(e))
         MAIN_PDF_PROCESSED_TOTAL.labels(extractor=extractor_name, status='error').inc()
         return False
     finally:
@@ -251,13 +345,147 @@ def process_file(pdf_path: Path, output_folder: Path, config: dict):
         MAIN_PROCESSING_DURATION_SECONDS.labels(extractor=extractor_name).observe(duration)
 
 
-def procesar_archivos(pdf_paths: list[Path], output_dir: Path, config: dict) -> int:
+def announce_batch(batch_id: str, cantidad: int, reanudado: bool):
+    if batch_id and not reanudado:
+        print(f"Lote {batch_id}: {cantidad} PDF(s) registrados. Si se interrumpe, reanudar con: python src/job_ledger.py reanudar {batch_id}")
+
+def procesar_archivos(pdf_paths: list[Path], output_dir: Path, config: dict, output_formats: list[str] = None, batch_id: str = None, progress=None, cancel=None) -> int:
+    # progress(evento) recibe el avance de cada archivo (mismo formato que los eventos de system_status_queue).
+    # cancel (threading.Event) corta el envío, también si está esperando capacidad de la cola; lo no enviado
+    # queda pendiente en el registro para reanudar el lote.
+    from backpressure import ExtractorThrottles
+
+    reanudado = batch_id is not None
+    configure_deadlines(config.get("deadlines"))
+    configure_logging(config.get("logging"))
+    configure_transport(config.get("transport"))
+    batch_id, trabajos = start_batch(pdf_paths, output_dir, output_formats, origen="archivos", batch_id=batch_id)
+    announce_batch(batch_id, len(pdf_paths), reanudado)
+    throttle = ExtractorThrottles(config.get("backpressure"), cancel)
+
     procesados = 0
-    for pdf in pdf_paths:
+    for numero, pdf in enumerate(pdf_paths):
+        if throttle.cancel.is_set():
+            print(f"Envío cancelado: {len(pdf_paths) - numero} PDF(s) sin enviar." + (f" Reanudar con: python src/job_ledger.py reanudar {batch_id}" if batch_id else ""))
+            break
         print(f"Procesando {pdf.name}...")
-        if process_file(pdf, output_dir, config):
+        if process_file(pdf, output_dir, config, output_formats, trabajos.get(str(pdf.resolve())), throttle, progress):
             procesados += 1
+    if throttle.waited_seconds:
+        print(f"El envío esperó {throttle.waited_seconds:.1f} s en total por capacidad de la cola.")
     return procesados
 
+def procesar_lote(pdf_paths: list[Path], output_dir: Path, config: dict, batch_mode: str = None, batch_id: str = None, progress=None) -> list[Path]:
+    from batch_output import write_batch_workbook, resolve_batch_mode
+    from reference_index import record_references
+
+    batch_mode = resolve_batch_mode(batch_mode or config.get("batch_output", {}).get("mode")) or "per_vendor"
+    configure_deadlines(config.get("deadlines"))
+    configure_logging(config.get("logging"))
+    configure_transport(config.get("transport"))
+    reanudado = batch_id is not None
+    # El Excel del lote necesita los datos de cada documento: solo se deduplica dentro del mismo lote.
+    batch_id, trabajos = start_batch(pdf_paths, output_dir, batch_mode=batch_mode, origen="lote", batch_id=batch_id, dedupe=DEDUPE_BATCH)
+    announce_batch(batch_id, len(pdf_paths), reanudado)
+    resultados = []
+    # En modo lote un documento se considera completado recién cuando el Excel del lote está escrito: hasta
+    # entonces solo se anota (ruta, extractor, job_id) y el evento final se publica después de escribirlo.
+    extraidos = []
+
+    def cerrar_extraidos(event_type: str, error_message: str = None, generated_file_path: str = None):
+        for pdf_path_normalized, extractor_name, job_id in extraidos:
+            if generated_file_path:
+                record_job_event(job_id, "file_generated", extractor_name, generated_file_path=generated_file_path)
+            publish_status_event(event_type, pdf_path_normalized, extractor_name, error_message, job_id=job_id)
+            emit_progress(progress, event_type, pdf_path_normalized, extractor_name, **({"error_message": error_message} if error_message else {}))
+            estado = 'completed' if event_type == "pdf_processing_completed" else 'error'
+            MAIN_PDF_PROCESSED_TOTAL.labels(extractor=extractor_name, status=estado).inc()
+
+    for pdf in pdf_paths:
+        print(f"Procesando {pdf.name}...")
+        job_id = trabajos.get(str(pdf.resolve()))
+        if attach_if_in_flight(pdf, job_id):
+            emit_progress(progress, "pdf_attached", pdf.resolve())
+            continue
+        with log_context(document=pdf.name, job_id=job_id), root_span("documento", "main", job_id, document=pdf.name), profile_document(pdf.name) as perfil:
+            extractor_name = 'unknown_extractor_error'
+            pdf_path_normalized = str(pdf.resolve())
+            start_time = time.time()
+
+            try:
+                documento = preflight(pdf)
+                extractor_func = detect_extractor(pdf, config)
+                extractor_name = extractor_func.__name__
+                add_log_fields(extractor=extractor_name)
+                annotate_span(extractor=extractor_name)
+                perfil.set_extractor(extractor_name)
+                log_event(f"Procesando archivo en lote: {pdf.name} con {extractor_name}")
+                publish_status_event("pdf_processing_started", pdf_path_normalized, extractor_name, job_id=job_id)
+                emit_progress(progress, "pdf_processing_started", pdf_path_normalized, extractor_name)
+
+                df = extract_dataframe(extractor_func, pdf, documento["pages"])
+
+                if df.empty or df["Referencia"].isna().all():
+                    log_event(f"{pdf.name}: sin datos válidos, no se incluirá en el Excel del lote.")
+                else:
+                    resultados.append((pdf.name, extractor_name, df))
+                extraidos.append((pdf_path_normalized, extractor_name, job_id))
+            except (PreflightRejected, DeadlineExceeded) as e:
+                publish_cancellation(e, pdf, extractor_name, job_id, progress)
+            except Exception as e:
+                error_msg = f"Error procesando {pdf.name}: {e}"
+                mark_span_error(e)
+                print(error_msg)
+                log_event(error_msg)
+                publish_status_event("pdf_processing_error", pdf_path_normalized, extractor_name, str(e), job_id=job_id)
+                emit_progress(progress, "pdf_processing_error", pdf_path_normalized, extractor_name, error_message=str(e))
+                MAIN_PDF_PROCESSED_TOTAL.labels(extractor=extractor_name, status='error').inc()
+            finally:
+                duration = time.time() - start_time
+                MAIN_PROCESSING_DURATION_SECONDS.labels(extractor=extractor_name).observe(duration)
+
+    if not resultados:
+        log_event("Lote sin datos válidos, no se generó Excel de lote.")
+        cerrar_extraidos("pdf_processing_completed")
+        return []
+
+    output_file = output_dir / f"lote_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_output.xlsx"
+    if not write_batch_workbook(resultados, output_file, batch_mode):
+        cerrar_extraidos("pdf_processing_error", "No se pudo generar el Excel del lote.")
+        return []
+
+    log_event(f"Excel de lote generado: {output_file.name} ({len(resultados)} documento(s), modo '{batch_mode}')")
+    for pdf_name, extractor_name, df in resultados:
+        record_references(df, pdf_name, extractor_name)
+    cerrar_extraidos("pdf_processing_completed", generated_file_path=str(output_file.resolve()))
+    return [output_file]
+
+def reanudar_lote(batch_id: str, config: dict) -> int:
+    ledger = get_job_ledger()
+    lote = ledger.get_batch(batch_id) if ledger else None
+    if not lote:
+        print(f"Lote '{batch_id}' no encontrado en el registro de trabajos.")
+        return 0
+
+    pendientes = [Path(t["pdf_path"]) for t in ledger.unfinished_jobs(batch_id)]
+    faltantes = [p for p in pendientes if not p.exists()]
+    for pdf in faltantes:
+        print(f"ADVERTENCIA: {pdf} ya no existe, no se reenvía.")
+    pendientes = [p for p in pendientes if p.exists()]
+
+    completados = len(ledger.jobs(batch_id, COMPLETED))
+    print(f"Lote {batch_id}: {completados} completado(s), se reenvían {len(pendientes)} pendiente(s).")
+    log_event(f"Reanudando lote {batch_id}: {len(pendientes)} trabajo(s) pendiente(s), {completados} completado(s).")
+    if not pendientes:
+        return 0
+
+    output_dir = Path(lote["output_dir"])
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if lote["batch_mode"]:
+        procesar_lote(pendientes, output_dir, config, lote["batch_mode"], batch_id=batch_id)
+    else:
+        procesar_archivos(pendientes, output_dir, config, lote["output_formats"], batch_id=batch_id)
+    return len(pendientes)
+
 if __name__ == '__main__':
-    pass
\ No newline at end of file
+    start_main_metrics_server()
\ No newline at end of file
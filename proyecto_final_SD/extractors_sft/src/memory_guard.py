@@ -0,0 +1,164 @@
+import os
+import sys
+import threading
+
+from logger import flush_logs, log_event
+from pipeline_metrics import LazyMetric
+
+# pdfplumber/pdfminer retienen estado de layout por página, así que el RSS de un worker de larga vida crece
+# documento a documento. Pasado un máximo de documentos o de memoria, el worker termina el mensaje actual,
+# lo confirma y se reemplaza por un proceso nuevo. 0 desactiva cada límite.
+MAX_DOCUMENTS_ENV_VAR = "FINEXTRACT_MAX_DOCUMENTS"
+MAX_RSS_MB_ENV_VAR = "FINEXTRACT_MAX_RSS_MB"
+DEFAULT_MAX_DOCUMENTS = 500
+DEFAULT_MAX_RSS_MB = 1536
+
+# Código de salida con el que un worker lanzado por supervisor.py pide ser reemplazado (no cuenta como caída).
+RECYCLE_EXIT_CODE = 75
+
+LOCAL_PROCESSOR_DOCUMENT_PEAK_RSS_BYTES = LazyMetric(
+    'Histogram',
+    'local_processor_document_peak_rss_bytes',
+    'Peak resident memory of the worker process while processing a document.',
+    ['extractor'],
+    buckets=[b * 1024 * 1024 for b in (64, 128, 256, 384, 512, 768, 1024, 1536, 2048, 3072, 4096)]
+)
+
+LOCAL_PROCESSOR_RSS_BYTES = LazyMetric(
+    'Gauge',
+    'local_processor_rss_bytes',
+    'Resident memory of the worker process after its last document.',
+    multiprocess_mode='liveall'
+)
+
+LOCAL_PROCESSOR_DOCUMENTS_SINCE_START = LazyMetric(
+    'Gauge',
+    'local_processor_documents_since_start',
+    'Documents handled by the current worker process.',
+    multiprocess_mode='liveall'
+)
+
+LOCAL_PROCESSOR_RECYCLES_TOTAL = LazyMetric(
+    'Counter',
+    'local_processor_recycles_total',
+    'Worker processes replaced after reaching the document or memory limit.',
+    ['reason']
+)
+
+
+def current_rss() -> int:
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        factor = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * factor
+    except ImportError:
+        return 0
+
+
+class RssSampler:
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak = current_rss()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+        return False
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        log_event(f"ADVERTENCIA: {name} inválido ('{os.environ.get(name)}'), se usa {default}.")
+        return default
+
+
+class MemoryGuard:
+    def __init__(self, max_documents: int = None, max_rss_mb: int = None, sample_interval: float = 0.05):
+        self.max_documents = _env_int(MAX_DOCUMENTS_ENV_VAR, DEFAULT_MAX_DOCUMENTS) if max_documents is None else max_documents
+        self.max_rss_mb = _env_int(MAX_RSS_MB_ENV_VAR, DEFAULT_MAX_RSS_MB) if max_rss_mb is None else max_rss_mb
+        self.sample_interval = sample_interval
+        self.documents = 0
+        self.rss = 0
+        self.recycle_reason = None
+        self._external_peak = 0
+
+    def track(self, extractor_name: str = None):
+        return _TrackedDocument(self, extractor_name or "unknown")
+
+    def note_peak(self, peak_rss: int):
+        # Pico medido fuera de este proceso (extracción aislada en un proceso hijo, ver deadlines.py).
+        self._external_peak = max(self._external_peak, peak_rss or 0)
+
+    def _finished(self, extractor_name: str, peak_rss: int):
+        self.documents += 1
+        self.rss = current_rss()
+        LOCAL_PROCESSOR_DOCUMENT_PEAK_RSS_BYTES.labels(extractor=extractor_name).observe(max(peak_rss, self._external_peak))
+        self._external_peak = 0
+        LOCAL_PROCESSOR_RSS_BYTES.set(self.rss)
+        LOCAL_PROCESSOR_DOCUMENTS_SINCE_START.set(self.documents)
+
+        if self.max_rss_mb > 0 and self.rss >= self.max_rss_mb * 1024 * 1024:
+            self.recycle_reason = "memory"
+        elif self.max_documents > 0 and self.documents >= self.max_documents:
+            self.recycle_reason = "documents"
+
+    @property
+    def should_recycle(self) -> bool:
+        return self.recycle_reason is not None
+
+    def describe(self) -> str:
+        return f"{self.documents} documento(s), RSS {self.rss / (1024 * 1024):.0f} MB (límites: {self.max_documents or 'sin límite'} documentos, {self.max_rss_mb or 'sin límite'} MB)"
+
+    def recycle(self, supervised: bool):
+        # Bajo supervisor.py se sale con RECYCLE_EXIT_CODE y el supervisor lanza el reemplazo; si el worker se
+        # lanzó a mano, se reemplaza a sí mismo con los mismos argumentos.
+        LOCAL_PROCESSOR_RECYCLES_TOTAL.labels(reason=self.recycle_reason).inc()
+        log_event(f"Servicio Local - Reciclando el worker (pid {os.getpid()}) por {'memoria' if self.recycle_reason == 'memory' else 'cantidad de documentos'}: {self.describe()}.")
+        flush_logs()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        if supervised:
+            sys.exit(RECYCLE_EXIT_CODE)
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+
+
+class _TrackedDocument:
+    def __init__(self, guard: MemoryGuard, extractor_name: str):
+        self.guard = guard
+        self.extractor_name = extractor_name
+        self.sampler = RssSampler(guard.sample_interval)
+
+    def __enter__(self):
+        self.sampler.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self.sampler.__exit__(*exc)
+        self.guard._finished(self.extractor_name, self.sampler.peak)
+        return False
@@ -0,0 +1,192 @@
+import contextvars
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+import pandas as pd
+
+from amounts import AMOUNT_COLUMNS, amounts_to_cents, format_amount_columns
+from excel_generator import to_excel
+from validator import validate_dataframe
+from pipeline_metrics import stage_timer
+from reference_index import record_references
+
+SUPPORTED_OUTPUT_FORMATS = ("xlsx", "parquet", "csv", "ndjson")
+DEFAULT_OUTPUT_FORMATS = ["xlsx"]
+FORMAT_LABELS = {"xlsx": "Excel estilizado", "parquet": "Parquet", "csv": "CSV", "ndjson": "NDJSON"}
+VALIDATION_ARTIFACT = "validation"
+
+# Los artefactos de un documento (Excel, formatos columnares y validación) se escriben en paralelo desde el
+# DataFrame en memoria. Cada uno va a un temporal de la misma carpeta y se renombra al terminar.
+OUTPUT_WORKERS = 4
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def resolve_output_formats(formats) -> list[str]:
+    if not formats:
+        return list(DEFAULT_OUTPUT_FORMATS)
+    if isinstance(formats, str):
+        formats = [f.strip() for f in formats.split(",")]
+    resolved = []
+    for fmt in formats:
+        fmt = fmt.lower().lstrip(".")
+        if fmt in SUPPORTED_OUTPUT_FORMATS and fmt not in resolved:
+            resolved.append(fmt)
+        elif fmt not in SUPPORTED_OUTPUT_FORMATS:
+            print(f"ADVERTENCIA: Formato de salida no soportado '{fmt}', se ignora.")
+    return resolved or list(DEFAULT_OUTPUT_FORMATS)
+
+
+def cents_column_name(col: str) -> str:
+    return col.replace("ó", "o").replace(" ", "_") + "_centavos"
+
+
+def to_columnar_frame(df: pd.DataFrame, source_pdf: str, extractor_name: str) -> pd.DataFrame:
+    columnar = df.copy()
+    if "Referencia" in columnar.columns:
+        columnar = columnar[columnar["Referencia"].astype(str) != "TOTAL:"]
+
+    for col in AMOUNT_COLUMNS:
+        if col in columnar.columns:
+            columnar[cents_column_name(col)] = amounts_to_cents(columnar[col])
+            columnar = columnar.drop(columns=[col])
+
+    columnar.insert(0, "Documento", source_pdf)
+    columnar.insert(1, "Extractor", extractor_name)
+
+    for col in columnar.columns:
+        if columnar[col].dtype == object:
+            columnar[col] = columnar[col].astype("string")
+    return columnar.reset_index(drop=True)
+
+
+def to_parquet(df: pd.DataFrame, output_path: str) -> bool:
+    try:
+        df.to_parquet(output_path, index=False, engine="pyarrow")
+        return True
+    except Exception as e:
+        print(f"Error al guardar Parquet en {output_path}: {e}")
+        return False
+
+
+def to_csv(df: pd.DataFrame, output_path: str) -> bool:
+    try:
+        df.to_csv(output_path, index=False, encoding="utf-8")
+        return True
+    except Exception as e:
+        print(f"Error al guardar CSV en {output_path}: {e}")
+        return False
+
+
+def to_ndjson(df: pd.DataFrame, output_path: str) -> bool:
+    try:
+        df.to_json(output_path, orient="records", lines=True, force_ascii=False)
+        return True
+    except Exception as e:
+        print(f"Error al guardar NDJSON en {output_path}: {e}")
+        return False
+
+
+COLUMNAR_WRITERS = {
+    "parquet": to_parquet,
+    "csv": to_csv,
+    "ndjson": to_ndjson,
+}
+
+
+def output_path_for(output_folder: Path, stem: str, fmt: str) -> Path:
+    return output_folder / f"{stem}_output.{fmt}"
+
+
+def validation_path_for(output_folder: Path, stem: str) -> Path:
+    excel_path = output_path_for(output_folder, stem, "xlsx")
+    return excel_path.with_name(f"{excel_path.stem}_validation.txt")
+
+
+def write_atomically(final_path: Path, write) -> bool:
+    # write(ruta_temporal) -> bool. El temporal queda en la misma carpeta para que os.replace sea atómico:
+    # quien abra final_path ve el archivo anterior o el nuevo completo, nunca uno a medio escribir.
+    final_path = Path(final_path)
+    tmp_path = final_path.with_name(f".{final_path.stem}.{uuid.uuid4().hex[:8]}.tmp{final_path.suffix}")
+    try:
+        if not write(tmp_path) or not tmp_path.exists():
+            return False
+        os.replace(tmp_path, final_path)
+        return True
+    except OSError as e:
+        print(f"Error al reemplazar {final_path}: {e}")
+        return False
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+def _write_validation_file(df: pd.DataFrame, original_pdf_name: str, output_path: Path, extractor_name: str = None) -> bool:
+    try:
+        validate_dataframe(df, original_pdf_name, output_path, extractor_name)
+        return True
+    except Exception as e:
+        print(f"Error al guardar la validación en {output_path}: {e}")
+        return False
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=OUTPUT_WORKERS, thread_name_prefix="salidas")
+        return _executor
+
+
+def write_artifacts(df: pd.DataFrame, output_folder: Path, stem: str, formats, source_pdf: str, extractor_name: str, on_generated=None) -> tuple[list[Path], Path]:
+    # on_generated(tipo, ruta) se llama en el hilo que invoca, recién cuando el artefacto quedó en su ruta final.
+    # La validación se calcula sobre el DataFrame en memoria, sin releer el Excel.
+    tareas = {}
+    for fmt in resolve_output_formats(formats):
+        if fmt == "xlsx":
+            frame, writer = format_amount_columns(df), to_excel
+        else:
+            frame, writer = None, COLUMNAR_WRITERS[fmt]
+        tareas[fmt] = (output_path_for(output_folder, stem, fmt), frame, writer)
+
+    columnar = None
+    if any(frame is None for _, frame, _ in tareas.values()):
+        columnar = to_columnar_frame(df, source_pdf, extractor_name)
+
+    def escribir(fmt, final_path, frame, writer):
+        with stage_timer(f"write_{fmt}", extractor_name):
+            return write_atomically(final_path, lambda tmp: writer(columnar if frame is None else frame, str(tmp)))
+
+    def validar(final_path):
+        with stage_timer("validation", extractor_name):
+            return write_atomically(final_path, lambda tmp: _write_validation_file(df, source_pdf, tmp, extractor_name))
+
+    generated = []
+    validation_path = None
+    with stage_timer("output", extractor_name):
+        executor = _get_executor()
+        # Cada tarea corre en una copia del contexto de quien llama: los spans write_* y validation quedan dentro de
+        # la traza del documento y sus registros llevan los campos de log_context.
+        futuros = {executor.submit(contextvars.copy_context().run, escribir, fmt, *tarea): (fmt, tarea[0]) for fmt, tarea in tareas.items()}
+        ruta_validacion = validation_path_for(output_folder, stem)
+        futuros[executor.submit(contextvars.copy_context().run, validar, ruta_validacion)] = (VALIDATION_ARTIFACT, ruta_validacion)
+
+        for futuro in as_completed(futuros):
+            tipo, final_path = futuros[futuro]
+            if not futuro.result():
+                continue
+            if tipo == VALIDATION_ARTIFACT:
+                validation_path = final_path
+            else:
+                print(f"{FORMAT_LABELS[tipo]} generado: {final_path}")
+                generated.append(final_path)
+            if on_generated:
+                on_generated(tipo, final_path)
+
+    if generated:
+        record_references(df, source_pdf, extractor_name)
+
+    orden = list(tareas)
+    generated.sort(key=lambda path: orden.index(path.suffix.lstrip(".")))
+    return generated, validation_path
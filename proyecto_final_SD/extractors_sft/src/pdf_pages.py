@@ -0,0 +1,101 @@
+import re
+from pathlib import Path
+
+from pipeline_metrics import observe_text_store_page, timed_page_text
+
+# Especificaciones de páginas aceptadas (ver extractor_registry.EXTRACTOR_SPECS):
+#   "all"                         todas las páginas
+#   {"first": 2}                  las primeras N
+#   {"ranges": "1-3,5,-1"}        rangos 1-based; los negativos cuentan desde el final
+#   {"until": "Resolución"}       desde el inicio hasta la primera página que contiene el marcador (incluida)
+ALL_PAGES = "all"
+
+
+def parse_ranges(ranges: str, page_count: int) -> list[int]:
+    indices = []
+    for parte in str(ranges).split(","):
+        parte = parte.strip()
+        if not parte:
+            continue
+        match = re.fullmatch(r"(-?\d+)(?:-(-?\d+))?", parte)
+        if not match:
+            raise ValueError(f"Rango de páginas inválido: '{parte}'")
+        inicio = int(match.group(1))
+        fin = int(match.group(2)) if match.group(2) else inicio
+        inicio = inicio + page_count if inicio < 0 else inicio - 1
+        fin = fin + page_count if fin < 0 else fin - 1
+        indices.extend(i for i in range(inicio, fin + 1) if 0 <= i < page_count and i not in indices)
+    return indices
+
+
+def page_indices(pages, page_count: int) -> list[int]:
+    if not pages or pages == ALL_PAGES or "until" in pages:
+        return list(range(page_count))
+    if "first" in pages:
+        return list(range(min(int(pages["first"]), page_count)))
+    if "ranges" in pages:
+        return parse_ranges(pages["ranges"], page_count)
+    raise ValueError(f"Especificación de páginas no soportada: {pages}")
+
+
+def select_pages(pdf, pages=ALL_PAGES) -> list:
+    return [pdf.pages[i] for i in page_indices(pages, len(pdf.pages))]
+
+
+def _until_marker(pages):
+    marker = pages.get("until") if isinstance(pages, dict) else None
+    return marker.lower() if marker else None
+
+
+def iter_page_texts(pdf, pages=ALL_PAGES):
+    marker = _until_marker(pages)
+    for page in select_pages(pdf, pages):
+        text = timed_page_text(page)
+        yield text
+        if marker and text and marker in text.lower():
+            return
+
+
+def iter_document_texts(pdf_path: Path, pages=ALL_PAGES):
+    # Igual que iter_page_texts, pero lee primero del almacén de texto (text_store) y solo abre el PDF con
+    # pdfplumber si falta alguna página. Las páginas extraídas se guardan al terminar (o al cortar en el marcador).
+    import pdfplumber
+    from text_store import backend_key, content_hash, get_text_store
+
+    store = get_text_store()
+    if store is None:
+        with pdfplumber.open(pdf_path) as pdf:
+            yield from iter_page_texts(pdf, pages)
+        return
+
+    doc_hash = content_hash(pdf_path)
+    backend = backend_key("text")
+    page_count = store.page_count(doc_hash)
+    guardadas = store.get_pages(doc_hash, backend) if page_count is not None else {}
+    nuevas = {}
+    pdf = None
+    try:
+        if page_count is None:
+            pdf = pdfplumber.open(pdf_path)
+            page_count = len(pdf.pages)
+            store.put_document(doc_hash, page_count, Path(pdf_path).name)
+
+        marker = _until_marker(pages)
+        for index in page_indices(pages, page_count):
+            if index in guardadas:
+                text = guardadas[index]
+                observe_text_store_page(index + 1, hit=True)
+            else:
+                if pdf is None:
+                    pdf = pdfplumber.open(pdf_path)
+                text = timed_page_text(pdf.pages[index])
+                nuevas[index] = text
+                observe_text_store_page(index + 1, hit=False)
+            yield text
+            if marker and text and marker in text.lower():
+                return
+    finally:
+        if pdf is not None:
+            pdf.close()
+        if nuevas:
+            store.put_pages(doc_hash, backend, nuevas)
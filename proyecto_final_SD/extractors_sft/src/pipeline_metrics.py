@@ -0,0 +1,332 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from logger import log_context, log_event
+from tracing import trace_span
+
+STAGE_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Con varios procesos (workers del supervisor, el proceso aislado de deadlines.py) cada uno escribe sus métricas
+# en archivos de PROMETHEUS_MULTIPROC_DIR y un único exportador por host las suma con MultiProcessCollector.
+# El directorio se hereda por entorno: el primer proceso que expone métricas lo crea si no está definido.
+# FINEXTRACT_METRICS_PORT cambia el puerto del proceso; 0 = no exponer (lo hace otro proceso del mismo
+# directorio); un puerto pasado explícitamente por línea de comandos tiene prioridad. FINEXTRACT_METRICS_MULTIPROC=0 vuelve al registro de un solo proceso.
+MULTIPROC_DIR_ENV_VAR = "PROMETHEUS_MULTIPROC_DIR"
+METRICS_PORT_ENV_VAR = "FINEXTRACT_METRICS_PORT"
+METRICS_MULTIPROC_ENV_VAR = "FINEXTRACT_METRICS_MULTIPROC"
+# pid del proceso que creó el directorio temporal: lo borra al salir (también tras reemplazarse con os.execv).
+METRICS_DIR_OWNER_ENV_VAR = "FINEXTRACT_METRICS_DIR_OWNER"
+ARCHIVE_SUFFIX = "archivo"
+
+_lazy_metrics = []
+_lazy_lock = threading.Lock()
+
+
+class LazyMetric:
+    # Crea la métrica de prometheus_client en el primer uso, así importar main (y la GUI) no paga ese import.
+    def __init__(self, kind: str, *args, **kwargs):
+        self._kind = kind
+        self._args = args
+        self._kwargs = kwargs
+        self._instance = None
+        _lazy_metrics.append(self)
+
+    def _metric(self):
+        if self._instance is None:
+            with _lazy_lock:
+                if self._instance is None:
+                    import prometheus_client
+                    self._instance = getattr(prometheus_client, self._kind)(*self._args, **self._kwargs)
+        return self._instance
+
+    def __getattr__(self, name):
+        return getattr(self._metric(), name)
+
+
+def materialize_metrics():
+    for metric in list(_lazy_metrics):
+        metric._metric()
+
+
+def metrics_port(default: int) -> int:
+    try:
+        return int(os.environ.get(METRICS_PORT_ENV_VAR, default))
+    except ValueError:
+        log_event(f"ADVERTENCIA: {METRICS_PORT_ENV_VAR} inválido ('{os.environ.get(METRICS_PORT_ENV_VAR)}'), se usa {default}.")
+        return default
+
+
+def multiprocess_dir() -> Path:
+    directory = os.environ.get(MULTIPROC_DIR_ENV_VAR)
+    return Path(directory) if directory else None
+
+
+def enable_multiprocess(directory=None, clean: bool = False) -> Path:
+    # Tiene que correr antes de crear la primera métrica del proceso (prometheus_client elige ahí dónde guarda
+    # los valores). Los procesos hijos heredan el directorio por entorno.
+    if os.environ.get(METRICS_MULTIPROC_ENV_VAR, "").lower() in ("0", "false", "off", "no"):
+        return None
+    actual = multiprocess_dir()
+    if actual is None and any(metric._instance is not None for metric in _lazy_metrics):
+        log_event("ADVERTENCIA: Las métricas ya se crearon en modo de un solo proceso; no se agregan las de procesos hijos.")
+        return None
+
+    creado = actual is not None and os.environ.get(METRICS_DIR_OWNER_ENV_VAR) == str(os.getpid())
+    if directory is None:
+        directory = actual
+    if directory is None:
+        directory = tempfile.mkdtemp(prefix="finextract_metricas_")
+        os.environ[METRICS_DIR_OWNER_ENV_VAR] = str(os.getpid())
+        creado = True
+    directory = Path(directory)
+    if clean and directory.exists():
+        for archivo in directory.glob("*.db"):
+            archivo.unlink(missing_ok=True)
+    directory.mkdir(parents=True, exist_ok=True)
+    os.environ[MULTIPROC_DIR_ENV_VAR] = str(directory)
+    if "prometheus_client" in sys.modules:
+        from prometheus_client import values
+        values.ValueClass = values.get_value_class()
+    if creado:
+        atexit.register(shutil.rmtree, directory, True)
+    return directory
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        import psutil
+        return psutil.pid_exists(pid)
+    except ImportError:
+        pass
+    if os.name == "nt":
+        # os.kill(pid, 0) termina el proceso en Windows.
+        import ctypes
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)
+        if not handle:
+            return False
+        exit_code = ctypes.c_ulong()
+        ctypes.windll.kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return exit_code.value == 259
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+_compact_lock = threading.Lock()
+
+
+def compact_dead_processes(directory=None, pids=None) -> int:
+    # Cada proceso deja archivos {tipo}_{pid}.db. Los de procesos muertos se vacían en {tipo}_archivo.db (los
+    # contadores e histogramas no pueden retroceder) y los gauges se borran. Así el directorio no crece con cada
+    # worker reciclado o proceso aislado reemplazado.
+    from prometheus_client.mmap_dict import MmapedDict
+
+    directory = Path(directory) if directory else multiprocess_dir()
+    if directory is None or not directory.exists():
+        return 0
+    propio = os.getpid()
+    vivos = {}
+    compactados = 0
+    with _compact_lock:
+        for archivo in sorted(directory.glob("*.db")):
+            partes = archivo.stem.split("_")
+            if not partes[-1].isdigit():
+                continue
+            pid = int(partes[-1])
+            if pid == propio or (pids is not None and pid not in pids):
+                continue
+            if pid not in vivos:
+                vivos[pid] = _pid_alive(pid)
+            if vivos[pid]:
+                continue
+            tipo = partes[0]
+            if tipo != "gauge":
+                destino = MmapedDict(str(directory / f"{tipo}_{ARCHIVE_SUFFIX}.db"))
+                try:
+                    for key, value, timestamp, _ in MmapedDict.read_all_values_from_file(str(archivo)):
+                        acumulado, _ = destino.read_value(key)
+                        destino.write_value(key, acumulado + value, timestamp)
+                finally:
+                    destino.close()
+            archivo.unlink(missing_ok=True)
+            compactados += 1
+    return compactados
+
+
+class _HostCollector:
+    def __init__(self, directory: Path):
+        from prometheus_client.multiprocess import MultiProcessCollector
+
+        self.directory = directory
+        self._collector = MultiProcessCollector(None, path=str(directory))
+
+    def collect(self):
+        compact_dead_processes(self.directory)
+        with _compact_lock:
+            return list(self._collector.collect())
+
+
+def start_metrics_server(port: int, service_name: str = "") -> bool:
+    if not port:
+        log_event(f"Métricas{' de ' + service_name if service_name else ''}: sin exportador propio ({METRICS_PORT_ENV_VAR}=0), las expone otro proceso del host.")
+        return False
+    directory = enable_multiprocess()
+    materialize_metrics()
+    from prometheus_client import CollectorRegistry, start_http_server
+    registry = None
+    if directory is not None:
+        registry = CollectorRegistry()
+        registry.register(_HostCollector(directory))
+    try:
+        if registry is None:
+            start_http_server(port)
+        else:
+            start_http_server(port, registry=registry)
+    except OSError as e:
+        log_event(f"ADVERTENCIA: No se pudo iniciar el servidor de métricas{' de ' + service_name if service_name else ''} en el puerto {port} ({e}). Se continúa sin exponer métricas.")
+        return False
+    print(f"Servidor de métricas de Prometheus{' para ' + service_name if service_name else ''} iniciado en el puerto: {port}{' (agrega los procesos de ' + str(directory) + ')' if directory else ''}")
+    return True
+
+
+PIPELINE_STAGE_DURATION_SECONDS = LazyMetric(
+    'Histogram',
+    'pdf_pipeline_stage_duration_seconds',
+    'Duration of each stage of the extraction pipeline (detection, pdf_parse, regex_extraction, transform, output, write_*, validation, henderson_http, publish_*).',
+    ['stage', 'extractor'],
+    buckets=STAGE_DURATION_BUCKETS
+)
+
+PIPELINE_PDF_PAGES = LazyMetric(
+    'Histogram',
+    'pdf_pipeline_pdf_pages',
+    'Number of PDF pages parsed per document.',
+    ['extractor'],
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+)
+
+PIPELINE_EXTRACTED_ROWS = LazyMetric(
+    'Histogram',
+    'pdf_pipeline_extracted_rows',
+    'Number of rows extracted per document.',
+    ['extractor'],
+    buckets=(0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+)
+
+PIPELINE_QUEUE_WAIT_SECONDS = LazyMetric(
+    'Histogram',
+    'pdf_pipeline_queue_wait_seconds',
+    'Time a job spent in its extractor job queue between enqueue and dequeue.',
+    ['extractor'],
+    buckets=(0.01, 0.1, 0.5, 1, 5, 15, 30, 60, 300, 900, 3600)
+)
+
+PIPELINE_TEXT_STORE_PAGES_TOTAL = LazyMetric(
+    'Counter',
+    'pdf_pipeline_text_store_pages_total',
+    'Pages read from the persistent text store (hit) or parsed with pdfplumber and stored (miss).',
+    ['result']
+)
+
+_extraction_state = threading.local()
+
+
+def observe_stage(stage: str, extractor: str, seconds: float):
+    PIPELINE_STAGE_DURATION_SECONDS.labels(stage=stage, extractor=extractor or 'unknown').observe(seconds)
+
+
+@contextmanager
+def stage_timer(stage: str, extractor: str):
+    start = time.perf_counter()
+    try:
+        with log_context(stage=stage), trace_span(stage, extractor=extractor):
+            yield
+    finally:
+        observe_stage(stage, extractor, time.perf_counter() - start)
+
+
+@contextmanager
+def extraction_timer(extractor: str):
+    # Separa el tiempo de pdfplumber (acumulado por timed_page_text) del tiempo de regex del extractor.
+    _extraction_state.parse_seconds = 0.0
+    _extraction_state.pages = set()
+    start = time.perf_counter()
+    traza = None
+    try:
+        with log_context(stage="extraction"), trace_span("extraction", extractor=extractor) as traza:
+            yield
+    finally:
+        total = time.perf_counter() - start
+        parse_seconds = _extraction_state.parse_seconds
+        observe_stage("extraction", extractor, total)
+        # Henderson se extrae por HTTP: no hay páginas locales para separar parseo y regex.
+        if _extraction_state.pages:
+            observe_stage("pdf_parse", extractor, parse_seconds)
+            observe_stage("regex_extraction", extractor, max(total - parse_seconds, 0.0))
+            PIPELINE_PDF_PAGES.labels(extractor=extractor).observe(len(_extraction_state.pages))
+            if traza is not None:
+                traza.attributes.update({"pages": len(_extraction_state.pages), "pdf_parse_seconds": round(parse_seconds, 4)})
+        _extraction_state.parse_seconds = 0.0
+        _extraction_state.pages = set()
+
+
+@contextmanager
+def collect_extraction_stats():
+    # En el proceso aislado: junta lo que acumulan timed_page_text y el almacén de texto para devolverlo al
+    # proceso padre, que es el que mide la extracción (merge_extraction_stats).
+    _extraction_state.parse_seconds = 0.0
+    _extraction_state.pages = set()
+    stats = {}
+    try:
+        yield stats
+    finally:
+        stats.update(parse_seconds=_extraction_state.parse_seconds, pages=sorted(_extraction_state.pages))
+        _extraction_state.parse_seconds = 0.0
+        _extraction_state.pages = set()
+
+
+def merge_extraction_stats(stats: dict):
+    if stats and hasattr(_extraction_state, "pages"):
+        _extraction_state.parse_seconds += stats.get("parse_seconds", 0.0)
+        _extraction_state.pages.update(stats.get("pages", ()))
+
+
+def timed_page_text(page) -> str:
+    start = time.perf_counter()
+    text = page.extract_text()
+    if hasattr(_extraction_state, "pages"):
+        _extraction_state.parse_seconds += time.perf_counter() - start
+        _extraction_state.pages.add(page.page_number)
+    return text
+
+
+def observe_text_store_page(page_number: int, hit: bool):
+    PIPELINE_TEXT_STORE_PAGES_TOTAL.labels(result='hit' if hit else 'miss').inc()
+    if hit and hasattr(_extraction_state, "pages"):
+        _extraction_state.pages.add(page_number)
+
+
+def observe_rows(extractor: str, rows: int):
+    PIPELINE_EXTRACTED_ROWS.labels(extractor=extractor).observe(rows)
+
+
+def observe_queue_wait(message: dict, extractor: str) -> float:
+    message["dequeued_at"] = time.time()
+    enqueued_at = message.get("enqueued_at")
+    if enqueued_at is None:
+        return None
+    wait_seconds = max(message["dequeued_at"] - float(enqueued_at), 0.0)
+    PIPELINE_QUEUE_WAIT_SECONDS.labels(extractor=extractor).observe(wait_seconds)
+    return wait_seconds
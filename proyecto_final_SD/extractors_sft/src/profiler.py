@@ -0,0 +1,224 @@
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import signal
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from logger import log_event
+
+EXTRACTORS_SFT_ROOT = Path(__file__).resolve().parent.parent
+
+PROFILE_ENV_VAR = "FINEXTRACT_PROFILE"
+PROFILE_RATE_ENV_VAR = "FINEXTRACT_PROFILE_RATE"
+PROFILE_EXTRACTORS_ENV_VAR = "FINEXTRACT_PROFILE_EXTRACTORS"
+PROFILE_DIR_ENV_VAR = "FINEXTRACT_PROFILE_DIR"
+
+# Crear este archivo dentro del directorio de perfiles activa el perfilado sin reiniciar (útil en Windows, sin señales).
+PROFILE_TOGGLE_FILENAME = "profiling.on"
+
+_settings = {
+    "enabled": os.environ.get(PROFILE_ENV_VAR, "0").lower() in ("1", "true", "on", "yes"),
+    "rate": float(os.environ.get(PROFILE_RATE_ENV_VAR, "1.0")),
+    "extractors": {e.strip() for e in os.environ.get(PROFILE_EXTRACTORS_ENV_VAR, "").split(",") if e.strip()},
+    "dir": Path(os.environ.get(PROFILE_DIR_ENV_VAR, str(EXTRACTORS_SFT_ROOT / "profiles"))),
+}
+# cProfile admite un solo perfilador activo por proceso: si otro hilo (workers del transporte local, Flask con
+# hilos) ya está perfilando un documento, el siguiente se procesa sin perfilar.
+_profiling_lock = threading.Lock()
+# Documento que perfila cada hilo: el proceso aislado de extracción perfila su parte y se suma a este perfil.
+_current = threading.local()
+
+
+def profile_dir() -> Path:
+    return _settings["dir"]
+
+
+def configure_profiling(enabled: bool = None, rate: float = None, extractors=None, directory: str = None) -> dict:
+    if enabled is not None:
+        _settings["enabled"] = bool(enabled)
+    if rate is not None:
+        _settings["rate"] = min(max(float(rate), 0.0), 1.0)
+    if extractors is not None:
+        if isinstance(extractors, str):
+            extractors = extractors.split(",")
+        _settings["extractors"] = {e.strip() for e in extractors if e.strip()}
+    if directory is not None:
+        _settings["dir"] = Path(directory)
+    log_event(f"Perfilado {'ACTIVADO' if _settings['enabled'] else 'desactivado'} (muestra={_settings['rate']}, extractores={sorted(_settings['extractors']) or 'todos'}, dir={_settings['dir']})")
+    return profiling_status()
+
+
+def profiling_status() -> dict:
+    return {
+        "enabled": is_profiling_enabled(),
+        "rate": _settings["rate"],
+        "extractors": sorted(_settings["extractors"]),
+        "dir": str(_settings["dir"]),
+    }
+
+
+def is_profiling_enabled() -> bool:
+    return _settings["enabled"] or (_settings["dir"] / PROFILE_TOGGLE_FILENAME).exists()
+
+
+def install_signal_toggle():
+    if not hasattr(signal, "SIGUSR1") or threading.current_thread() is not threading.main_thread():
+        return False
+
+    def _toggle(signum, frame):
+        configure_profiling(enabled=not _settings["enabled"])
+
+    signal.signal(signal.SIGUSR1, _toggle)
+    log_event(f"Perfilado: enviar SIGUSR1 al proceso {os.getpid()} para activarlo o desactivarlo.")
+    return True
+
+
+def _safe_name(value: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", value).strip("_")[:80]
+
+
+def _wanted(extractor_name: str = None) -> bool:
+    # Sin extractor todavía (main perfila desde antes de la detección) no se puede descartar.
+    return not _settings["extractors"] or extractor_name is None or extractor_name in _settings["extractors"]
+
+
+class _CapturedStats:
+    # pstats.Stats acepta cualquier objeto con create_stats() y stats: así se suman las del proceso aislado.
+    def __init__(self, stats: dict):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class DocumentProfile:
+    def __init__(self, pdf_name: str, extractor_name: str = None):
+        self.pdf_name = pdf_name
+        self.extractor_name = extractor_name
+        self.output_path = None
+        self._profiler = None
+        self._child_stats = []
+
+    def add_stats(self, stats: dict):
+        if stats and self._profiler is not None:
+            self._child_stats.append(stats)
+
+    def set_extractor(self, extractor_name: str):
+        # Si el extractor detectado no está en el filtro, se corta el perfilado ahí y no se guarda nada.
+        self.extractor_name = extractor_name
+        if self._profiler is not None and not _wanted(extractor_name):
+            self._profiler.disable()
+            self._profiler = None
+
+    @contextmanager
+    def paused(self):
+        # Lo que corre adentro (ej. la espera por capacidad de la cola) no entra en el perfil del documento.
+        if self._profiler is not None:
+            self._profiler.disable()
+        try:
+            yield
+        finally:
+            if self._profiler is not None:
+                self._profiler.enable()
+
+
+@contextmanager
+def profile_document(pdf_name: str, extractor_name: str = None):
+    perfil = DocumentProfile(pdf_name, extractor_name)
+
+    if not is_profiling_enabled() or not _wanted(extractor_name) or random.random() >= _settings["rate"]:
+        yield perfil
+        return
+    if not _profiling_lock.acquire(blocking=False):
+        yield perfil
+        return
+
+    profiler = perfil._profiler = cProfile.Profile()
+    _current.perfil = perfil
+    start_time = time.perf_counter()
+    try:
+        profiler.enable()
+        try:
+            yield perfil
+        finally:
+            profiler.disable()
+    finally:
+        _current.perfil = None
+        _profiling_lock.release()
+        activo, perfil._profiler = perfil._profiler, None
+        extractor = perfil.extractor_name or "unknown"
+        if activo is not None and _wanted(extractor):
+            try:
+                _settings["dir"].mkdir(parents=True, exist_ok=True)
+                nombre = f"{time.strftime('%Y%m%d_%H%M%S')}_{_safe_name(extractor)}_{_safe_name(Path(pdf_name).stem)}.prof"
+                perfil.output_path = _settings["dir"] / nombre
+                combinado = pstats.Stats(activo)
+                for stats in perfil._child_stats:
+                    combinado.add(_CapturedStats(stats))
+                combinado.dump_stats(str(perfil.output_path))
+                log_event(f"Perfil guardado: {perfil.output_path.name} ({time.perf_counter() - start_time:.2f}s)")
+            except Exception as e:
+                log_event(f"ERROR: No se pudo guardar el perfil de {pdf_name}: {e}")
+
+
+def active_profile():
+    # Perfil en curso del documento de este hilo, o None si no se está perfilando.
+    perfil = getattr(_current, "perfil", None)
+    return perfil if perfil is not None and perfil._profiler is not None else None
+
+
+@contextmanager
+def capture_profile(enabled: bool):
+    # En el proceso aislado: perfila la llamada y deja las estadísticas en el dict para devolverlas al padre.
+    captura = {}
+    if not enabled:
+        yield captura
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield captura
+    finally:
+        profiler.disable()
+        profiler.create_stats()
+        captura["stats"] = profiler.stats
+
+
+def summarize_profiles(directory: Path = None, top: int = 25, extractor: str = None, sort_by: str = "cumulative") -> str:
+    directory = Path(directory or _settings["dir"])
+    dumps = sorted(directory.glob("*.prof"))
+    if extractor:
+        dumps = [d for d in dumps if f"_{_safe_name(extractor)}_" in d.name]
+    if not dumps:
+        return f"No se encontraron perfiles en {directory}."
+
+    stats = pstats.Stats(str(dumps[0]))
+    for dump in dumps[1:]:
+        stats.add(str(dump))
+
+    buffer = io.StringIO()
+    stats.stream = buffer
+    print(f"Resumen de {len(dumps)} perfil(es) en {directory} (orden: {sort_by})", file=buffer)
+    stats.strip_dirs().sort_stats(sort_by).print_stats(top)
+    return buffer.getvalue()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Resumen de los perfiles de CPU capturados por documento.")
+    parser.add_argument("directorio", nargs="?", default=None, help="Directorio con archivos .prof")
+    parser.add_argument("--top", type=int, default=25, help="Cantidad de funciones a mostrar")
+    parser.add_argument("--extractor", default=None, help="Filtrar perfiles por extractor (ej. extract_GDU)")
+    parser.add_argument("--orden", default="cumulative", choices=["cumulative", "tottime", "calls"], help="Criterio de orden")
+    args = parser.parse_args()
+
+    print(summarize_profiles(args.directorio, args.top, args.extractor, args.orden))
+    sys.exit(0)
@@ -0,0 +1,159 @@
+import io
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+# Progreso por archivo de una ejecución. Lo alimentan los eventos que emite main (callback progress de
+# procesar_archivos/procesar_lote) y los de system_status_queue, que traen las finalizaciones asíncronas del
+# servicio local. Los eventos usan los mismos tipos que system_status_queue, más "pdf_queued" y "pdf_attached".
+PENDING = "pending"
+QUEUED = "queued"
+STARTED = "started"
+COMPLETED = "completed"
+FAILED = "failed"
+
+EVENT_STATES = {
+    "pdf_queued": QUEUED,
+    "pdf_processing_started": STARTED,
+    "pdf_attached": COMPLETED,
+    "pdf_processing_completed": COMPLETED,
+    "pdf_processing_error": FAILED,
+    "pdf_processing_timeout": FAILED,
+    "pdf_rejected": FAILED,
+}
+TERMINAL_STATES = (COMPLETED, FAILED)
+
+# El ETA usa el ritmo de las últimas finalizaciones: las del servicio local llegan en ráfagas.
+ETA_WINDOW = 20
+
+
+def emit_progress(progress, event_type: str, pdf_path, extractor_name: str = None, **datos):
+    if progress:
+        progress({"type": event_type, "pdf_path": str(pdf_path), "extractor_name": extractor_name, **datos})
+
+
+class BatchProgress:
+    def __init__(self, pdf_paths):
+        self._states = {str(Path(p).resolve()): PENDING for p in pdf_paths}
+        self._finished_at = deque(maxlen=ETA_WINDOW)
+        self._lock = threading.Lock()
+        self.started_at = time.monotonic()
+        self.version = 0
+
+    def handle_event(self, event: dict) -> bool:
+        # Devuelve True si el evento cambió el estado de un archivo de esta ejecución.
+        estado = EVENT_STATES.get(event.get("type"))
+        pdf_path = event.get("pdf_path")
+        if estado is None or not pdf_path:
+            return False
+        pdf_path = str(Path(pdf_path).resolve())
+        with self._lock:
+            actual = self._states.get(pdf_path)
+            # Los eventos de la cola llegan después que los del callback: un archivo terminado no vuelve atrás.
+            if actual is None or actual == estado or (actual in TERMINAL_STATES and estado not in TERMINAL_STATES):
+                return False
+            if actual not in TERMINAL_STATES and estado in TERMINAL_STATES:
+                self._finished_at.append(time.monotonic())
+            self._states[pdf_path] = estado
+            self.version += 1
+            return True
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            estados = list(self._states.values())
+            finished_at = list(self._finished_at)
+        total = len(estados)
+        completados = estados.count(COMPLETED)
+        fallidos = estados.count(FAILED)
+        terminados = completados + fallidos
+        restantes = total - terminados
+
+        eta = None
+        if restantes and terminados:
+            ahora = time.monotonic()
+            if len(finished_at) >= 2 and finished_at[-1] > finished_at[0]:
+                ritmo = (len(finished_at) - 1) / (finished_at[-1] - finished_at[0])
+            else:
+                ritmo = terminados / max(ahora - self.started_at, 1e-6)
+            eta = max(restantes / ritmo - (ahora - finished_at[-1]), 0.0)
+
+        return {
+            "total": total,
+            "done": terminados,
+            "completed": completados,
+            "failed": fallidos,
+            "in_flight": estados.count(QUEUED) + estados.count(STARTED),
+            "percent": int(100 * terminados / total) if total else 100,
+            "eta_seconds": eta,
+            "finished": restantes == 0,
+        }
+
+
+def format_eta(seconds: float) -> str:
+    if seconds is None:
+        return "calculando..."
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds} s"
+    if seconds < 3600:
+        return f"{seconds // 60} min {seconds % 60:02d} s"
+    return f"{seconds // 3600} h {seconds % 3600 // 60:02d} min"
+
+
+def describe_progress(snapshot: dict) -> str:
+    texto = f"{snapshot['done']}/{snapshot['total']} PDF(s) terminados"
+    if snapshot["failed"]:
+        texto += f" ({snapshot['failed']} con error)"
+    if snapshot["in_flight"]:
+        texto += f", {snapshot['in_flight']} en cola"
+    if not snapshot["finished"]:
+        texto += f" - tiempo restante: {format_eta(snapshot['eta_seconds'])}"
+    return texto
+
+
+class LogRingBuffer:
+    # Líneas de log pendientes de mostrar. Si el consumidor no da abasto se descartan las más viejas y se
+    # cuentan, para que un lote grande no haga crecer la memoria sin límite.
+    def __init__(self, max_lines: int = 5000):
+        self._lines = deque(maxlen=max_lines)
+        self._dropped = 0
+        self._lock = threading.Lock()
+
+    def append(self, line: str):
+        with self._lock:
+            if len(self._lines) == self._lines.maxlen:
+                self._dropped += 1
+            self._lines.append(line)
+
+    def drain(self) -> tuple[list[str], int]:
+        with self._lock:
+            lines, dropped = list(self._lines), self._dropped
+            self._lines.clear()
+            self._dropped = 0
+        return lines, dropped
+
+
+class LineWriter(io.TextIOBase):
+    # Destino para contextlib.redirect_stdout: cada línea completa va al buffer apenas se escribe.
+    def __init__(self, buffer: LogRingBuffer):
+        self.buffer = buffer
+        self._partial = ""
+        self._lock = threading.Lock()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        with self._lock:
+            *lineas, self._partial = (self._partial + text).split("\n")
+        for linea in lineas:
+            if linea.strip():
+                self.buffer.append(linea.rstrip())
+        return len(text)
+
+    def flush(self):
+        with self._lock:
+            linea, self._partial = self._partial, ""
+        if linea.strip():
+            self.buffer.append(linea.rstrip())
@@ -0,0 +1,247 @@
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from amounts import AMOUNT_COLUMNS, CENTS_DTYPE, amounts_to_cents, format_amounts
+from excel_generator import open_excel_writer, write_styled_sheet
+from logger import log_event
+from output_sinks import cents_column_name, write_atomically
+from reference_index import reference_keys
+
+# Concilia los documentos de pago contra los comprobantes de retención de un mismo proveedor. Cada lado se
+# agrupa por la clave de la referencia (suma de todos los documentos y meses cargados) y los dos lados se
+# cruzan con un join por hash. Se compara la columna de monto configurada de cada lado:
+#   - Macro: Monto del detalle de pago contra Monto (base) de la retención.
+#   - Ussel: Retención de la orden de pago contra Monto del e-resguardo.
+DEFAULT_RECONCILIATION = {
+    "tolerance_cents": 1,
+    "pairs": {
+        "macro": {
+            "payments": "extract_ops_macro",
+            "payment_amount": "Monto",
+            "retentions": "extract_res_macro",
+            "retention_amount": "Monto",
+        },
+        "ussel": {
+            "payments": "extract_ops_ussel",
+            "payment_amount": "Retención",
+            "retentions": "extract_res_ussel",
+            "retention_amount": "Monto",
+        },
+    },
+}
+
+CONCILIADO = "conciliado"
+PARCIAL = "parcial"
+DIFERENCIA_MONTO = "diferencia_monto"
+SIN_RETENCION = "sin_retencion"
+SIN_PAGO = "sin_pago"
+RECONCILIATION_STATES = (CONCILIADO, PARCIAL, DIFERENCIA_MONTO, SIN_RETENCION, SIN_PAGO)
+
+# Si un mismo documento está en varios formatos se lee uno solo, en este orden.
+_FORMAT_PREFERENCE = ("parquet", "csv", "ndjson", "xlsx")
+
+SUMMARY_SHEET_NAME = "Resumen"
+PENDING_SHEET_NAME = "Pendientes"
+DETAIL_SHEET_NAME = "Detalle"
+_AMOUNT_RESULT_COLUMNS = ["Monto pago", "Monto retención", "Diferencia"]
+
+
+def find_outputs(paths) -> list[Path]:
+    candidatos = {}
+    for path in map(Path, paths):
+        archivos = [path] if path.is_file() else [p for fmt in _FORMAT_PREFERENCE for p in path.rglob(f"*_output.{fmt}")]
+        for archivo in archivos:
+            fmt = archivo.suffix.lower().lstrip(".")
+            if archivo.name.startswith(".") or fmt not in _FORMAT_PREFERENCE:
+                continue
+            documento = archivo.stem[:-len("_output")] if archivo.stem.endswith("_output") else archivo.stem
+            clave = (archivo.parent.resolve(), documento)
+            actual = candidatos.get(clave)
+            if actual is None or _FORMAT_PREFERENCE.index(fmt) < _FORMAT_PREFERENCE.index(actual.suffix.lower().lstrip(".")):
+                candidatos[clave] = archivo
+    return sorted(candidatos.values())
+
+
+def load_output(path: Path, extractor_name: str = None) -> pd.DataFrame:
+    path = Path(path)
+    fmt = path.suffix.lower().lstrip(".")
+    if fmt == "parquet":
+        df = pd.read_parquet(path)
+    elif fmt == "csv":
+        df = pd.read_csv(path, dtype={"Documento": "string", "Extractor": "string", "Referencia": "string"})
+    elif fmt == "ndjson":
+        df = pd.read_json(path, orient="records", lines=True, dtype={"Referencia": str})
+    else:
+        df = pd.read_excel(path, dtype=str)
+        df = df[df["Referencia"].astype(str) != "TOTAL:"]
+        df.insert(0, "Documento", path.stem[:-len("_output")] + ".pdf" if path.stem.endswith("_output") else path.stem)
+        df.insert(1, "Extractor", extractor_name)
+
+    if "Referencia" not in df.columns or df["Extractor"].isna().all():
+        return pd.DataFrame()
+    # Los formatos columnares traen los montos en centavos ("Monto_centavos"); el Excel, como texto "1234,56".
+    for col in AMOUNT_COLUMNS:
+        if cents_column_name(col) in df.columns:
+            df[col] = pd.to_numeric(df[cents_column_name(col)]).round().astype(CENTS_DTYPE)
+        elif col in df.columns:
+            df[col] = amounts_to_cents(df[col])
+    return df[["Documento", "Extractor", "Referencia"] + [c for c in AMOUNT_COLUMNS if c in df.columns]]
+
+
+def load_outputs(paths, extractors_by_file: dict = None) -> pd.DataFrame:
+    extractors_by_file = extractors_by_file or {}
+    por_nombre = {Path(p).name: e for p, e in extractors_by_file.items()}
+    frames = []
+    for path in find_outputs(paths):
+        extractor_name = extractors_by_file.get(str(path.resolve())) or extractors_by_file.get(str(path)) or por_nombre.get(path.name)
+        try:
+            df = load_output(path, extractor_name)
+        except Exception as e:
+            log_event(f"ADVERTENCIA: No se pudo leer {path} ({type(e).__name__}: {e}).")
+            continue
+        if df.empty:
+            log_event(f"ADVERTENCIA: {path.name} no tiene referencias o no se conoce su extractor; se omite.")
+            continue
+        frames.append(df.assign(_archivo=len(frames)))
+    if not frames:
+        return pd.DataFrame(columns=["Documento", "Extractor", "Referencia"])
+    movimientos = pd.concat(frames, ignore_index=True)
+    # Un documento procesado en varios lotes se cuenta una sola vez (se toma el último archivo leído).
+    ultimo = movimientos.groupby("Documento")["_archivo"].transform("max")
+    return movimientos[movimientos["_archivo"] == ultimo].drop(columns=["_archivo"]).reset_index(drop=True)
+
+
+def _side(movimientos: pd.DataFrame, extractor_name: str, amount_column: str) -> pd.DataFrame:
+    datos = movimientos[movimientos["Extractor"] == extractor_name]
+    monto = datos[amount_column] if amount_column in datos.columns else pd.Series(pd.NA, index=datos.index, dtype=CENTS_DTYPE)
+    datos = pd.DataFrame({
+        "Clave": reference_keys(datos["Referencia"]),
+        "Referencia": datos["Referencia"].astype("string"),
+        "Documento": datos["Documento"].astype("string"),
+        "Monto": monto.astype(CENTS_DTYPE),
+    }).dropna(subset=["Clave"])
+
+    grupos = datos.groupby("Clave", sort=False)
+    lado = pd.DataFrame({
+        "Referencia": grupos["Referencia"].first(),
+        "Monto": grupos["Monto"].sum(min_count=1),
+        "Lineas": grupos.size(),
+    })
+    # La lista de documentos se arma en Python solo para las referencias que aparecen en más de uno.
+    documentos = datos.drop_duplicates(["Clave", "Documento"])
+    varios = documentos["Clave"].duplicated(keep=False)
+    lado["Documentos"] = pd.concat([
+        documentos.loc[~varios].set_index("Clave")["Documento"],
+        documentos.loc[varios].groupby("Clave", sort=False)["Documento"].agg(" | ".join),
+    ])
+    return lado
+
+
+def reconcile_pair(movimientos: pd.DataFrame, pair: str, settings: dict, tolerance_cents: int = 1) -> pd.DataFrame:
+    pagos = _side(movimientos, settings["payments"], settings["payment_amount"])
+    retenciones = _side(movimientos, settings["retentions"], settings["retention_amount"])
+    cruce = pagos.join(retenciones, how="outer", lsuffix=" pago", rsuffix=" retención")
+
+    hay_pago = cruce["Lineas pago"].notna().to_numpy()
+    hay_retencion = cruce["Lineas retención"].notna().to_numpy()
+    esperado = cruce["Monto pago"].to_numpy(dtype="int64", na_value=0)
+    recibido = cruce["Monto retención"].to_numpy(dtype="int64", na_value=0)
+    diferencia = recibido - esperado
+
+    ambos = hay_pago & hay_retencion
+    conciliado = ambos & (np.abs(diferencia) <= tolerance_cents)
+    # Parcial: lo retenido hasta ahora cubre solo una parte de lo esperado (puede completarse en otro mes).
+    parcial = ambos & ~conciliado & (np.sign(recibido) == np.sign(esperado)) & (np.abs(recibido) < np.abs(esperado))
+    estado = np.select(
+        [conciliado, parcial, ambos, hay_pago],
+        [CONCILIADO, PARCIAL, DIFERENCIA_MONTO, SIN_RETENCION],
+        default=SIN_PAGO
+    )
+
+    return pd.DataFrame({
+        "Par": pair,
+        "Referencia": cruce["Referencia pago"].fillna(cruce["Referencia retención"]).to_numpy(),
+        "Estado": estado,
+        "Monto pago": cruce["Monto pago"].to_numpy(),
+        "Monto retención": cruce["Monto retención"].to_numpy(),
+        "Diferencia": pd.Series(diferencia, dtype=CENTS_DTYPE).where(ambos),
+        "Documentos pago": cruce["Documentos pago"].to_numpy(),
+        "Documentos retención": cruce["Documentos retención"].to_numpy(),
+    })
+
+
+def reconcile(movimientos: pd.DataFrame, settings: dict = None) -> tuple[pd.DataFrame, pd.DataFrame]:
+    settings = {**DEFAULT_RECONCILIATION, **(settings or {})}
+    start_time = time.perf_counter()
+    detalles = [
+        reconcile_pair(movimientos, pair, pair_settings, int(settings["tolerance_cents"]))
+        for pair, pair_settings in settings["pairs"].items()
+    ]
+    detalle = pd.concat(detalles, ignore_index=True).sort_values(["Par", "Estado", "Referencia"], ignore_index=True)
+    for col in _AMOUNT_RESULT_COLUMNS:
+        detalle[col] = detalle[col].astype(CENTS_DTYPE)
+
+    resumen = detalle.groupby(["Par", "Estado"]).agg(
+        Referencias=("Referencia", "size"),
+        **{col: (col, "sum") for col in _AMOUNT_RESULT_COLUMNS}
+    ).reset_index()
+    log_event(f"Conciliación: {len(detalle)} referencias en {len(settings['pairs'])} pares en {time.perf_counter() - start_time:.2f} s.")
+    return detalle, resumen
+
+
+def format_reconciliation(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    for col in _AMOUNT_RESULT_COLUMNS:
+        if col in df.columns:
+            df[col] = format_amounts(df[col])
+    return df
+
+
+def write_reconciliation(detalle: pd.DataFrame, resumen: pd.DataFrame, output_path: Path) -> bool:
+    output_path = Path(output_path)
+
+    def escribir(tmp_path: Path) -> bool:
+        if output_path.suffix.lower() == ".csv":
+            format_reconciliation(detalle).to_csv(tmp_path, index=False, encoding="utf-8")
+            return True
+        writer = open_excel_writer(str(tmp_path))
+        write_styled_sheet(writer, format_reconciliation(resumen), SUMMARY_SHEET_NAME)
+        write_styled_sheet(writer, format_reconciliation(detalle[detalle["Estado"] != CONCILIADO]), PENDING_SHEET_NAME)
+        write_styled_sheet(writer, format_reconciliation(detalle), DETAIL_SHEET_NAME)
+        writer.close()
+        return True
+
+    try:
+        if not write_atomically(output_path, escribir):
+            return False
+        print(f"Conciliación generada: {output_path}")
+        return True
+    except Exception as e:
+        print(f"Error al guardar la conciliación en {output_path}: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from job_ledger import get_job_ledger
+    from main import load_config
+
+    settings = {**DEFAULT_RECONCILIATION, **load_config().get("reconciliation", {})}
+    parser = argparse.ArgumentParser(description="Concilia órdenes/detalles de pago contra comprobantes de retención a partir de las salidas extraídas.")
+    parser.add_argument("entradas", nargs="+", type=Path, help="Archivos *_output.* o carpetas de salida (se recorren recursivamente)")
+    parser.add_argument("--salida", type=Path, default=Path("conciliacion.xlsx"), help="Archivo de resultado (.xlsx o .csv)")
+    parser.add_argument("--tolerancia", type=int, default=settings["tolerance_cents"], help="Diferencia admitida en centavos")
+    args = parser.parse_args()
+
+    # Los Excel no guardan el extractor: se busca en el registro de trabajos qué extractor generó cada archivo.
+    ledger = get_job_ledger()
+    movimientos = load_outputs(args.entradas, ledger.file_extractors() if ledger else None)
+    settings["tolerance_cents"] = args.tolerancia
+    detalle, resumen = reconcile(movimientos, settings)
+
+    print(format_reconciliation(resumen).to_string(index=False))
+    write_reconciliation(detalle, resumen, args.salida)
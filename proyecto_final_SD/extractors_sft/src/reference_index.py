@@ -0,0 +1,301 @@
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from itertools import repeat
+from pathlib import Path
+
+import pandas as pd
+
+from logger import log_event
+
+EXTRACTORS_SFT_ROOT = Path(__file__).resolve().parent.parent
+
+# Índice histórico de todas las referencias extraídas: extractor, clave numérica, monto en centavos, documento
+# de origen y fecha. La validación de cada documento nuevo solo lo consulta, de una vez, para detectar
+# referencias que ya aparecieron en otros PDFs (facturas pagadas dos veces en otro mes). El documento se agrega
+# recién cuando su salida quedó escrita (record_references).
+# Un documento se identifica por extractor y nombre: reprocesar el mismo PDF reemplaza sus filas y no se marca
+# contra sí mismo, y el mismo contenido con otro nombre sí se marca.
+REFERENCE_INDEX_ENV_VAR = "FINEXTRACT_REFERENCE_INDEX"
+DEFAULT_REFERENCE_INDEX_PATH = EXTRACTORS_SFT_ROOT / "ledger" / "referencias.sqlite"
+INDEX_AMOUNT_COLUMNS = ["Monto", "Monto Original", "Retención"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documentos (
+    documento_id INTEGER PRIMARY KEY,
+    extractor TEXT NOT NULL,
+    nombre TEXT NOT NULL,
+    huella TEXT NOT NULL,
+    filas INTEGER NOT NULL,
+    indexado REAL NOT NULL,
+    UNIQUE (extractor, nombre, huella)
+);
+CREATE TABLE IF NOT EXISTS referencias (
+    extractor TEXT NOT NULL,
+    clave INTEGER NOT NULL,
+    documento_id INTEGER NOT NULL REFERENCES documentos (documento_id),
+    fila INTEGER NOT NULL,
+    referencia TEXT NOT NULL,
+    monto INTEGER,
+    PRIMARY KEY (extractor, clave, documento_id, fila)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS referencias_documento ON referencias (documento_id);
+"""
+
+# La variable de entorno acepta una ruta al archivo SQLite, o "0"/"off" para desactivar el índice.
+_DISABLED_VALUES = ("0", "false", "off", "no")
+_env_value = os.environ.get(REFERENCE_INDEX_ENV_VAR, "").strip()
+_settings = {
+    "enabled": _env_value.lower() not in _DISABLED_VALUES,
+    "path": Path(_env_value) if _env_value and _env_value.lower() not in _DISABLED_VALUES + ("1", "true", "on", "yes") else DEFAULT_REFERENCE_INDEX_PATH,
+}
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def reference_keys(referencias: pd.Series) -> pd.Series:
+    # Mismo número de 5 a 8 dígitos que toma transform(), sin ceros a la izquierda: "A-0019127", "FA-19127"
+    # y "19127" son la misma referencia.
+    digitos = referencias.astype("string").str.extract(r"(\d{5,8})", expand=False).str.lstrip("0")
+    return digitos.mask(digitos == "")
+
+
+def reference_rows(df: pd.DataFrame) -> pd.DataFrame:
+    from amounts import amounts_to_cents
+
+    datos = df[df["Referencia"].astype(str) != "TOTAL:"]
+    columna = next((col for col in INDEX_AMOUNT_COLUMNS if col in datos.columns and datos[col].notna().any()), None)
+    filas = pd.DataFrame({
+        "fila": range(len(datos)),
+        "clave": reference_keys(datos["Referencia"]).to_numpy(),
+        "referencia": datos["Referencia"].astype("string").to_numpy(),
+        "monto": amounts_to_cents(datos[columna]).to_numpy() if columna else pd.NA,
+    }).dropna(subset=["clave"])
+    filas["clave"] = filas["clave"].astype("int64")
+    return filas
+
+
+def fingerprint(filas: pd.DataFrame) -> str:
+    lineas = sorted(f"{clave}:{'' if pd.isna(monto) else int(monto)}" for clave, monto in zip(filas["clave"], filas["monto"]))
+    return hashlib.sha256("\n".join(lineas).encode("utf-8")).hexdigest()
+
+
+class ReferenceIndex:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _add(self, connection, extractor_name: str, documento: str, filas: pd.DataFrame, indexado: float) -> int:
+        huella = fingerprint(filas)
+        existente = connection.execute(
+            "SELECT documento_id FROM documentos WHERE extractor = ? AND nombre = ? AND huella = ?", (extractor_name, documento, huella)
+        ).fetchone()
+        if existente:
+            return existente[0]
+        # Reprocesado con otro resultado (extractor corregido, PDF reemplazado): las filas anteriores se descartan.
+        anteriores = "SELECT documento_id FROM documentos WHERE extractor = ? AND nombre = ?"
+        connection.execute(f"DELETE FROM referencias WHERE documento_id IN ({anteriores})", (extractor_name, documento))
+        connection.execute("DELETE FROM documentos WHERE extractor = ? AND nombre = ?", (extractor_name, documento))
+        documento_id = connection.execute(
+            "INSERT INTO documentos (extractor, nombre, huella, filas, indexado) VALUES (?, ?, ?, ?, ?)",
+            (extractor_name, documento, huella, len(filas), indexado)
+        ).lastrowid
+        montos = filas["monto"].astype("Int64").astype(object).where(filas["monto"].notna(), None)
+        connection.executemany(
+            "INSERT INTO referencias (extractor, clave, documento_id, fila, referencia, monto) VALUES (?, ?, ?, ?, ?, ?)",
+            zip(repeat(extractor_name), filas["clave"].tolist(), repeat(documento_id), filas["fila"].tolist(),
+                filas["referencia"].astype(str).tolist(), montos.tolist())
+        )
+        return documento_id
+
+    def _previous(self, connection, extractor_name: str, documento: str, filas: pd.DataFrame) -> list[dict]:
+        # Las claves del documento viajan como un solo parámetro JSON; las filas del propio documento se excluyen.
+        previas = pd.DataFrame(connection.execute(
+            "SELECT r.clave, r.referencia, r.monto, d.nombre, d.indexado FROM referencias r "
+            "JOIN documentos d ON d.documento_id = r.documento_id "
+            "WHERE r.extractor = ? AND r.clave IN (SELECT value FROM json_each(?)) AND d.nombre != ?",
+            (extractor_name, json.dumps(sorted(set(filas["clave"].tolist()))), documento)
+        ).fetchall(), columns=["clave", "referencia_previa", "monto_previo", "documento_previo", "indexado"])
+        if previas.empty:
+            return []
+        cruce = filas.merge(previas, on="clave").sort_values(["fila", "indexado"], kind="stable")
+        return [
+            {"referencia": ref, "monto": None if pd.isna(monto) else int(monto), "referencia_previa": ref_previa,
+             "monto_previo": None if pd.isna(monto_previo) else int(monto_previo), "documento_previo": nombre, "indexado": indexado}
+            for ref, monto, ref_previa, monto_previo, nombre, indexado in cruce[
+                ["referencia", "monto", "referencia_previa", "monto_previo", "documento_previo", "indexado"]].itertuples(index=False)
+        ]
+
+    def check(self, df: pd.DataFrame, documento: str, extractor_name: str) -> list[dict]:
+        filas = reference_rows(df)
+        if filas.empty:
+            return []
+        return self._previous(self._connection(), extractor_name, documento, filas)
+
+    def check_and_add(self, df: pd.DataFrame, documento: str, extractor_name: str) -> list[dict]:
+        filas = reference_rows(df)
+        if filas.empty:
+            return []
+        # Se inserta antes de consultar, en la misma transacción: dos workers con referencias en común se
+        # serializan en la escritura y el segundo ve al primero.
+        with self._connection() as connection:
+            self._add(connection, extractor_name, documento, filas, time.time())
+            return self._previous(connection, extractor_name, documento, filas)
+
+    def lookup(self, referencia: str, extractor_name: str = None) -> list[dict]:
+        clave = reference_keys(pd.Series([referencia])).iloc[0]
+        if pd.isna(clave):
+            return []
+        # La clave primaria empieza por extractor: sin extractor se recorren los conocidos, no toda la tabla.
+        condicion, parametros = "r.extractor IN (SELECT DISTINCT extractor FROM documentos) AND r.clave = ?", [int(clave)]
+        if extractor_name:
+            condicion, parametros = "r.extractor = ? AND r.clave = ?", [extractor_name, int(clave)]
+        filas = self._connection().execute(
+            "SELECT r.extractor, r.referencia, r.monto, d.nombre, d.indexado FROM referencias r "
+            f"JOIN documentos d ON d.documento_id = r.documento_id WHERE {condicion} ORDER BY d.indexado",
+            parametros
+        ).fetchall()
+        return [dict(zip(("extractor", "referencia", "monto", "documento", "indexado"), fila)) for fila in filas]
+
+    def rebuild(self, paths, extractors_by_file: dict = None) -> tuple[int, int]:
+        # Reconstruye el índice desde las salidas archivadas (*_output.*). La fecha de cada documento es la
+        # de modificación de su archivo.
+        from reconciliation import find_outputs, load_output
+
+        extractors_by_file = extractors_by_file or {}
+        por_nombre = {Path(p).name: e for p, e in extractors_by_file.items()}
+        documentos = 0
+        with self._connection() as connection:
+            connection.execute("DELETE FROM referencias")
+            connection.execute("DELETE FROM documentos")
+            for path in find_outputs(paths):
+                extractor_name = extractors_by_file.get(str(path.resolve())) or extractors_by_file.get(str(path)) or por_nombre.get(path.name)
+                try:
+                    df = load_output(path, extractor_name)
+                except Exception as e:
+                    log_event(f"ADVERTENCIA: No se pudo leer {path} ({type(e).__name__}: {e}).")
+                    continue
+                if df.empty:
+                    log_event(f"ADVERTENCIA: {path.name} no tiene referencias o no se conoce su extractor; se omite.")
+                    continue
+                for (documento, extractor), datos in df.groupby(["Documento", "Extractor"], sort=False):
+                    filas = reference_rows(datos)
+                    if not filas.empty:
+                        self._add(connection, extractor, documento, filas, path.stat().st_mtime)
+                        documentos += 1
+        self._connection().execute("ANALYZE")
+        return documentos, self.stats()["referencias"]
+
+    def stats(self) -> dict:
+        connection = self._connection()
+        return {
+            "documentos": connection.execute("SELECT COUNT(*) FROM documentos").fetchone()[0],
+            "referencias": connection.execute("SELECT COUNT(*) FROM referencias").fetchone()[0],
+            "archivo_bytes": self.path.stat().st_size if self.path.exists() else 0,
+        }
+
+
+def configure_reference_index(enabled: bool = None, path: str = None) -> dict:
+    if enabled is not None:
+        _settings["enabled"] = bool(enabled)
+    if path is not None:
+        _settings["path"] = Path(path)
+    log_event(f"Índice de referencias {'ACTIVADO' if _settings['enabled'] else 'desactivado'} ({_settings['path']})")
+    return {"enabled": _settings["enabled"], "path": str(_settings["path"])}
+
+
+def get_reference_index():
+    if not _settings["enabled"]:
+        return None
+    path = _settings["path"]
+    with _indexes_lock:
+        if path not in _indexes:
+            try:
+                _indexes[path] = ReferenceIndex(path)
+            except (OSError, sqlite3.Error) as e:
+                log_event(f"ADVERTENCIA: No se pudo abrir el índice de referencias {path} ({e}). Se valida sin historial.")
+                _indexes[path] = None
+        return _indexes[path]
+
+
+def historical_duplicates(df: pd.DataFrame, documento: str, extractor_name: str) -> list[dict]:
+    index = get_reference_index() if extractor_name and "Referencia" in df.columns else None
+    if index is None:
+        return []
+    try:
+        return index.check(df, documento, extractor_name)
+    except sqlite3.Error as e:
+        log_event(f"ADVERTENCIA: No se pudo consultar el índice de referencias para {documento}: {e}")
+        return []
+
+
+def record_references(df: pd.DataFrame, documento: str, extractor_name: str):
+    # Se llama después de escribir la salida del documento: un documento que falló no queda en el historial.
+    index = get_reference_index() if extractor_name and "Referencia" in df.columns else None
+    if index is None:
+        return
+    try:
+        previas = index.check_and_add(df, documento, extractor_name)
+    except sqlite3.Error as e:
+        log_event(f"ADVERTENCIA: No se pudo actualizar el índice de referencias con {documento}: {e}")
+        return
+    if previas:
+        log_event(f"{documento}: {len(previas)} referencia(s) ya registradas en otros documentos.")
+
+
+def format_indexed_at(indexado: float) -> str:
+    return datetime.datetime.fromtimestamp(indexado).strftime("%Y-%m-%d")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    # Se usa el módulo importado (no __main__) para compartir la configuración con validator.
+    from reference_index import configure_reference_index, get_reference_index
+
+    parser = argparse.ArgumentParser(description="Consulta y reconstruye el índice histórico de referencias.")
+    parser.add_argument("--indice", type=Path, default=None, help=f"Archivo SQLite (por defecto {DEFAULT_REFERENCE_INDEX_PATH} o ${REFERENCE_INDEX_ENV_VAR})")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+    subparsers.add_parser("estado", help="Cantidad de documentos y referencias indexadas")
+    buscar = subparsers.add_parser("buscar", help="Documentos en los que aparece una referencia")
+    buscar.add_argument("referencia")
+    buscar.add_argument("--extractor", default=None)
+    reconstruir = subparsers.add_parser("reconstruir", help="Vuelve a armar el índice desde archivos *_output.* o carpetas de salida")
+    reconstruir.add_argument("entradas", nargs="+", type=Path)
+    args = parser.parse_args()
+
+    configure_reference_index(enabled=True, path=args.indice)
+    index = get_reference_index()
+    if index is None:
+        raise SystemExit(1)
+
+    if args.comando == "estado":
+        estado = index.stats()
+        print(f"{estado['documentos']} documentos, {estado['referencias']} referencias, {estado['archivo_bytes'] / (1024 * 1024):.1f} MB")
+    elif args.comando == "buscar":
+        for fila in index.lookup(args.referencia, args.extractor):
+            monto = "-" if fila["monto"] is None else f"{fila['monto'] / 100:.2f}"
+            print(f"{format_indexed_at(fila['indexado'])}  {fila['extractor']:<20}{fila['referencia']:<12}{monto:>14}  {fila['documento']}")
+    elif args.comando == "reconstruir":
+        # Los Excel no guardan el extractor: se busca en el registro de trabajos.
+        from job_ledger import get_job_ledger
+
+        ledger = get_job_ledger()
+        start_time = time.perf_counter()
+        documentos, referencias = index.rebuild(args.entradas, ledger.file_extractors() if ledger else None)
+        print(f"Índice reconstruido: {documentos} documentos, {referencias} referencias en {time.perf_counter() - start_time:.1f} s.")
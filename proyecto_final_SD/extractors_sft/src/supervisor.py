@@ -0,0 +1,303 @@
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from backpressure import job_queue_stats
+from extractor_registry import resolve_extractor_names
+from logger import log_event
+from memory_guard import RECYCLE_EXIT_CODE
+from pipeline_metrics import METRICS_PORT_ENV_VAR, LazyMetric, compact_dead_processes, metrics_port, multiprocess_dir, start_metrics_server
+from transport import LOCAL_BACKEND, TRANSPORT_ENV_VAR, configure_transport
+from worker_status import WORKER_ID_ENV_VAR, WORKER_STATUS_DIR_ENV_VAR, busy_seconds, read_worker_statuses
+
+SRC_DIR = Path(__file__).resolve().parent
+WORKER_SCRIPT = SRC_DIR / "local_processor_service.py"
+
+# Escala los workers de local_processor_service.py según la cola:
+#   - sube cuando hay más de depth_per_worker mensajes por worker, o el último mensaje tomado esperó más de
+#     max_message_age_seconds, y los workers actuales están ocupados (utilización >= scale_up_utilisation);
+#   - baja de a uno cuando la cola está vacía y la utilización cae por debajo de idle_utilisation;
+#   - entre decisiones del mismo sentido respeta los cooldowns, y siempre mantiene min_workers vivos.
+DEFAULT_SUPERVISOR = {
+    "min_workers": 1,
+    "max_workers": max(os.cpu_count() or 1, 1),
+    "depth_per_worker": 20,
+    "max_message_age_seconds": 60,
+    "scale_up_utilisation": 0.6,
+    "idle_utilisation": 0.2,
+    "scale_up_cooldown_seconds": 30,
+    "scale_down_cooldown_seconds": 120,
+    "restart_backoff_seconds": 5,
+    "poll_seconds": 5,
+    "metrics_port": 8002,
+}
+
+SUPERVISOR_WORKERS = LazyMetric(
+    'Gauge',
+    'supervisor_workers',
+    'Number of local processor workers currently running under the supervisor.',
+    multiprocess_mode='livemostrecent'
+)
+
+SUPERVISOR_DESIRED_WORKERS = LazyMetric(
+    'Gauge',
+    'supervisor_desired_workers',
+    'Number of workers the supervisor decided to run on its last evaluation.',
+    multiprocess_mode='livemostrecent'
+)
+
+SUPERVISOR_QUEUE_DEPTH = LazyMetric(
+    'Gauge',
+    'supervisor_queue_depth',
+    'Total depth of the job queues of the extractors served by the supervised workers.',
+    multiprocess_mode='livemostrecent'
+)
+
+SUPERVISOR_MESSAGE_AGE_SECONDS = LazyMetric(
+    'Gauge',
+    'supervisor_message_age_seconds',
+    'Largest queue wait of the messages most recently taken by the workers.',
+    multiprocess_mode='livemostrecent'
+)
+
+SUPERVISOR_WORKER_UTILISATION = LazyMetric(
+    'Gauge',
+    'supervisor_worker_utilisation',
+    'Fraction of the last evaluation interval the workers spent processing messages.',
+    multiprocess_mode='livemostrecent'
+)
+
+SUPERVISOR_SCALING_DECISIONS_TOTAL = LazyMetric(
+    'Counter',
+    'supervisor_scaling_decisions_total',
+    'Scaling decisions taken by the supervisor.',
+    ['direction', 'reason']
+)
+
+SUPERVISOR_WORKER_RESTARTS_TOTAL = LazyMetric(
+    'Counter',
+    'supervisor_worker_restarts_total',
+    'Workers restarted by the supervisor after exiting unexpectedly.'
+)
+
+SUPERVISOR_WORKER_RECYCLES_TOTAL = LazyMetric(
+    'Counter',
+    'supervisor_worker_recycles_total',
+    'Workers replaced by the supervisor after reaching their document or memory limit.'
+)
+
+
+class Supervisor:
+    def __init__(self, settings: dict = None, extractores: str = None, metrics_exported: bool = False):
+        self.settings = {**DEFAULT_SUPERVISOR, **(settings or {})}
+        self.settings["max_workers"] = max(int(self.settings["max_workers"]), int(self.settings["min_workers"]))
+        self.extractores = extractores
+        # Con el exportador del supervisor activo, los workers escriben en su directorio de métricas y no abren puerto.
+        self.metrics_exported = metrics_exported and multiprocess_dir() is not None
+        self.status_dir = Path(tempfile.mkdtemp(prefix="finextract_workers_"))
+        self.workers = {}
+        self._next_id = 1
+        self._last_scale_up = 0.0
+        self._last_scale_down = 0.0
+        self._last_restart = 0.0
+        self._pending_restarts = 0
+        self._last_busy = {}
+        self._last_eval = time.monotonic()
+
+    def spawn(self, reason: str) -> str:
+        worker_id = f"w{self._next_id}"
+        self._next_id += 1
+        command = [sys.executable, str(WORKER_SCRIPT)]
+        if self.extractores:
+            command += ["--extractores", self.extractores]
+        env = {**os.environ, WORKER_STATUS_DIR_ENV_VAR: str(self.status_dir), WORKER_ID_ENV_VAR: worker_id}
+        if self.metrics_exported:
+            env[METRICS_PORT_ENV_VAR] = "0"
+        self.workers[worker_id] = subprocess.Popen(command, env=env, cwd=str(SRC_DIR))
+        log_event(f"Supervisor - Worker {worker_id} iniciado (pid {self.workers[worker_id].pid}, motivo: {reason}).")
+        return worker_id
+
+    def retire(self, worker_id: str, reason: str):
+        process = self.workers.pop(worker_id)
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        self._release_metrics(process.pid)
+        (self.status_dir / f"{worker_id}.json").unlink(missing_ok=True)
+        self._last_busy.pop(worker_id, None)
+        log_event(f"Supervisor - Worker {worker_id} retirado (motivo: {reason}).")
+
+    def reap(self):
+        # Los workers que terminaron sin que el supervisor los retirara se reinician con backoff; los reinicios que
+        # todavía no tocan quedan pendientes para las próximas evaluaciones, sin frenar el ciclo.
+        for worker_id, process in list(self.workers.items()):
+            exit_code = process.poll()
+            if exit_code is None:
+                continue
+            del self.workers[worker_id]
+            self._release_metrics(process.pid)
+            (self.status_dir / f"{worker_id}.json").unlink(missing_ok=True)
+            self._last_busy.pop(worker_id, None)
+            if exit_code == RECYCLE_EXIT_CODE:
+                # El worker llegó a su límite de documentos o memoria: se reemplaza sin backoff.
+                SUPERVISOR_WORKER_RECYCLES_TOTAL.inc()
+                self.spawn("reciclaje")
+                continue
+            log_event(f"ADVERTENCIA: Supervisor - Worker {worker_id} terminó inesperadamente (código {exit_code}).")
+            self._pending_restarts += 1
+
+        while self._pending_restarts and time.monotonic() - self._last_restart >= self.settings["restart_backoff_seconds"]:
+            self._pending_restarts -= 1
+            self._last_restart = time.monotonic()
+            SUPERVISOR_WORKER_RESTARTS_TOTAL.inc()
+            self.spawn("reinicio")
+
+    def worker_count(self) -> int:
+        # Los reinicios pendientes cuentan: ese lugar ya tiene reemplazo en camino.
+        return len(self.workers) + self._pending_restarts
+
+    def _release_metrics(self, pid: int):
+        if self.metrics_exported:
+            compact_dead_processes(pids={pid})
+
+    def observe(self) -> dict:
+        now_wall = time.time()
+        now = time.monotonic()
+        elapsed = max(now - self._last_eval, 1e-6)
+        self._last_eval = now
+
+        statuses = read_worker_statuses(self.status_dir)
+        utilisations = []
+        ages = []
+        for worker_id in self.workers:
+            status = statuses.get(worker_id)
+            if not status:
+                continue
+            busy = busy_seconds(status, now_wall)
+            if worker_id in self._last_busy:
+                utilisations.append(min(max((busy - self._last_busy[worker_id]) / elapsed, 0.0), 1.0))
+            self._last_busy[worker_id] = busy
+            if status.get("last_message_age_seconds") is not None:
+                ages.append(float(status["last_message_age_seconds"]))
+
+        try:
+            depth, consumers = job_queue_stats(resolve_extractor_names(self.extractores))
+        except Exception as e:
+            log_event(f"ADVERTENCIA: Supervisor - No se pudieron consultar las colas de trabajo ({type(e).__name__}: {e}).")
+            depth, consumers = None, None
+
+        return {
+            "depth": depth,
+            "consumers": consumers,
+            "utilisation": sum(utilisations) / len(utilisations) if utilisations else None,
+            "message_age": max(ages) if ages else 0.0,
+            # Sin archivo de estado el worker sigue arrancando: no se lo cuenta como ocioso ni se lo retira.
+            "idle_workers": [w for w in self.workers if w in statuses and not statuses[w].get("busy")],
+            "starting_workers": [w for w in self.workers if w not in statuses],
+        }
+
+    def decide(self, observation: dict) -> tuple[int, str]:
+        current = self.worker_count()
+        settings = self.settings
+        depth = observation["depth"]
+        utilisation = observation["utilisation"]
+        if current < settings["min_workers"]:
+            return settings["min_workers"], "minimo"
+        if depth is None:
+            return current, "sin datos"
+
+        now = time.monotonic()
+        presion_cola = depth > current * settings["depth_per_worker"]
+        presion_edad = depth > 0 and observation["message_age"] > settings["max_message_age_seconds"]
+        ocupados = utilisation is None or utilisation >= settings["scale_up_utilisation"]
+        if (presion_cola or presion_edad) and ocupados and current < settings["max_workers"]:
+            if now - self._last_scale_up < settings["scale_up_cooldown_seconds"]:
+                return current, "cooldown de subida"
+            objetivo = max(current + 1, math.ceil(depth / settings["depth_per_worker"]))
+            return min(objetivo, settings["max_workers"]), "profundidad" if presion_cola else "antiguedad"
+
+        ociosos = utilisation is not None and utilisation < settings["idle_utilisation"]
+        if depth == 0 and ociosos and current > settings["min_workers"]:
+            if now - max(self._last_scale_down, self._last_scale_up) < settings["scale_down_cooldown_seconds"]:
+                return current, "cooldown de bajada"
+            return current - 1, "ocioso"
+
+        return current, "estable"
+
+    def evaluate(self):
+        self.reap()
+        observation = self.observe()
+        desired, reason = self.decide(observation)
+        current = self.worker_count()
+
+        SUPERVISOR_WORKERS.set(current)
+        SUPERVISOR_DESIRED_WORKERS.set(desired)
+        if observation["depth"] is not None:
+            SUPERVISOR_QUEUE_DEPTH.set(observation["depth"])
+        SUPERVISOR_MESSAGE_AGE_SECONDS.set(observation["message_age"])
+        if observation["utilisation"] is not None:
+            SUPERVISOR_WORKER_UTILISATION.set(observation["utilisation"])
+
+        if desired > current:
+            SUPERVISOR_SCALING_DECISIONS_TOTAL.labels(direction="up", reason=reason).inc()
+            log_event(f"Supervisor - Escalando {current} -> {desired} workers ({reason}; cola={observation['depth']}, "
+                      f"edad={observation['message_age']:.1f} s, utilización={observation['utilisation']}).")
+            for _ in range(desired - current):
+                self.spawn(reason)
+            self._last_scale_up = time.monotonic()
+        elif desired < current:
+            # Se retira un worker ocioso para no cortar un documento a mitad de camino.
+            candidatos = [w for w in observation["idle_workers"] if w in self.workers]
+            if not candidatos:
+                return
+            SUPERVISOR_SCALING_DECISIONS_TOTAL.labels(direction="down", reason=reason).inc()
+            log_event(f"Supervisor - Reduciendo {current} -> {desired} workers ({reason}; utilización={observation['utilisation']:.2f}).")
+            self.retire(candidatos[-1], reason)
+            self._last_scale_down = time.monotonic()
+        SUPERVISOR_WORKERS.set(len(self.workers))
+
+    def run(self):
+        log_event(f"Supervisor iniciado: {self.settings['min_workers']}-{self.settings['max_workers']} workers, extractores={self.extractores or 'todos'}.")
+        try:
+            while True:
+                self.evaluate()
+                time.sleep(self.settings["poll_seconds"])
+        except KeyboardInterrupt:
+            log_event("Supervisor - Deteniendo workers...")
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        for worker_id in list(self.workers):
+            self.retire(worker_id, "apagado")
+        shutil.rmtree(self.status_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from main import load_config
+
+    config = load_config()
+    if configure_transport(config.get("transport"))["backend"] == LOCAL_BACKEND:
+        print(f"ERROR: Con el transporte '{LOCAL_BACKEND}' los workers son hilos de main o la GUI; el supervisor necesita {TRANSPORT_ENV_VAR}=rabbitmq.")
+        sys.exit(1)
+    settings = {**DEFAULT_SUPERVISOR, **config.get("supervisor", {})}
+    parser = argparse.ArgumentParser(description="Supervisa y escala los workers de local_processor_service.py según la cola de PDFs.")
+    parser.add_argument("--min", type=int, default=settings["min_workers"], help="Mínimo de workers")
+    parser.add_argument("--max", type=int, default=settings["max_workers"], help="Máximo de workers")
+    parser.add_argument("--extractores", default=None, help="Extractores que atienden los workers, separados por coma (por defecto todos)")
+    parser.add_argument("--puerto-metricas", type=int, default=metrics_port(settings["metrics_port"]), help=f"Puerto de métricas de Prometheus del supervisor, que agrega las de sus workers (por defecto ${METRICS_PORT_ENV_VAR} o el de config.json)")
+    args = parser.parse_args()
+
+    settings.update({"min_workers": args.min, "max_workers": args.max})
+    exportando = start_metrics_server(args.puerto_metricas, "Supervisor")
+    Supervisor(settings, args.extractores, metrics_exported=exportando).run()
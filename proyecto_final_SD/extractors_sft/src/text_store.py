@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from importlib import metadata
+from pathlib import Path
+
+from logger import log_event
+
+EXTRACTORS_SFT_ROOT = Path(__file__).resolve().parent.parent
+
+# Almacén persistente del texto por página que produce pdfplumber. La clave es el hash del contenido del PDF,
+# la página y el backend (versiones de pdfplumber/pdfminer + tipo de contenido + parámetros), así que corregir
+# una regex en un extractor no invalida nada, y actualizar pdfplumber sí.
+TEXT_STORE_ENV_VAR = "FINEXTRACT_TEXT_STORE"
+DEFAULT_TEXT_STORE_PATH = EXTRACTORS_SFT_ROOT / "text_store" / "paginas.sqlite"
+COMPRESSION_LEVEL = 6
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documentos (
+    content_hash TEXT PRIMARY KEY,
+    paginas INTEGER NOT NULL,
+    nombre TEXT,
+    creado REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS paginas (
+    content_hash TEXT NOT NULL,
+    backend TEXT NOT NULL,
+    pagina INTEGER NOT NULL,
+    datos BLOB,
+    bytes_originales INTEGER NOT NULL,
+    PRIMARY KEY (content_hash, backend, pagina)
+) WITHOUT ROWID;
+"""
+
+# La variable de entorno acepta una ruta al archivo SQLite, o "0"/"off" para desactivar el almacén.
+_DISABLED_VALUES = ("0", "false", "off", "no")
+_env_value = os.environ.get(TEXT_STORE_ENV_VAR, "").strip()
+_settings = {
+    "enabled": _env_value.lower() not in _DISABLED_VALUES,
+    "path": Path(_env_value) if _env_value and _env_value.lower() not in _DISABLED_VALUES + ("1", "true", "on", "yes") else DEFAULT_TEXT_STORE_PATH,
+}
+_stores = {}
+_stores_lock = threading.Lock()
+_versions = {}
+
+
+def content_hash(pdf_path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(pdf_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _version(package: str) -> str:
+    if package not in _versions:
+        try:
+            _versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            _versions[package] = "?"
+    return _versions[package]
+
+
+def backend_key(content: str = "text", params: dict = None) -> str:
+    return f"pdfplumber-{_version('pdfplumber')}/pdfminer-{_version('pdfminer.six')}:{content}:{json.dumps(params or {}, sort_keys=True)}"
+
+
+def _encode(value, content: str) -> tuple[bytes, int]:
+    if value is None:
+        return None, 0
+    raw = (value if content == "text" else json.dumps(value, ensure_ascii=False)).encode("utf-8")
+    return zlib.compress(raw, COMPRESSION_LEVEL), len(raw)
+
+
+def _decode(data: bytes, content: str):
+    if data is None:
+        return None
+    raw = zlib.decompress(data).decode("utf-8")
+    return raw if content == "text" else json.loads(raw)
+
+
+class TextStore:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        # Una conexión por hilo; WAL permite que varios workers lean mientras otro escribe.
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def page_count(self, content_hash: str):
+        row = self._connection().execute("SELECT paginas FROM documentos WHERE content_hash = ?", (content_hash,)).fetchone()
+        return row[0] if row else None
+
+    def put_document(self, content_hash: str, page_count: int, name: str = None):
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO documentos (content_hash, paginas, nombre, creado) VALUES (?, ?, ?, ?)",
+                (content_hash, page_count, name, time.time())
+            )
+
+    def get_pages(self, content_hash: str, backend: str, content: str = "text") -> dict:
+        rows = self._connection().execute(
+            "SELECT pagina, datos FROM paginas WHERE content_hash = ? AND backend = ?", (content_hash, backend)
+        ).fetchall()
+        return {pagina: _decode(datos, content) for pagina, datos in rows}
+
+    def put_pages(self, content_hash: str, backend: str, pages: dict, content: str = "text"):
+        filas = []
+        for pagina, value in pages.items():
+            datos, bytes_originales = _encode(value, content)
+            filas.append((content_hash, backend, pagina, datos, bytes_originales))
+        with self._connection() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO paginas (content_hash, backend, pagina, datos, bytes_originales) VALUES (?, ?, ?, ?, ?)",
+                filas
+            )
+
+    def stats(self) -> dict:
+        connection = self._connection()
+        documentos = connection.execute("SELECT COUNT(*) FROM documentos").fetchone()[0]
+        backends = connection.execute(
+            "SELECT backend, COUNT(*), COALESCE(SUM(LENGTH(datos)), 0), SUM(bytes_originales) FROM paginas GROUP BY backend ORDER BY backend"
+        ).fetchall()
+        return {
+            "path": str(self.path),
+            "documentos": documentos,
+            "archivo_bytes": self.path.stat().st_size if self.path.exists() else 0,
+            "backends": [
+                {"backend": backend, "paginas": paginas, "bytes_comprimidos": comprimidos, "bytes_originales": originales}
+                for backend, paginas, comprimidos, originales in backends
+            ],
+        }
+
+    def purge_backends(self, keep: list[str]) -> int:
+        marcadores = ",".join("?" for _ in keep)
+        with self._connection() as connection:
+            borradas = connection.execute(f"DELETE FROM paginas WHERE backend NOT IN ({marcadores})", keep).rowcount
+        self._connection().execute("VACUUM")
+        return borradas
+
+
+def configure_text_store(enabled: bool = None, path: str = None) -> dict:
+    if enabled is not None:
+        _settings["enabled"] = bool(enabled)
+    if path is not None:
+        _settings["path"] = Path(path)
+    log_event(f"Almacén de texto {'ACTIVADO' if _settings['enabled'] else 'desactivado'} ({_settings['path']})")
+    return {"enabled": _settings["enabled"], "path": str(_settings["path"])}
+
+
+def get_text_store():
+    if not _settings["enabled"]:
+        return None
+    path = _settings["path"]
+    with _stores_lock:
+        if path not in _stores:
+            try:
+                _stores[path] = TextStore(path)
+            except (OSError, sqlite3.Error) as e:
+                log_event(f"ADVERTENCIA: No se pudo abrir el almacén de texto {path} ({e}). Se extrae sin almacén.")
+                _stores[path] = None
+        return _stores[path]
+
+
+def _iter_pdfs(rutas: list[Path]):
+    for ruta in rutas:
+        if ruta.is_dir():
+            yield from sorted(ruta.rglob("*.pdf"))
+        elif ruta.suffix.lower() == ".pdf":
+            yield ruta
+
+
+if __name__ == "__main__":
+    import argparse
+
+    # Se usa el módulo importado (no __main__) para compartir la configuración con pdf_pages.
+    from pdf_pages import ALL_PAGES, iter_document_texts
+    from text_store import backend_key, configure_text_store, get_text_store
+
+    parser = argparse.ArgumentParser(description="Administra el almacén persistente de texto extraído de los PDFs.")
+    parser.add_argument("--almacen", type=Path, default=None, help=f"Archivo SQLite (por defecto {DEFAULT_TEXT_STORE_PATH} o ${TEXT_STORE_ENV_VAR})")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+    subparsers.add_parser("estadisticas", help="Documentos, páginas y tamaño por backend")
+    poblar = subparsers.add_parser("poblar", help="Extrae y guarda el texto de todas las páginas de PDFs o carpetas")
+    poblar.add_argument("rutas", nargs="+", type=Path)
+    subparsers.add_parser("purgar", help="Borra las páginas extraídas con versiones anteriores de pdfplumber")
+    args = parser.parse_args()
+
+    configure_text_store(enabled=True, path=args.almacen)
+    store = get_text_store()
+    if store is None:
+        raise SystemExit(1)
+
+    if args.comando == "estadisticas":
+        print(json.dumps(store.stats(), indent=2, ensure_ascii=False))
+    elif args.comando == "poblar":
+        for pdf_path in _iter_pdfs(args.rutas):
+            start_time = time.perf_counter()
+            try:
+                paginas = sum(1 for _ in iter_document_texts(pdf_path, ALL_PAGES))
+            except Exception as e:
+                print(f"{pdf_path.name}: error ({type(e).__name__}: {e})")
+                continue
+            print(f"{pdf_path.name}: {paginas} páginas en {time.perf_counter() - start_time:.2f} s")
+    elif args.comando == "purgar":
+        print(f"Páginas borradas: {store.purge_backends([backend_key()])}")
@@ -0,0 +1,371 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from logger import add_log_fields, log_event
+
+EXTRACTORS_SFT_ROOT = Path(__file__).resolve().parent.parent
+
+# Trazas por documento. El trace_id es el job_id del registro de trabajos (o uno nuevo si no hay registro) y viaja
+# como traceparent W3C ("00-<trace_id>-<span_id>-01") en los headers del mensaje de RabbitMQ, en el header HTTP
+# de Henderson y en cada evento de system_status_queue. Cada servicio abre un span raíz por documento y cada
+# stage_timer un span hijo; al cerrar el raíz, sus spans se guardan juntos en SQLite. "0" desactiva las trazas.
+TRACES_ENV_VAR = "FINEXTRACT_TRACES"
+DEFAULT_TRACES_PATH = EXTRACTORS_SFT_ROOT / "ledger" / "trazas.sqlite"
+TRACEPARENT_HEADER = "traceparent"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS spans (
+    trace_id TEXT NOT NULL,
+    span_id TEXT NOT NULL,
+    parent_id TEXT,
+    nombre TEXT NOT NULL,
+    servicio TEXT NOT NULL,
+    inicio REAL NOT NULL,
+    fin REAL NOT NULL,
+    duracion REAL NOT NULL,
+    documento TEXT,
+    extractor TEXT,
+    estado TEXT NOT NULL,
+    atributos TEXT,
+    pid INTEGER,
+    PRIMARY KEY (trace_id, span_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS spans_documento ON spans (documento, inicio);
+CREATE INDEX IF NOT EXISTS spans_inicio ON spans (inicio);
+"""
+
+_TRACEPARENT_RE = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+_DISABLED_VALUES = ("0", "false", "off", "no")
+_env_value = os.environ.get(TRACES_ENV_VAR, "").strip()
+_settings = {
+    "enabled": _env_value.lower() not in _DISABLED_VALUES,
+    "path": Path(_env_value) if _env_value and _env_value.lower() not in _DISABLED_VALUES + ("1", "true", "on", "yes") else DEFAULT_TRACES_PATH,
+}
+_stores = {}
+_stores_lock = threading.Lock()
+_current = ContextVar("finextract_span", default=None)
+
+
+def _rows(cursor) -> list[dict]:
+    columnas = [c[0] for c in cursor.description]
+    return [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
+
+
+def new_span_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def parse_traceparent(value: str):
+    match = _TRACEPARENT_RE.match((value or "").strip().lower())
+    return (match.group(1), match.group(2)) if match else (None, None)
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "service", "start", "end", "status", "attributes", "root", "root_spans")
+
+    def __init__(self, name: str, trace_id: str, parent_id: str = None, service: str = None, root=None, start: float = None, attributes: dict = None):
+        self.trace_id = trace_id
+        self.span_id = new_span_id()
+        self.parent_id = parent_id
+        self.name = name
+        self.service = service or (root.service if root else "main")
+        self.start = time.time() if start is None else start
+        self.end = None
+        self.status = "ok"
+        self.attributes = {k: v for k, v in (attributes or {}).items() if v is not None}
+        # El span raíz de cada servicio junta los spans terminados del documento para guardarlos de una vez.
+        self.root = root if root is not None else self
+        self.root_spans = [] if root is None else None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def finish(self, end: float = None):
+        self.end = time.time() if end is None else end
+        self.root.root_spans.append(self)
+
+
+class TraceStore:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def save(self, spans: list):
+        filas = []
+        for span in spans:
+            atributos = dict(span.attributes)
+            documento = atributos.pop("document", None)
+            extractor = atributos.pop("extractor", None)
+            filas.append((
+                span.trace_id, span.span_id, span.parent_id, span.name, span.service, span.start, span.end,
+                span.end - span.start, documento, extractor, span.status,
+                json.dumps(atributos, ensure_ascii=False, default=str) if atributos else None, os.getpid(),
+            ))
+        with self._connection() as connection:
+            connection.executemany("INSERT OR REPLACE INTO spans VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", filas)
+
+    def resolve_trace(self, clave: str) -> str:
+        # Acepta trace_id/job_id o el nombre del documento (su traza más reciente).
+        connection = self._connection()
+        if connection.execute("SELECT 1 FROM spans WHERE trace_id = ? LIMIT 1", (clave,)).fetchone():
+            return clave
+        fila = connection.execute("SELECT trace_id FROM spans WHERE documento = ? ORDER BY inicio DESC LIMIT 1", (clave,)).fetchone()
+        return fila[0] if fila else None
+
+    def trace(self, trace_id: str) -> list[dict]:
+        return _rows(self._connection().execute("SELECT * FROM spans WHERE trace_id = ? ORDER BY inicio, fin DESC", (trace_id,)))
+
+    def slowest(self, limite: int = 10, extractor: str = None, desde: float = None) -> list[dict]:
+        # Duración total de punta a punta (envío -> último span de cualquier servicio) y etapa más larga.
+        condiciones, parametros = [], []
+        if desde is not None:
+            condiciones.append("inicio >= ?")
+            parametros.append(desde)
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        having = "HAVING MAX(extractor) = ?" if extractor else ""
+        if extractor:
+            parametros.append(extractor)
+        parametros.append(limite)
+        return _rows(self._connection().execute(f"""
+            WITH trazas AS (
+                SELECT trace_id, MIN(inicio) AS inicio, MAX(fin) - MIN(inicio) AS duracion, MAX(documento) AS documento,
+                       MAX(extractor) AS extractor, MAX(estado = 'error') AS con_error
+                FROM spans {where} GROUP BY trace_id {having} ORDER BY duracion DESC LIMIT ?
+            )
+            SELECT t.*, (SELECT s.nombre FROM spans s WHERE s.trace_id = t.trace_id AND s.parent_id IS NOT NULL
+                         AND NOT EXISTS (SELECT 1 FROM spans h WHERE h.trace_id = s.trace_id AND h.parent_id = s.span_id)
+                         ORDER BY s.duracion DESC LIMIT 1) AS etapa_mas_larga,
+                        (SELECT MAX(s.duracion) FROM spans s WHERE s.trace_id = t.trace_id AND s.parent_id IS NOT NULL
+                         AND NOT EXISTS (SELECT 1 FROM spans h WHERE h.trace_id = s.trace_id AND h.parent_id = s.span_id)) AS etapa_segundos
+            FROM trazas t ORDER BY t.duracion DESC
+        """, parametros))
+
+    def recent_traces(self, limite: int) -> list[str]:
+        return [fila[0] for fila in self._connection().execute(
+            "SELECT trace_id FROM spans GROUP BY trace_id ORDER BY MIN(inicio) DESC LIMIT ?", (limite,)
+        )]
+
+
+def configure_tracing(enabled: bool = None, path: str = None) -> dict:
+    if enabled is not None:
+        _settings["enabled"] = bool(enabled)
+    if path is not None:
+        _settings["path"] = Path(path)
+    log_event(f"Trazas {'ACTIVADAS' if _settings['enabled'] else 'desactivadas'} ({_settings['path']})")
+    return {"enabled": _settings["enabled"], "path": str(_settings["path"])}
+
+
+def get_trace_store():
+    if not _settings["enabled"]:
+        return None
+    path = _settings["path"]
+    with _stores_lock:
+        if path not in _stores:
+            try:
+                _stores[path] = TraceStore(path)
+            except (OSError, sqlite3.Error) as e:
+                log_event(f"ADVERTENCIA: No se pudo abrir el archivo de trazas {path} ({e}). Se procesa sin trazas.")
+                _stores[path] = None
+        return _stores[path]
+
+
+def current_span():
+    return _current.get()
+
+
+@contextmanager
+def root_span(name: str, service: str, trace_id: str = None, traceparent: str = None, **attributes):
+    # Span raíz de un servicio para un documento. Con traceparent continúa la traza del servicio que envió el
+    # mensaje; si no, la empieza con trace_id (el job_id) o uno nuevo.
+    if not _settings["enabled"]:
+        yield None
+        return
+    remoto_trace, remoto_parent = parse_traceparent(traceparent)
+    trace_id = remoto_trace or (trace_id if trace_id and re.fullmatch(r"[0-9a-f]{32}", trace_id) else uuid.uuid4().hex)
+    span = Span(name, trace_id, remoto_parent, service, attributes=attributes)
+    token = _current.set(span)
+    add_log_fields(trace_id=trace_id)
+    try:
+        yield span
+    except BaseException:
+        span.status = "error"
+        raise
+    finally:
+        _current.reset(token)
+        span.finish()
+        store = get_trace_store()
+        if store is not None:
+            try:
+                store.save(span.root_spans)
+            except sqlite3.Error as e:
+                log_event(f"ADVERTENCIA: No se pudo guardar la traza {trace_id}: {e}")
+
+
+@contextmanager
+def trace_span(name: str, **attributes):
+    # Span hijo del span actual; fuera de una traza no registra nada.
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    span = Span(name, parent.trace_id, parent.span_id, root=parent.root, attributes=attributes)
+    token = _current.set(span)
+    try:
+        yield span
+    except BaseException:
+        span.status = "error"
+        raise
+    finally:
+        _current.reset(token)
+        span.finish()
+
+
+def record_span(name: str, start: float, end: float, parent_id: str = None, **attributes):
+    # Span con tiempos ya medidos (ej. la espera en la cola, entre enqueued_at y dequeued_at).
+    actual = _current.get()
+    if actual is None or start is None or end is None:
+        return None
+    span = Span(name, actual.trace_id, parent_id or actual.span_id, root=actual.root, start=start, attributes=attributes)
+    span.finish(end)
+    return span
+
+
+def annotate_span(**attributes):
+    span = _current.get()
+    if span is not None:
+        span.attributes.update({k: v for k, v in attributes.items() if v is not None})
+
+
+def mark_span_error(error: Exception = None):
+    span = _current.get()
+    if span is not None:
+        span.status = "error"
+        span.root.status = "error"
+        if error is not None:
+            span.attributes["error"] = f"{type(error).__name__}: {error}"
+
+
+def trace_headers() -> dict:
+    span = _current.get()
+    return {TRACEPARENT_HEADER: span.traceparent} if span is not None else {}
+
+
+def status_trace_fields() -> dict:
+    # Campos para los eventos de system_status_queue: la traza y cuánto lleva el documento en este servicio.
+    span = _current.get()
+    if span is None:
+        return {}
+    return {
+        "trace_id": span.trace_id,
+        TRACEPARENT_HEADER: span.traceparent,
+        "duration_seconds": round(time.time() - span.root.start, 4),
+    }
+
+
+def format_trace(spans: list[dict]) -> str:
+    if not spans:
+        return "Traza vacía."
+    origen = min(s["inicio"] for s in spans)
+    hijos = {}
+    ids = {s["span_id"] for s in spans}
+    for s in spans:
+        hijos.setdefault(s["parent_id"] if s["parent_id"] in ids else None, []).append(s)
+    lineas = [f"Traza {spans[0]['trace_id']}  documento={next((s['documento'] for s in spans if s['documento']), '-')}  "
+              f"total={max(s['fin'] for s in spans) - origen:.3f} s"]
+
+    def agregar(parent_id, nivel):
+        for s in sorted(hijos.get(parent_id, []), key=lambda s: s["inicio"]):
+            atributos = json.loads(s["atributos"]) if s["atributos"] else {}
+            detalle = " ".join(f"{k}={v}" for k, v in atributos.items())
+            lineas.append(f"{'  ' * nivel}{s['nombre']:<{max(28 - 2 * nivel, 8)}} [{s['servicio']}] +{s['inicio'] - origen:8.3f} s  "
+                          f"{s['duracion']:8.3f} s{'  ERROR' if s['estado'] == 'error' else ''}{'  ' + detalle if detalle else ''}")
+            agregar(s["span_id"], nivel + 1)
+
+    agregar(None, 1)
+    return "\n".join(lineas)
+
+
+def chrome_trace(spans: list[dict]) -> dict:
+    # Formato Trace Event (chrome://tracing, Perfetto): una fila (tid) por traza y servicio.
+    eventos = []
+    filas = {}
+    for s in spans:
+        tid = filas.setdefault((s["trace_id"], s["servicio"]), len(filas) + 1)
+        args = json.loads(s["atributos"]) if s["atributos"] else {}
+        args.update({"trace_id": s["trace_id"], "documento": s["documento"], "extractor": s["extractor"], "estado": s["estado"]})
+        eventos.append({
+            "name": s["nombre"], "cat": s["servicio"], "ph": "X", "ts": s["inicio"] * 1e6, "dur": s["duracion"] * 1e6,
+            "pid": s["pid"] or 0, "tid": tid, "args": args,
+        })
+    for (trace_id, servicio), tid in filas.items():
+        documento = next((s["documento"] for s in spans if s["trace_id"] == trace_id and s["documento"]), trace_id[:8])
+        pid = next((s["pid"] or 0 for s in spans if s["trace_id"] == trace_id and s["servicio"] == servicio), 0)
+        eventos.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": f"{documento} ({servicio})"}})
+    return {"traceEvents": eventos, "displayTimeUnit": "ms"}
+
+
+if __name__ == "__main__":
+    import argparse
+    import datetime
+
+    from tracing import configure_tracing, get_trace_store
+
+    parser = argparse.ArgumentParser(description="Consulta las trazas de los documentos procesados.")
+    parser.add_argument("--trazas", type=Path, default=None, help=f"Archivo SQLite (por defecto {DEFAULT_TRACES_PATH} o ${TRACES_ENV_VAR})")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+    traza = subparsers.add_parser("traza", help="Árbol de spans de un documento: job_id/trace_id o nombre del PDF")
+    traza.add_argument("clave")
+    lentos = subparsers.add_parser("lentos", help="Documentos más lentos de punta a punta y su etapa más larga")
+    lentos.add_argument("--limite", type=int, default=10)
+    lentos.add_argument("--extractor", default=None)
+    lentos.add_argument("--horas", type=float, default=None, help="Solo trazas de las últimas N horas")
+    chrome = subparsers.add_parser("chrome", help="Exporta trazas en formato Trace Event (chrome://tracing, Perfetto)")
+    chrome.add_argument("salida", type=Path)
+    chrome.add_argument("--traza", action="append", default=None, help="job_id/trace_id o nombre del PDF (repetible)")
+    chrome.add_argument("--limite", type=int, default=50, help="Sin --traza, las N trazas más recientes")
+    args = parser.parse_args()
+
+    configure_tracing(enabled=True, path=args.trazas)
+    store = get_trace_store()
+    if store is None:
+        raise SystemExit(1)
+
+    if args.comando == "traza":
+        trace_id = store.resolve_trace(args.clave)
+        if trace_id is None:
+            print(f"No hay trazas para '{args.clave}'.")
+            raise SystemExit(1)
+        print(format_trace(store.trace(trace_id)))
+    elif args.comando == "lentos":
+        desde = time.time() - args.horas * 3600 if args.horas else None
+        for fila in store.slowest(args.limite, args.extractor, desde):
+            inicio = datetime.datetime.fromtimestamp(fila["inicio"]).strftime("%Y-%m-%d %H:%M:%S")
+            etapa = f"{fila['etapa_mas_larga']} ({fila['etapa_segundos']:.3f} s)" if fila["etapa_mas_larga"] else "-"
+            print(f"{fila['duracion']:9.3f} s  {inicio}  {fila['documento'] or '-':<40} {fila['extractor'] or '-':<20} {etapa:<28}"
+                  f"{'  ERROR' if fila['con_error'] else ''}  {fila['trace_id']}")
+    elif args.comando == "chrome":
+        trace_ids = [store.resolve_trace(clave) for clave in args.traza] if args.traza else store.recent_traces(args.limite)
+        spans = [s for trace_id in trace_ids if trace_id for s in store.trace(trace_id)]
+        args.salida.write_text(json.dumps(chrome_trace(spans), ensure_ascii=False), encoding="utf-8")
+        print(f"{len(spans)} span(s) de {len([t for t in trace_ids if t])} traza(s) exportados a {args.salida}")
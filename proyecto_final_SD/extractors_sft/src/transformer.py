@@ -1,4 +1,5 @@
 import pandas as pd
+from amounts import amounts_to_cents
 
 def transform(df: pd.DataFrame) -> pd.DataFrame:
     df = df.copy()
@@ -17,14 +18,10 @@ def transform(df: pd.DataFrame) -> pd.DataFrame:
             return f"B-{r}"
         return r
 
-    def format_monto(x):
-        entero = int(abs(x))
-        decimales = f"{abs(x):.2f}".split(".")[1]
-        return f"-{entero},{decimales}" if x < 0 else f"{entero},{decimales}"
-
     df["Referencia"] = df["Referencia"].apply(format_ref)
+    # Los montos siguen en centavos enteros; el formato "1234,56" se aplica al escribir la salida.
     if "Monto" in df.columns:
-        df["Monto"] = df["Monto"].map(format_monto)
+        df["Monto"] = amounts_to_cents(df["Monto"])
 
     df = df.sort_values(by="Referencia", ascending=True)
  
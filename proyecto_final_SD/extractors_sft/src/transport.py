@@ -0,0 +1,377 @@
+import itertools
+import json
+import os
+import threading
+from collections import deque
+from types import SimpleNamespace
+
+from logger import log_event
+from pipeline_metrics import LazyMetric
+
+# Transporte de los mensajes de trabajo (una cola pdf_processing_queue.<extractor> por extractor) y de estado
+# (system_status_queue). Cada worker consume solo las colas de los extractores que atiende.
+#   rabbitmq: broker en rabbitmq_host; main, los workers del servicio local y la GUI pueden ser procesos distintos.
+#   local:    colas en memoria del proceso que envía (main o la GUI). El servicio local corre en local_workers
+#             hilos de ese mismo proceso, sin broker. Lo que queda en las colas se pierde al salir; los trabajos
+#             sin terminar se reenvían con "python src/job_ledger.py reanudar <lote>".
+# En los dos casos el consumidor recibe callback(ch, method, properties, body) y confirma con ch.basic_ack o
+# devuelve el mensaje a la cola con ch.basic_nack(requeue=True); lo no confirmado vuelve a la cola si el
+# consumidor se detiene.
+TRANSPORT_ENV_VAR = "FINEXTRACT_TRANSPORT"
+RABBITMQ_HOST_ENV_VAR = "FINEXTRACT_RABBITMQ_HOST"
+RABBITMQ_BACKEND = "rabbitmq"
+LOCAL_BACKEND = "local"
+BACKENDS = (RABBITMQ_BACKEND, LOCAL_BACKEND)
+
+DEFAULT_TRANSPORT = {
+    "backend": RABBITMQ_BACKEND,
+    "rabbitmq_host": "localhost",
+    "local_workers": 2,
+    # Solo la cola de estado tiene tope: si nadie la consume (main sin GUI) se descartan los eventos más viejos.
+    # Los mensajes publicados como persistentes (eventos que cierran un trabajo) nunca se descartan.
+    "local_status_queue_size": 10000,
+}
+STATUS_QUEUE_NAME = "system_status_queue"
+JOB_QUEUE_PREFIX = "pdf_processing_queue"
+# Cola única de trabajos de antes de las colas por extractor: lo que quedó ahí se reparte al iniciar un worker.
+LEGACY_JOB_QUEUE_NAME = JOB_QUEUE_PREFIX
+
+# Cada cuánto un consumidor revisa si le pidieron detenerse.
+CONSUME_POLL_SECONDS = 0.5
+
+PIPELINE_TRANSPORT_DROPPED_TOTAL = LazyMetric(
+    'Counter',
+    'pdf_pipeline_transport_messages_dropped_total',
+    'Messages discarded by the in-process transport because the queue was full.',
+    ['queue']
+)
+
+
+class TransportUnavailable(ConnectionError):
+    pass
+
+
+def job_queue_name(extractor_name: str) -> str:
+    return f"{JOB_QUEUE_PREFIX}.{extractor_name}"
+
+
+def _queue_names(queue_names) -> list[str]:
+    return [queue_names] if isinstance(queue_names, str) else list(queue_names)
+
+
+def _env_settings() -> dict:
+    settings = {}
+    if os.environ.get(TRANSPORT_ENV_VAR):
+        settings["backend"] = os.environ[TRANSPORT_ENV_VAR].lower()
+    if os.environ.get(RABBITMQ_HOST_ENV_VAR):
+        settings["rabbitmq_host"] = os.environ[RABBITMQ_HOST_ENV_VAR]
+    return settings
+
+
+_settings = {**DEFAULT_TRANSPORT, **_env_settings()}
+_transports = {}
+_transports_lock = threading.Lock()
+
+
+class RabbitMQTransport:
+    backend = RABBITMQ_BACKEND
+
+    def __init__(self, host: str):
+        self.host = host
+        # BlockingConnection no se comparte entre hilos: cada hilo que publica reutiliza la suya.
+        self._local = threading.local()
+
+    def describe(self) -> str:
+        return f"RabbitMQ en '{self.host}'"
+
+    def _connect(self):
+        import pika
+
+        try:
+            return pika.BlockingConnection(pika.ConnectionParameters(host=self.host))
+        except pika.exceptions.AMQPConnectionError as e:
+            raise TransportUnavailable(f"No se pudo conectar a RabbitMQ en '{self.host}' ({type(e).__name__}: {e})") from e
+
+    def _channel(self):
+        channel = getattr(self._local, "channel", None)
+        if channel is None or not channel.is_open:
+            self._close_thread_connection()
+            self._local.connection = self._connect()
+            self._local.channel = self._local.connection.channel()
+            self._local.declared = set()
+        return self._local.channel
+
+    def _close_thread_connection(self):
+        connection = getattr(self._local, "connection", None)
+        self._local.connection = self._local.channel = None
+        if connection is not None and connection.is_open:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def publish(self, queue_name: str, body: str, headers: dict = None, persistent: bool = False):
+        import pika
+
+        properties = pika.BasicProperties(delivery_mode=2 if persistent else None, headers=headers or None)
+        # La conexión guardada puede haberse cerrado por inactividad (heartbeat): se reconecta una vez.
+        for intento in (1, 2):
+            try:
+                channel = self._channel()
+                if queue_name not in self._local.declared:
+                    channel.queue_declare(queue=queue_name, durable=True)
+                    self._local.declared.add(queue_name)
+                channel.basic_publish(exchange='', routing_key=queue_name, body=body, properties=properties)
+                return
+            except (pika.exceptions.AMQPConnectionError, pika.exceptions.AMQPChannelError, pika.exceptions.StreamLostError):
+                self._close_thread_connection()
+                if intento == 2:
+                    raise
+
+    def consume(self, queue_names, callback, stop_event: threading.Event = None, prefetch: int = 1):
+        connection = self._connect()
+        try:
+            channel = connection.channel()
+            # global_qos: el prefetch vale para el canal entero, no para cada una de las colas consumidas.
+            channel.basic_qos(prefetch_count=prefetch, global_qos=True)
+            for queue_name in _queue_names(queue_names):
+                channel.queue_declare(queue=queue_name, durable=True)
+                channel.basic_consume(queue=queue_name, on_message_callback=callback, auto_ack=False)
+            # ch.stop_consuming() desde el callback cancela el consumidor y deja consumer_tags vacío.
+            while channel.consumer_tags and not (stop_event and stop_event.is_set()):
+                connection.process_data_events(time_limit=CONSUME_POLL_SECONDS)
+        finally:
+            if connection.is_open:
+                connection.close()
+
+    def drain(self, queue_name: str, handler) -> int:
+        # Entrega con handler(body, headers) cada mensaje de la cola hasta vaciarla; se confirma después del handler.
+        if not self.queue_stats(queue_name)[0]:
+            return 0
+        connection = self._connect()
+        try:
+            channel = connection.channel()
+            entregados = 0
+            while True:
+                method, properties, body = channel.basic_get(queue=queue_name, auto_ack=False)
+                if method is None:
+                    return entregados
+                handler(body.decode("utf-8") if isinstance(body, bytes) else body, properties.headers)
+                channel.basic_ack(method.delivery_tag)
+                entregados += 1
+        finally:
+            if connection.is_open:
+                connection.close()
+
+    def queue_stats(self, queue_name: str) -> tuple[int, int]:
+        import pika
+
+        connection = self._connect()
+        try:
+            channel = connection.channel()
+            try:
+                declared = channel.queue_declare(queue=queue_name, passive=True)
+            except pika.exceptions.ChannelClosedByBroker as e:
+                # La cola todavía no existe (nadie publicó ni consumió): está vacía.
+                if e.reply_code == 404:
+                    return 0, 0
+                raise
+            return declared.method.message_count, declared.method.consumer_count
+        finally:
+            if connection.is_open:
+                connection.close()
+
+    def close(self):
+        self._close_thread_connection()
+
+
+class _LocalQueue:
+    # La condición es la del transporte: un consumidor espera a la vez en todas las colas que consume.
+    def __init__(self, name: str, condition: threading.Condition, max_length: int = 0):
+        self.name = name
+        self.max_length = max_length
+        self.ready = deque()
+        self.consumers = 0
+        self.condition = condition
+
+    def put(self, message: tuple, front: bool = False):
+        with self.condition:
+            if self.max_length and len(self.ready) >= self.max_length:
+                # Se descarta el mensaje no persistente más viejo; si todos lo son, el nuevo (o se pasa del tope).
+                descartable = next((m for m in self.ready if not m[3]), None)
+                if descartable is not None:
+                    self.ready.remove(descartable)
+                    PIPELINE_TRANSPORT_DROPPED_TOTAL.labels(queue=self.name).inc()
+                elif not message[3]:
+                    PIPELINE_TRANSPORT_DROPPED_TOTAL.labels(queue=self.name).inc()
+                    return
+            if front:
+                self.ready.appendleft(message)
+            else:
+                self.ready.append(message)
+            self.condition.notify_all()
+
+
+class _LocalChannel:
+    # Mismos métodos que usan los callbacks sobre el canal de pika.
+    def __init__(self):
+        self.unacked = {}
+        self.consuming = True
+
+    def basic_ack(self, delivery_tag: int, multiple: bool = False):
+        self._settle(delivery_tag)
+
+    def basic_nack(self, delivery_tag: int, multiple: bool = False, requeue: bool = True):
+        cola, body, headers, persistent = self._settle(delivery_tag)
+        if requeue:
+            # Como en RabbitMQ, el mensaje devuelto vuelve adelante de su cola y llega marcado como reentregado.
+            cola.put((body, headers, True, persistent), front=True)
+
+    def _settle(self, delivery_tag: int):
+        try:
+            return self.unacked.pop(delivery_tag)
+        except KeyError:
+            raise ValueError(f"delivery_tag {delivery_tag} desconocido o ya confirmado.")
+
+    def stop_consuming(self):
+        self.consuming = False
+
+    def requeue_unacked(self):
+        for delivery_tag in sorted(self.unacked, reverse=True):
+            self.basic_nack(delivery_tag, requeue=True)
+
+
+class LocalTransport:
+    backend = LOCAL_BACKEND
+
+    def __init__(self, status_queue_size: int = 0):
+        self.status_queue_size = status_queue_size
+        self._queues = {}
+        self._lock = threading.Lock()
+        self._condition = threading.Condition()
+        self._tags = itertools.count(1)
+        self._closed = threading.Event()
+
+    def describe(self) -> str:
+        return "colas en memoria de este proceso"
+
+    def _queue(self, queue_name: str) -> _LocalQueue:
+        with self._lock:
+            cola = self._queues.get(queue_name)
+            if cola is None:
+                max_length = self.status_queue_size if queue_name == STATUS_QUEUE_NAME else 0
+                cola = self._queues[queue_name] = _LocalQueue(queue_name, self._condition, max_length)
+            return cola
+
+    def _take(self, colas: list, inicio: int, timeout: float):
+        # Se recorre desde la cola siguiente a la última atendida, así ningún extractor espera a que otro se vacíe.
+        with self._condition:
+            for intento in (1, 2):
+                for desplazamiento in range(len(colas)):
+                    indice = (inicio + desplazamiento) % len(colas)
+                    if colas[indice].ready:
+                        return indice, colas[indice].ready.popleft()
+                if intento == 1:
+                    self._condition.wait(timeout)
+            return inicio, None
+
+    def publish(self, queue_name: str, body: str, headers: dict = None, persistent: bool = False):
+        self._queue(queue_name).put((body, dict(headers) if headers else None, False, persistent))
+
+    def consume(self, queue_names, callback, stop_event: threading.Event = None, prefetch: int = 1):
+        colas = [self._queue(queue_name) for queue_name in _queue_names(queue_names)]
+        channel = _LocalChannel()
+        siguiente = 0
+        with self._condition:
+            for cola in colas:
+                cola.consumers += 1
+        try:
+            while channel.consuming and not self._closed.is_set() and not (stop_event and stop_event.is_set()):
+                # Con prefetch se espera a que el callback confirme lo que tiene antes de tomar otro mensaje.
+                if len(channel.unacked) >= prefetch:
+                    self._closed.wait(CONSUME_POLL_SECONDS / 10)
+                    continue
+                indice, message = self._take(colas, siguiente, CONSUME_POLL_SECONDS)
+                if message is None:
+                    continue
+                siguiente = indice + 1
+                cola = colas[indice]
+                body, headers, redelivered, persistent = message
+                delivery_tag = next(self._tags)
+                channel.unacked[delivery_tag] = (cola, body, headers, persistent)
+                method = SimpleNamespace(delivery_tag=delivery_tag, redelivered=redelivered, routing_key=cola.name)
+                callback(channel, method, SimpleNamespace(headers=headers), body)
+        finally:
+            channel.requeue_unacked()
+            with self._condition:
+                for cola in colas:
+                    cola.consumers -= 1
+
+    def drain(self, queue_name: str, handler) -> int:
+        cola = self._queue(queue_name)
+        entregados = 0
+        while True:
+            with self._condition:
+                if not cola.ready:
+                    return entregados
+                body, headers = cola.ready.popleft()[:2]
+            handler(body, headers)
+            entregados += 1
+
+    def queue_stats(self, queue_name: str) -> tuple[int, int]:
+        cola = self._queue(queue_name)
+        with self._condition:
+            return len(cola.ready), cola.consumers
+
+    def close(self):
+        self._closed.set()
+
+
+def reroute_legacy_jobs(transport) -> int:
+    # Los trabajos publicados en pdf_processing_queue antes de actualizar se pasan a la cola de su extractor.
+    movidos = 0
+
+    def reenviar(body, headers):
+        nonlocal movidos
+        try:
+            extractor_name = json.loads(body).get("extractor_name")
+        except (ValueError, AttributeError):
+            extractor_name = None
+        if not extractor_name:
+            log_event(f"ERROR: Mensaje sin extractor en '{LEGACY_JOB_QUEUE_NAME}', se descarta: {body[:200]}")
+            return
+        transport.publish(job_queue_name(extractor_name), body, headers, persistent=True)
+        movidos += 1
+
+    transport.drain(LEGACY_JOB_QUEUE_NAME, reenviar)
+    if movidos:
+        log_event(f"{movidos} trabajo(s) de '{LEGACY_JOB_QUEUE_NAME}' reenviados a las colas de sus extractores.")
+    return movidos
+
+
+def configure_transport(settings: dict = None, **overrides) -> dict:
+    # Las variables de entorno tienen prioridad sobre el bloque "transport" de config.json.
+    nuevos = {**DEFAULT_TRANSPORT, **(settings or {}), **_env_settings(), **overrides}
+    if nuevos["backend"] not in BACKENDS:
+        log_event(f"ADVERTENCIA: Transporte '{nuevos['backend']}' desconocido (opciones: {', '.join(BACKENDS)}), se usa '{RABBITMQ_BACKEND}'.")
+        nuevos["backend"] = RABBITMQ_BACKEND
+    _settings.update(nuevos)
+    return dict(_settings)
+
+
+def transport_settings() -> dict:
+    return dict(_settings)
+
+
+def get_transport():
+    backend = _settings["backend"]
+    clave = (backend, _settings["rabbitmq_host"]) if backend == RABBITMQ_BACKEND else (backend,)
+    with _transports_lock:
+        transport = _transports.get(clave)
+        if transport is None:
+            if backend == LOCAL_BACKEND:
+                transport = LocalTransport(int(_settings["local_status_queue_size"]))
+            else:
+                transport = RabbitMQTransport(_settings["rabbitmq_host"])
+            _transports[clave] = transport
+        return transport
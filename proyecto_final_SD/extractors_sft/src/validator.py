@@ -1,5 +1,9 @@
 from pathlib import Path
 import pandas as pd
+from amounts import amounts_to_cents
+from reference_index import format_indexed_at, historical_duplicates
+
+NO_WARNINGS_MESSAGE = "Sin advertencias detectadas."
 
 def validate_excel(file_path: Path, original_pdf_name: str) -> None:
     try:
@@ -8,20 +12,28 @@ def validate_excel(file_path: Path, original_pdf_name: str) -> None:
         print(f"Error abriendo {file_path.name}: {e}")
         return
 
+    output_path = file_path.with_name(f"{file_path.stem}_validation.txt")
+    validate_dataframe(df, original_pdf_name, output_path)
+
+def validate_dataframe(df: pd.DataFrame, original_pdf_name: str, output_path: Path, extractor_name: str = None) -> None:
+    logs = validation_messages(df, original_pdf_name, extractor_name)
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(logs))
+
+def validation_messages(df: pd.DataFrame, original_pdf_name: str, extractor_name: str = None) -> list[str]:
+    df = df.reset_index(drop=True)
     logs = [f"[Validación de {original_pdf_name}]"]
 
     def log(msg): logs.append(f"{msg}")
 
+    # Centavos enteros: sirve tanto para el DataFrame en memoria como para el texto "1234,56" leído del Excel.
+    centavos = {col: amounts_to_cents(df[col]) for col in ["Monto", "Monto Original", "Descuento", "Retención"] if col in df.columns}
+
     if "Referencia" in df.columns and "Monto" in df.columns:
-        for i, row in df.iterrows():
-            ref = str(row["Referencia"]).strip()
-            if ref.startswith("A-0") and not ref.startswith("A-00"):
-                try:
-                    monto = float(str(row["Monto"]).replace(",", ".").strip())
-                    if monto < 0:
-                        log(f"Referencia {ref} tiene monto negativo: {monto:.2f}")
-                except:
-                    continue
+        refs = df["Referencia"].astype(str).str.strip()
+        negativos = refs.str.startswith("A-0") & ~refs.str.startswith("A-00") & (centavos["Monto"] < 0).fillna(False)
+        for ref, monto in zip(refs[negativos], centavos["Monto"][negativos]):
+            log(f"Referencia {ref} tiene monto negativo: {monto / 100:.2f}")
 
     if "Referencia" in df.columns:
         refs = df["Referencia"].astype(str)
@@ -30,6 +42,14 @@ def validate_excel(file_path: Path, original_pdf_name: str) -> None:
             if count >= 2:
                 log(f"Referencia duplicada: {ref} aparece {count} veces")
 
+    # Con el extractor conocido, se cruza contra el índice histórico (otros PDFs y meses). Solo se consulta: el
+    # documento se agrega al índice cuando su salida quedó escrita.
+    for previa in historical_duplicates(df, original_pdf_name, extractor_name):
+        monto = "-" if previa["monto_previo"] is None else f"{previa['monto_previo'] / 100:.2f}"
+        mismo_monto = previa["monto"] is not None and previa["monto"] == previa["monto_previo"]
+        log(f"Referencia {previa['referencia']} ya registrada en {previa['documento_previo']} ({format_indexed_at(previa['indexado'])}, monto {monto})"
+            f"{': mismo monto, posible pago duplicado' if mismo_monto else ''}")
+
     # 3. Referencias con más de 7 dígitos
     for ref in df.get("Referencia", []):
         if pd.notna(ref):
@@ -39,42 +59,27 @@ def validate_excel(file_path: Path, original_pdf_name: str) -> None:
 
     # 4. Verificación de totales (si hay fila TOTAL:)
     if "Referencia" in df.columns and "TOTAL:" in df["Referencia"].astype(str).values:
-        totales = df[df["Referencia"] == "TOTAL:"].iloc[0]
-        datos = df[df["Referencia"] != "TOTAL:"]
+        es_total = df["Referencia"].astype(str) == "TOTAL:"
         for col in ["Monto", "Descuento", "Retención"]:
             if col in df.columns:
-                try:
-                    datos_col = datos[col].astype(str).str.replace(",", ".").astype(float)
-                    suma = datos_col.dropna().sum()
-                    declarado = float(str(totales[col]).replace(",", "."))
-                    if abs(suma - declarado) > 0.01:
-                        log(f"Total en '{col}' incorrecto: declarado {declarado:.2f} vs suma real {suma:.2f}")
-                except:
+                declarado = centavos[col][es_total].iloc[0]
+                if pd.isna(declarado):
                     continue
+                suma = centavos[col][~es_total].sum()
+                if suma != declarado:
+                    log(f"Total en '{col}' incorrecto: declarado {declarado / 100:.2f} vs suma real {suma / 100:.2f}")
 
-    for i, row in df.iterrows():
-        ref = row.get("Referencia")
-        monto = row.get("Monto")
-        monto_original = row.get("Monto Original")
+    sin_monto = pd.Series(True, index=df.index)
+    for col in ["Monto", "Monto Original"]:
+        if col in centavos:
+            sin_monto &= centavos[col].isna()
 
+    for i, ref in enumerate(df.get("Referencia", pd.Series(None, index=df.index))):
         ref_valida = pd.notna(ref) and str(ref).strip().lower() != "nan" and str(ref).strip() != ""
-
-        monto_valido = False
-        for val in [monto, monto_original]:
-            try:
-                val_float = float(str(val).replace(",", ".").strip())
-                if not pd.isna(val_float):
-                    monto_valido = True
-                    break
-            except:
-                continue
-
-        if not ref_valida or not monto_valido:
+        if not ref_valida or sin_monto.iloc[i]:
             log(f"Fila {i + 2} con campos faltantes (Referencia o Monto/Monto Original)")
 
     if len(logs) == 1:
-        logs.append("Sin advertencias detectadas.")
+        logs.append(NO_WARNINGS_MESSAGE)
 
-    output_path = file_path.with_name(f"{file_path.stem}_validation.txt")
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write("\n".join(logs))
+    return logs
@@ -0,0 +1,80 @@
+import json
+import os
+import time
+from pathlib import Path
+
+# Estado que cada worker del supervisor publica en un archivo JSON propio: si está ocupado, el tiempo
+# ocupado acumulado (para calcular utilización) y cuánto esperó en la cola el mensaje en curso (None si está
+# ocioso). El archivo aparece recién cuando el worker está listo para consumir: sin archivo, está arrancando.
+WORKER_STATUS_DIR_ENV_VAR = "FINEXTRACT_WORKER_STATUS_DIR"
+WORKER_ID_ENV_VAR = "FINEXTRACT_WORKER_ID"
+
+
+class WorkerStatusReporter:
+    def __init__(self, directory: str = None, worker_id: str = None):
+        directory = directory or os.environ.get(WORKER_STATUS_DIR_ENV_VAR)
+        worker_id = worker_id or os.environ.get(WORKER_ID_ENV_VAR) or str(os.getpid())
+        self.path = Path(directory) / f"{worker_id}.json" if directory else None
+        self.state = {
+            "worker_id": worker_id,
+            "pid": os.getpid(),
+            "started": time.time(),
+            "busy": False,
+            "busy_since": None,
+            "busy_seconds": 0.0,
+            "processed": 0,
+            "last_message_age_seconds": None,
+            "updated": time.time(),
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def _write(self):
+        if not self.enabled:
+            return
+        self.state["updated"] = time.time()
+        tmp_path = self.path.with_suffix(".tmp")
+        try:
+            tmp_path.write_text(json.dumps(self.state), encoding="utf-8")
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+    def ready(self):
+        self._write()
+
+    def begin(self, enqueued_at: float = None):
+        self.state["busy"] = True
+        self.state["busy_since"] = time.time()
+        if enqueued_at is not None:
+            self.state["last_message_age_seconds"] = max(time.time() - float(enqueued_at), 0.0)
+        self._write()
+
+    def end(self):
+        if self.state["busy_since"] is not None:
+            self.state["busy_seconds"] += time.time() - self.state["busy_since"]
+        self.state["busy"] = False
+        self.state["busy_since"] = None
+        self.state["last_message_age_seconds"] = None
+        self.state["processed"] += 1
+        self._write()
+
+
+def busy_seconds(status: dict, now: float = None) -> float:
+    total = float(status.get("busy_seconds") or 0.0)
+    if status.get("busy") and status.get("busy_since"):
+        total += (now or time.time()) - float(status["busy_since"])
+    return total
+
+
+def read_worker_statuses(directory: Path) -> dict:
+    statuses = {}
+    for path in Path(directory).glob("*.json"):
+        try:
+            status = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        statuses[status.get("worker_id", path.stem)] = status
+    return statuses
@@ -0,0 +1,12 @@
+import os
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+# Los tests no escriben en los SQLite de extractors_sft/ledger: cada uno abre los suyos en tmp_path.
+for variable in ("FINEXTRACT_LEDGER", "FINEXTRACT_TRACES", "FINEXTRACT_REFERENCE_INDEX"):
+    os.environ.setdefault(variable, "0")
+os.environ.setdefault("FINEXTRACT_LOG_ASYNC", "0")
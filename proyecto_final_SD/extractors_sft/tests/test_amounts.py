@@ -0,0 +1,58 @@
+import pandas as pd
+import pytest
+
+from amounts import amounts_to_cents, format_amount, parse_amount, parse_amounts
+
+
+@pytest.mark.parametrize("texto, centavos", [
+    ("1234", 123400),
+    ("1234,5", 123450),
+    ("1,23", 123),
+    ("0,05", 5),
+    (".5", 50),
+    ("1.234,56", 123456),
+    ("1,234.56", 123456),
+    ("1.234", 123400),
+    ("1,234", 123400),
+    ("-1.234.567,89", -123456789),
+    ("1,234,567.89", 123456789),
+    ("$ 1 234,50", 123450),
+])
+def test_parses_both_locales(texto, centavos):
+    assert parse_amount(texto) == centavos
+
+
+@pytest.mark.parametrize("texto", [
+    "1,2,3",
+    "1.234,567",
+    "1.234.56",
+    "1,234,56",
+    "12,34,567",
+    "1234.567",
+    "1.23.456",
+    "1.234,5.6",
+    "-",
+    "",
+    "abc",
+])
+def test_malformed_amounts_are_null(texto):
+    assert parse_amount(texto) is None
+
+
+def test_parse_amounts_keeps_index_and_nulls():
+    cents = parse_amounts(pd.Series(["1.234,56", "1,2,3", None], index=[10, 11, 12]))
+    assert cents.dtype == "Int64"
+    assert list(cents.index) == [10, 11, 12]
+    assert cents.iloc[0] == 123456
+    assert cents.iloc[1:].isna().all()
+
+
+def test_amounts_to_cents_by_dtype():
+    assert amounts_to_cents(pd.Series([1234.56])).iloc[0] == 123456
+    assert amounts_to_cents(pd.Series([123456])).iloc[0] == 123456
+    assert amounts_to_cents(pd.Series(["1.234,56"])).iloc[0] == 123456
+
+
+def test_format_amount_round_trip():
+    assert format_amount(parse_amount("-1.234,05")) == "-1234,05"
+    assert format_amount(None) == ""
@@ -0,0 +1,71 @@
+import threading
+import time
+
+import pytest
+
+import backpressure
+from backpressure import CapacityUnavailable, SubmissionThrottle
+
+RAPIDO = {"high_watermark": 10, "low_watermark": 2, "poll_seconds": 0.01, "max_wait_seconds": 0.5, "no_consumer_seconds": 0.05}
+
+
+@pytest.fixture
+def cola(monkeypatch):
+    estado = {"depth": 0, "consumers": 1}
+    monkeypatch.setattr(backpressure, "queue_stats", lambda queue_name: (estado["depth"], estado["consumers"]))
+    return estado
+
+
+def test_no_wait_below_high_watermark(cola):
+    cola["depth"] = 5
+    assert SubmissionThrottle(RAPIDO, "q").wait_for_capacity() == 0.0
+
+
+def test_waits_until_low_watermark(cola):
+    cola["depth"] = 10
+    eventos = []
+    threading.Timer(0.05, lambda: cola.update(depth=2)).start()
+
+    esperado = SubmissionThrottle(RAPIDO, "q").wait_for_capacity(lambda tipo, datos: eventos.append(tipo))
+
+    assert esperado > 0
+    assert eventos == ["waiting_for_capacity", "capacity_available"]
+
+
+def test_gives_up_without_consumers_and_fails_fast_afterwards(cola):
+    cola.update(depth=10, consumers=0)
+    throttle = SubmissionThrottle(RAPIDO, "q")
+    eventos = []
+
+    with pytest.raises(CapacityUnavailable) as error:
+        throttle.wait_for_capacity(lambda tipo, datos: eventos.append((tipo, datos.get("reason"))))
+    assert error.value.reason == "no_consumers"
+    assert eventos[-1] == ("capacity_unavailable", "no_consumers")
+
+    inicio = time.monotonic()
+    with pytest.raises(CapacityUnavailable):
+        throttle.wait_for_capacity()
+    assert time.monotonic() - inicio < RAPIDO["no_consumer_seconds"]
+
+    cola["depth"] = 0
+    assert throttle.wait_for_capacity() == 0.0
+
+
+def test_gives_up_after_max_wait(cola):
+    cola.update(depth=10, consumers=1)
+    with pytest.raises(CapacityUnavailable) as error:
+        SubmissionThrottle(RAPIDO, "q").wait_for_capacity()
+    assert error.value.reason == "timeout"
+    assert error.value.waited_seconds >= RAPIDO["max_wait_seconds"]
+
+
+def test_cancel_stops_the_wait(cola):
+    cola.update(depth=10, consumers=0)
+    cancel = threading.Event()
+    throttle = SubmissionThrottle({**RAPIDO, "no_consumer_seconds": 0, "max_wait_seconds": 0}, "q", cancel)
+    threading.Timer(0.05, cancel.set).start()
+
+    with pytest.raises(CapacityUnavailable) as error:
+        throttle.wait_for_capacity()
+    assert error.value.reason == "cancelled"
+    assert throttle.exhausted is None
@@ -0,0 +1,52 @@
+import pandas as pd
+import pytest
+
+import batch_output
+import main
+
+
+def extract_ops_macro(pdf_path):
+    pass
+
+
+@pytest.fixture
+def lote(tmp_path, monkeypatch):
+    pdfs = [tmp_path / "enero.pdf", tmp_path / "febrero.pdf"]
+    pasos = []
+    escritura = {"ok": True}
+
+    def escribir(resultados, output_path, mode):
+        pasos.append(("workbook", len(resultados)))
+        return escritura["ok"]
+
+    monkeypatch.setattr(main, "start_batch", lambda paths, *args, **kwargs: ("lote-1", {str(p.resolve()): f"job-{p.stem}" for p in paths}))
+    monkeypatch.setattr(main, "preflight", lambda pdf: {"pages": 1})
+    monkeypatch.setattr(main, "detect_extractor", lambda pdf, config: extract_ops_macro)
+    monkeypatch.setattr(main, "extract_dataframe", lambda func, pdf, pages: pd.DataFrame({"Referencia": [f"A-00{pdf.stem}"], "Monto": [1.0]}))
+    monkeypatch.setattr(main, "record_job_event", lambda job_id, tipo, *args, **kwargs: pasos.append(("ledger", tipo, job_id)))
+    monkeypatch.setattr(main, "publish_status_event", lambda tipo, pdf_path, extractor_name=None, error_message=None, job_id=None, extra=None: pasos.append(("status", tipo, job_id)))
+    monkeypatch.setattr(batch_output, "write_batch_workbook", escribir)
+    return pdfs, pasos, escritura, tmp_path
+
+
+def test_batch_documents_complete_with_job_id_after_workbook_is_written(lote):
+    pdfs, pasos, _, tmp_path = lote
+
+    generados = main.procesar_lote(pdfs, tmp_path, {})
+
+    assert len(generados) == 1
+    finales = [paso for paso in pasos if paso[0] == "status" and paso[1] == "pdf_processing_completed"]
+    assert finales == [("status", "pdf_processing_completed", "job-enero"), ("status", "pdf_processing_completed", "job-febrero")]
+    assert pasos.index(("workbook", 2)) < pasos.index(finales[0])
+    assert pasos.index(("ledger", "file_generated", "job-enero")) < pasos.index(finales[0])
+
+
+def test_failed_workbook_reports_error_instead_of_completion(lote):
+    pdfs, pasos, escritura, tmp_path = lote
+    escritura["ok"] = False
+
+    assert main.procesar_lote(pdfs, tmp_path, {}) == []
+
+    tipos = [paso[1:] for paso in pasos if paso[0] == "status" and paso[1] != "pdf_processing_started"]
+    assert ("pdf_processing_completed", "job-enero") not in tipos
+    assert ("pdf_processing_error", "job-enero") in tipos and ("pdf_processing_error", "job-febrero") in tipos
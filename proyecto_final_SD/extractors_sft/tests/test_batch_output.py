@@ -0,0 +1,23 @@
+import pandas as pd
+
+from batch_output import build_validation
+
+
+def test_build_validation_only_lists_real_warnings():
+    limpio = pd.DataFrame({"Referencia": ["A-0010001", "A-0010002"], "Monto": ["100,00", "200,00"]})
+    con_duplicado = pd.DataFrame({"Referencia": ["A-0010003", "A-0010003"], "Monto": ["100,00", "100,00"]})
+
+    validacion = build_validation([
+        ("limpio.pdf", "extract_ops_macro", limpio),
+        ("duplicado.pdf", "extract_ops_macro", con_duplicado),
+    ])
+
+    assert list(validacion["Documento"]) == ["duplicado.pdf"]
+    assert validacion["Validación"].iloc[0] == "Referencia duplicada: A-0010003 aparece 2 veces"
+
+
+def test_build_validation_empty_when_all_documents_are_clean():
+    limpio = pd.DataFrame({"Referencia": ["A-0010001"], "Monto": ["100,00"]})
+    validacion = build_validation([("limpio.pdf", "extract_ops_macro", limpio)])
+    assert validacion.empty
+    assert list(validacion.columns) == ["Documento", "Proveedor", "Validación"]
@@ -0,0 +1,58 @@
+import pstats
+
+import pytest
+from prometheus_client import REGISTRY
+
+import profiler
+from deadlines import IsolatedRunner
+from pipeline_metrics import extraction_timer, timed_page_text
+from profiler import configure_profiling, profile_document
+
+
+class PaginaFalsa:
+    def __init__(self, page_number):
+        self.page_number = page_number
+
+    def extract_text(self):
+        return f"pagina {self.page_number}"
+
+
+def leer_paginas(cantidad):
+    return [timed_page_text(PaginaFalsa(numero)) for numero in range(1, cantidad + 1)]
+
+
+def muestras(nombre, **labels):
+    return REGISTRY.get_sample_value(nombre, labels) or 0
+
+
+@pytest.fixture
+def runner():
+    runner = IsolatedRunner()
+    yield runner
+    runner.stop()
+
+
+def test_isolated_extraction_records_parse_metrics_in_parent(runner):
+    antes_parse = muestras("pdf_pipeline_stage_duration_seconds_count", stage="pdf_parse", extractor="extract_aislado")
+    antes_paginas = muestras("pdf_pipeline_pdf_pages_sum", extractor="extract_aislado")
+
+    with extraction_timer("extract_aislado"):
+        textos = runner.call(leer_paginas, (3,), 60, "extraction")
+
+    assert textos == ["pagina 1", "pagina 2", "pagina 3"]
+    assert muestras("pdf_pipeline_stage_duration_seconds_count", stage="pdf_parse", extractor="extract_aislado") == antes_parse + 1
+    assert muestras("pdf_pipeline_stage_duration_seconds_count", stage="regex_extraction", extractor="extract_aislado") >= 1
+    assert muestras("pdf_pipeline_pdf_pages_sum", extractor="extract_aislado") == antes_paginas + 3
+
+
+def test_isolated_extraction_is_included_in_document_profile(runner, tmp_path):
+    anterior = dict(profiler._settings)
+    configure_profiling(enabled=True, rate=1.0, extractors="", directory=tmp_path)
+    try:
+        with profile_document("a.pdf", "extract_aislado") as perfil:
+            runner.call(leer_paginas, (2,), 60, "extraction")
+    finally:
+        profiler._settings.update(anterior)
+
+    funciones = {nombre for (_, _, nombre) in pstats.Stats(str(perfil.output_path)).stats}
+    assert "leer_paginas" in funciones
@@ -0,0 +1,44 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+
+# Módulos que no deben cargarse al importar los puntos de entrada de la GUI.
+HEAVY_MODULES = ("pandas", "requests", "pika", "pdfplumber", "prometheus_client", "openpyxl", "xlsxwriter")
+
+# Presupuesto de import de main en milisegundos (mínimo de varias mediciones en procesos nuevos).
+IMPORT_BUDGET_MS = float(os.environ.get("FINEXTRACT_IMPORT_BUDGET_MS", "150"))
+REPETICIONES = 3
+
+
+def measure_import(module: str) -> tuple[float, list[str]]:
+    codigo = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"print(json.dumps({{'ms': elapsed * 1000, 'modules': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))\n"
+    )
+    resultado = subprocess.run([sys.executable, "-c", codigo], cwd=SRC_DIR, capture_output=True, text=True)
+    assert resultado.returncode == 0, f"No se pudo importar {module}: {resultado.stderr.strip()}"
+    datos = json.loads(resultado.stdout.strip().splitlines()[-1])
+    return datos["ms"], datos["modules"]
+
+
+def test_main_import_is_light_and_within_budget():
+    mediciones = [measure_import("main") for _ in range(REPETICIONES)]
+    pesados = sorted({m for _, modulos in mediciones for m in modulos})
+    assert not pesados, f"import main arrastra {', '.join(pesados)}"
+    ms = min(ms for ms, _ in mediciones)
+    assert ms <= IMPORT_BUDGET_MS, f"import main: {ms:.1f} ms (presupuesto {IMPORT_BUDGET_MS:.0f} ms)"
+
+
+@pytest.mark.parametrize("module", ["local_processor_service", "transport", "backpressure", "supervisor"])
+def test_pika_is_only_imported_on_first_use(module):
+    _, modulos = measure_import(module)
+    assert "pika" not in modulos
@@ -0,0 +1,171 @@
+import pytest
+
+from job_ledger import COMPLETED, ERROR, FILE_GENERATED, REJECTED, STARTED, SUBMITTED, TIMEOUT, JobLedger, allowed_transition
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    return JobLedger(tmp_path / "trabajos.sqlite")
+
+
+@pytest.fixture
+def pdfs(tmp_path):
+    def crear(*contenidos, carpeta="entrada"):
+        directorio = tmp_path / carpeta
+        directorio.mkdir(exist_ok=True)
+        rutas = []
+        for numero, contenido in enumerate(contenidos):
+            ruta = directorio / f"doc{numero}.pdf"
+            ruta.write_bytes(contenido)
+            rutas.append(ruta)
+        return rutas
+    return crear
+
+
+def estado(ledger, job_id):
+    return next(trabajo["estado"] for trabajo in ledger.jobs() if trabajo["job_id"] == job_id)
+
+
+def nuevo_trabajo(ledger, tmp_path, pdfs):
+    batch_id = ledger.create_batch(tmp_path / "salida")
+    return next(iter(ledger.submit(batch_id, pdfs(b"%PDF unico"), dedupe=None).values()))
+
+
+@pytest.mark.parametrize("actual, nuevo, permitido", [
+    (SUBMITTED, STARTED, True),
+    (STARTED, FILE_GENERATED, True),
+    (FILE_GENERATED, FILE_GENERATED, True),
+    (FILE_GENERATED, COMPLETED, True),
+    (STARTED, ERROR, True),
+    (ERROR, STARTED, True),
+    (COMPLETED, STARTED, False),
+    (COMPLETED, ERROR, False),
+    (TIMEOUT, COMPLETED, False),
+    (REJECTED, STARTED, False),
+    (FILE_GENERATED, STARTED, False),
+])
+def test_allowed_transition(actual, nuevo, permitido):
+    assert allowed_transition(actual, nuevo) is permitido
+
+
+def test_record_moves_job_forward(ledger, tmp_path, pdfs):
+    job_id = nuevo_trabajo(ledger, tmp_path, pdfs)
+    for siguiente in (STARTED, FILE_GENERATED, COMPLETED):
+        assert ledger.record(job_id, siguiente)
+    assert estado(ledger, job_id) == COMPLETED
+
+
+def test_late_event_does_not_move_finished_job_back(ledger, tmp_path, pdfs):
+    job_id = nuevo_trabajo(ledger, tmp_path, pdfs)
+    ledger.record(job_id, COMPLETED, generated_file="salida.xlsx")
+
+    assert not ledger.record(job_id, STARTED)
+    assert not ledger.record(job_id, ERROR, error="tardío")
+    assert estado(ledger, job_id) == COMPLETED
+    assert ledger.unfinished_jobs(ledger.jobs()[0]["batch_id"]) == []
+
+
+def test_requeued_error_can_be_retried(ledger, tmp_path, pdfs):
+    job_id = nuevo_trabajo(ledger, tmp_path, pdfs)
+    ledger.record(job_id, STARTED)
+    ledger.record(job_id, ERROR, error="falló")
+    assert ledger.record(job_id, STARTED)
+    assert ledger.record(job_id, COMPLETED)
+    assert estado(ledger, job_id) == COMPLETED
+
+
+def test_resubmitting_a_batch_resets_unfinished_jobs(ledger, tmp_path, pdfs):
+    batch_id = ledger.create_batch(tmp_path / "salida")
+    rutas = pdfs(b"%PDF uno", b"%PDF dos")
+    trabajos = ledger.submit(batch_id, rutas, dedupe=None)
+    primero, segundo = trabajos.values()
+    ledger.record(primero, COMPLETED)
+    ledger.record(segundo, ERROR, error="falló")
+
+    pendientes = ledger.unfinished_jobs(batch_id)
+    assert [trabajo["job_id"] for trabajo in pendientes] == [segundo]
+    assert ledger.submit(batch_id, [pendientes[0]["pdf_path"]], dedupe=None) == {pendientes[0]["pdf_path"]: segundo}
+    assert estado(ledger, segundo) == SUBMITTED
+
+
+def test_same_content_in_flight_is_attached_and_follows_primary(ledger, tmp_path, pdfs):
+    primero = pdfs(b"%PDF mismo", carpeta="a")[0]
+    segundo = pdfs(b"%PDF mismo", carpeta="b")[0]
+    principal = next(iter(ledger.submit(ledger.create_batch(tmp_path / "salida"), [primero]).values()))
+    adjunto = next(iter(ledger.submit(ledger.create_batch(tmp_path / "salida"), [segundo]).values()))
+
+    assert ledger.attached_to(adjunto) == principal
+    ledger.record(principal, COMPLETED, generated_file="salida.xlsx")
+    assert estado(ledger, adjunto) == COMPLETED
+    assert ledger.generated_files(adjunto) == ["salida.xlsx"]
+
+
+def test_no_attach_to_primary_with_other_output(ledger, tmp_path, pdfs):
+    primero = pdfs(b"%PDF mismo", carpeta="a")[0]
+    segundo = pdfs(b"%PDF mismo", carpeta="b")[0]
+    tercero = pdfs(b"%PDF mismo", carpeta="c")[0]
+    ledger.submit(ledger.create_batch(tmp_path / "salida_a"), [primero])
+
+    otra_carpeta = next(iter(ledger.submit(ledger.create_batch(tmp_path / "salida_b"), [segundo]).values()))
+    otros_formatos = next(iter(ledger.submit(ledger.create_batch(tmp_path / "salida_a", ["csv"]), [tercero]).values()))
+
+    assert ledger.attached_to(otra_carpeta) is None
+    assert ledger.attached_to(otros_formatos) is None
+
+
+def test_failed_primary_releases_attached_jobs(ledger, tmp_path, pdfs):
+    primero = pdfs(b"%PDF mismo", carpeta="a")[0]
+    segundo = pdfs(b"%PDF mismo", carpeta="b")[0]
+    principal = next(iter(ledger.submit(ledger.create_batch(tmp_path / "salida"), [primero]).values()))
+    lote_adjunto = ledger.create_batch(tmp_path / "salida")
+    adjunto = ledger.submit(lote_adjunto, [segundo])[str(segundo.resolve())]
+
+    ledger.record(principal, ERROR, error="falló")
+
+    assert estado(ledger, adjunto) == ERROR
+    assert ledger.attached_to(adjunto) is None
+    assert ledger.submit(lote_adjunto, [segundo]) == {str(segundo.resolve()): adjunto}
+    assert ledger.attached_to(adjunto) is None
+
+
+def test_resumed_primary_releases_attached_jobs_of_other_batches(ledger, tmp_path, pdfs):
+    primero = pdfs(b"%PDF mismo", carpeta="a")[0]
+    segundo = pdfs(b"%PDF mismo", carpeta="b")[0]
+    lote_principal = ledger.create_batch(tmp_path / "salida")
+    principal = ledger.submit(lote_principal, [primero])[str(primero.resolve())]
+    adjunto = next(iter(ledger.submit(ledger.create_batch(tmp_path / "salida"), [segundo]).values()))
+    ledger.record(principal, STARTED)
+
+    ledger.submit(lote_principal, [primero])
+
+    assert estado(ledger, principal) == SUBMITTED
+    assert estado(ledger, adjunto) == ERROR
+    assert ledger.attached_to(adjunto) is None
+
+
+def test_resumed_attached_job_does_not_reattach_to_stalled_primary(ledger, tmp_path, pdfs):
+    primero = pdfs(b"%PDF mismo", carpeta="a")[0]
+    segundo = pdfs(b"%PDF mismo", carpeta="b")[0]
+    principal = next(iter(ledger.submit(ledger.create_batch(tmp_path / "salida"), [primero]).values()))
+    lote_adjunto = ledger.create_batch(tmp_path / "salida")
+    adjunto = ledger.submit(lote_adjunto, [segundo])[str(segundo.resolve())]
+    ledger.record(principal, STARTED)
+
+    ledger.submit(lote_adjunto, [segundo])
+
+    assert ledger.attached_to(adjunto) is None
+    assert estado(ledger, principal) == STARTED
+
+
+def test_resumed_batch_keeps_duplicates_within_it_attached(ledger, tmp_path, pdfs):
+    primero = pdfs(b"%PDF mismo", carpeta="a")[0]
+    segundo = pdfs(b"%PDF mismo", carpeta="b")[0]
+    lote = ledger.create_batch(tmp_path / "salida", batch_mode="per_vendor")
+    trabajos = ledger.submit(lote, [primero, segundo], dedupe="batch")
+    principal, adjunto = trabajos[str(primero.resolve())], trabajos[str(segundo.resolve())]
+    assert ledger.attached_to(adjunto) == principal
+
+    ledger.submit(lote, [primero, segundo], dedupe="batch")
+
+    assert ledger.attached_to(adjunto) == principal
+    assert estado(ledger, adjunto) == SUBMITTED
@@ -0,0 +1,25 @@
+import logger
+from logger import add_log_fields, log_context, log_event
+
+
+class EscritorFalso:
+    def __init__(self):
+        self.registros = []
+
+    def submit(self, record):
+        self.registros.append(record)
+
+
+def test_queued_record_keeps_context_of_the_moment_it_was_logged(monkeypatch):
+    escritor = EscritorFalso()
+    monkeypatch.setitem(logger._settings, "async", True)
+    monkeypatch.setattr(logger, "_get_writer", lambda: escritor)
+
+    with log_context(documento="a.pdf"):
+        log_event("Detectando extractor")
+        add_log_fields(extractor="extract_GDU")
+        log_event("Extrayendo", etapa="extraction")
+
+    antes, despues = (registro[3] for registro in escritor.registros)
+    assert antes == {"documento": "a.pdf"}
+    assert despues == {"documento": "a.pdf", "extractor": "extract_GDU", "etapa": "extraction"}
@@ -0,0 +1,41 @@
+import pandas as pd
+
+import logger
+import output_sinks
+import tracing
+from logger import log_context
+from output_sinks import write_artifacts
+from tracing import root_span
+
+
+def documento():
+    return pd.DataFrame({"Referencia": ["A-0019127", "A-0010001"], "Monto": [100.0, 5.0]})
+
+
+def test_artifact_spans_belong_to_the_document_trace(tmp_path, monkeypatch):
+    monkeypatch.setitem(tracing._settings, "enabled", True)
+    monkeypatch.setattr(tracing, "get_trace_store", lambda: None)
+
+    with root_span("process_document", "test") as raiz:
+        write_artifacts(documento(), tmp_path, "a", ["csv", "ndjson"], "a.pdf", "extract_ops_macro")
+
+    hijos = {span.name: span for span in raiz.root_spans}
+    assert {"output", "write_csv", "write_ndjson", "validation"} <= set(hijos)
+    for nombre in ("write_csv", "write_ndjson", "validation"):
+        assert hijos[nombre].trace_id == raiz.trace_id
+        assert hijos[nombre].parent_id == hijos["output"].span_id
+
+
+def test_artifact_writers_keep_log_context(tmp_path, monkeypatch):
+    contextos = []
+    original = output_sinks._write_validation_file
+
+    def validar(*args):
+        contextos.append(dict(logger._context.get()))
+        return original(*args)
+
+    monkeypatch.setattr(output_sinks, "_write_validation_file", validar)
+    with log_context(document="a.pdf", job_id="j1"):
+        write_artifacts(documento(), tmp_path, "a", ["csv"], "a.pdf", "extract_ops_macro")
+
+    assert contextos == [{"document": "a.pdf", "job_id": "j1", "stage": "validation"}]
@@ -0,0 +1,54 @@
+import threading
+
+import pytest
+
+import profiler
+from profiler import configure_profiling, profile_document
+
+
+@pytest.fixture
+def perfilado(tmp_path):
+    anterior = dict(profiler._settings)
+    configure_profiling(enabled=True, rate=1.0, extractors="extract_GDU", directory=tmp_path)
+    yield tmp_path
+    profiler._settings.update(anterior)
+
+
+def test_filtered_extractor_is_not_profiled(perfilado):
+    with profile_document("a.pdf", "extract_tata") as perfil:
+        assert perfil._profiler is None
+    assert not list(perfilado.glob("*.prof"))
+
+
+def test_profile_is_dropped_when_detected_extractor_is_filtered(perfilado):
+    with profile_document("a.pdf") as perfil:
+        assert perfil._profiler is not None
+        perfil.set_extractor("extract_tata")
+        assert perfil._profiler is None
+    assert not list(perfilado.glob("*.prof"))
+
+
+def test_wanted_extractor_is_saved(perfilado):
+    with profile_document("a.pdf") as perfil:
+        perfil.set_extractor("extract_GDU")
+    assert perfil.output_path is not None and perfil.output_path.exists()
+
+
+def test_only_one_document_is_profiled_at_a_time(perfilado):
+    dentro = threading.Event()
+    salir = threading.Event()
+
+    def otro_hilo():
+        with profile_document("b.pdf", "extract_GDU"):
+            dentro.set()
+            salir.wait(5)
+
+    hilo = threading.Thread(target=otro_hilo)
+    hilo.start()
+    dentro.wait(5)
+    try:
+        with profile_document("a.pdf", "extract_GDU") as perfil:
+            assert perfil._profiler is None
+    finally:
+        salir.set()
+        hilo.join()
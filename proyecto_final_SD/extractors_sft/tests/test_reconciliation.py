@@ -0,0 +1,72 @@
+import pandas as pd
+
+from reconciliation import CONCILIADO, DIFERENCIA_MONTO, PARCIAL, SIN_PAGO, SIN_RETENCION, reconcile, reconcile_pair
+
+PAR = {"payments": "extract_ops_macro", "payment_amount": "Monto", "retentions": "extract_res_macro", "retention_amount": "Monto"}
+
+
+def movimientos(filas):
+    df = pd.DataFrame(filas, columns=["Documento", "Extractor", "Referencia", "Monto"])
+    df["Monto"] = df["Monto"].astype("Int64")
+    return df
+
+
+def estados(detalle):
+    return dict(zip(detalle["Referencia"], detalle["Estado"]))
+
+
+def test_reconcile_pair_states():
+    detalle = reconcile_pair(movimientos([
+        ("pago.pdf", "extract_ops_macro", "A-0010001", 10000),
+        ("ret.pdf", "extract_res_macro", "10001", 10001),
+        ("pago.pdf", "extract_ops_macro", "A-0010002", 10000),
+        ("ret.pdf", "extract_res_macro", "10002", 4000),
+        ("pago.pdf", "extract_ops_macro", "A-0010003", 10000),
+        ("ret.pdf", "extract_res_macro", "10003", 15000),
+        ("pago.pdf", "extract_ops_macro", "A-0010004", 10000),
+        ("ret.pdf", "extract_res_macro", "10005", 500),
+    ]), "macro", PAR, tolerance_cents=1)
+
+    assert estados(detalle) == {
+        "A-0010001": CONCILIADO,
+        "A-0010002": PARCIAL,
+        "A-0010003": DIFERENCIA_MONTO,
+        "A-0010004": SIN_RETENCION,
+        "10005": SIN_PAGO,
+    }
+    fila = detalle.set_index("Referencia").loc["A-0010002"]
+    assert fila["Diferencia"] == -6000
+    assert pd.isna(detalle.set_index("Referencia").loc["A-0010004", "Diferencia"])
+
+
+def test_reconcile_pair_sums_retentions_across_documents():
+    detalle = reconcile_pair(movimientos([
+        ("pago.pdf", "extract_ops_macro", "FA-0020001", 30000),
+        ("ret_enero.pdf", "extract_res_macro", "20001", 10000),
+        ("ret_febrero.pdf", "extract_res_macro", "A-20001", 20000),
+    ]), "macro", PAR)
+
+    assert len(detalle) == 1
+    fila = detalle.iloc[0]
+    assert fila["Estado"] == CONCILIADO
+    assert fila["Monto retención"] == 30000
+    assert fila["Documentos retención"] == "ret_enero.pdf | ret_febrero.pdf"
+
+
+def test_reconcile_pair_tolerance():
+    filas = [("pago.pdf", "extract_ops_macro", "30001", 10000), ("ret.pdf", "extract_res_macro", "30001", 10002)]
+    assert reconcile_pair(movimientos(filas), "macro", PAR, tolerance_cents=1)["Estado"].iloc[0] == DIFERENCIA_MONTO
+    assert reconcile_pair(movimientos(filas), "macro", PAR, tolerance_cents=2)["Estado"].iloc[0] == CONCILIADO
+
+
+def test_reconcile_summary_per_pair():
+    detalle, resumen = reconcile(movimientos([
+        ("pago.pdf", "extract_ops_macro", "40001", 100),
+        ("ret.pdf", "extract_res_macro", "40001", 100),
+        ("pago.pdf", "extract_ops_macro", "40002", 200),
+    ]), {"pairs": {"macro": PAR}})
+
+    assert len(detalle) == 2
+    resumen = resumen.set_index("Estado")
+    assert resumen.loc[CONCILIADO, "Referencias"] == 1
+    assert resumen.loc[SIN_RETENCION, "Monto pago"] == 200
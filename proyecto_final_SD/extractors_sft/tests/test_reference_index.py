@@ -0,0 +1,101 @@
+import pandas as pd
+import pytest
+
+import reference_index
+from batch_output import build_validation
+from output_sinks import write_artifacts
+from reference_index import ReferenceIndex, configure_reference_index
+from validator import validation_messages
+
+
+def documento(*filas):
+    return pd.DataFrame({"Referencia": [ref for ref, _ in filas], "Monto": [monto for _, monto in filas]})
+
+
+@pytest.fixture
+def indice(tmp_path):
+    return ReferenceIndex(tmp_path / "referencias.sqlite")
+
+
+@pytest.fixture
+def indice_activo(tmp_path):
+    anterior = dict(reference_index._settings)
+    configure_reference_index(enabled=True, path=tmp_path / "referencias.sqlite")
+    yield reference_index.get_reference_index()
+    reference_index._settings.update(anterior)
+
+
+def test_check_and_add_flags_reference_seen_in_other_document(indice):
+    assert indice.check_and_add(documento(("A-0019127", "100,00")), "enero.pdf", "extract_ops_macro") == []
+
+    previas = indice.check_and_add(documento(("FA-19127", "100,00"), ("A-0010001", "5,00")), "febrero.pdf", "extract_ops_macro")
+
+    assert len(previas) == 1
+    assert previas[0]["referencia"] == "FA-19127"
+    assert previas[0]["referencia_previa"] == "A-0019127"
+    assert previas[0]["documento_previo"] == "enero.pdf"
+    assert previas[0]["monto"] == previas[0]["monto_previo"] == 10000
+
+
+def test_check_and_add_only_matches_same_extractor(indice):
+    indice.check_and_add(documento(("A-0019127", "100,00")), "enero.pdf", "extract_ops_macro")
+    assert indice.check_and_add(documento(("A-0019127", "100,00")), "enero_tata.pdf", "extract_tata") == []
+
+
+def test_reprocessing_a_document_replaces_its_rows_and_does_not_flag_itself(indice):
+    indice.check_and_add(documento(("A-0019127", "100,00"), ("A-0010001", "5,00")), "enero.pdf", "extract_ops_macro")
+
+    # Mismo PDF con otro resultado (por ejemplo, un extractor corregido): no se compara contra su versión anterior.
+    assert indice.check_and_add(documento(("A-0019127", "100,00")), "enero.pdf", "extract_ops_macro") == []
+    assert indice.stats()["documentos"] == 1
+    assert indice.stats()["referencias"] == 1
+    assert indice.lookup("A-0010001") == []
+
+
+def test_same_content_under_other_name_is_flagged(indice):
+    indice.check_and_add(documento(("A-0019127", "100,00")), "enero.pdf", "extract_ops_macro")
+    previas = indice.check_and_add(documento(("A-0019127", "100,00")), "enero (copia).pdf", "extract_ops_macro")
+    assert [p["documento_previo"] for p in previas] == ["enero.pdf"]
+
+
+def test_check_does_not_write(indice):
+    indice.check_and_add(documento(("A-0019127", "100,00")), "enero.pdf", "extract_ops_macro")
+
+    previas = indice.check(documento(("A-0019127", "90,00")), "febrero.pdf", "extract_ops_macro")
+
+    assert [(p["monto"], p["monto_previo"]) for p in previas] == [(9000, 10000)]
+    assert indice.stats()["documentos"] == 1
+
+
+def test_validation_does_not_write_to_index(indice_activo):
+    mensajes = validation_messages(documento(("A-0019127", "100,00")), "enero.pdf", "extract_ops_macro")
+    assert not any("ya registrada" in mensaje for mensaje in mensajes)
+    assert indice_activo.stats()["documentos"] == 0
+
+
+def test_document_is_indexed_after_its_output_is_written(indice_activo, tmp_path):
+    generados, _ = write_artifacts(documento(("A-0019127", 100.0)), tmp_path, "enero", ["csv"], "enero.pdf", "extract_ops_macro")
+
+    assert generados
+    assert [fila["documento"] for fila in indice_activo.lookup("A-0019127")] == ["enero.pdf"]
+
+
+def test_failed_output_is_not_indexed(indice_activo, tmp_path, monkeypatch):
+    import output_sinks
+
+    monkeypatch.setitem(output_sinks.COLUMNAR_WRITERS, "csv", lambda frame, path: False)
+    generados, _ = write_artifacts(documento(("A-0019127", 100.0)), tmp_path, "enero", ["csv"], "enero.pdf", "extract_ops_macro")
+
+    assert generados == []
+    assert indice_activo.stats()["documentos"] == 0
+
+
+def test_batch_validation_flags_references_repeated_within_the_batch(indice_activo):
+    validacion = build_validation([
+        ("enero.pdf", "extract_ops_macro", documento(("A-0019127", "100,00"))),
+        ("febrero.pdf", "extract_ops_macro", documento(("FA-19127", "100,00"))),
+    ])
+
+    assert list(validacion["Documento"]) == ["febrero.pdf"]
+    assert validacion["Validación"].iloc[0] == "Referencia FA-19127 también aparece en enero.pdf (mismo lote)"
+    assert indice_activo.stats()["documentos"] == 0
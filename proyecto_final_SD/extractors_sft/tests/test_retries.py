@@ -0,0 +1,72 @@
+import json
+import threading
+
+import pytest
+
+import local_processor_service
+from transport import STATUS_QUEUE_NAME, LocalTransport, job_queue_name
+
+COLA = job_queue_name("extract_GDU")
+
+
+def extractor_que_falla(pdf_path):
+    raise ValueError("tabla ilegible")
+
+
+@pytest.fixture
+def servicio(tmp_path, monkeypatch):
+    transport = LocalTransport()
+    pdf = tmp_path / "input" / "enero.pdf"
+    pdf.parent.mkdir()
+    pdf.write_bytes(b"%PDF-1.4")
+    monkeypatch.setattr(local_processor_service, "get_transport", lambda: transport)
+    monkeypatch.setattr(local_processor_service, "is_local", lambda extractor_name: True)
+    monkeypatch.setattr(local_processor_service, "load_extractor", lambda extractor_name: extractor_que_falla)
+    monkeypatch.setattr(local_processor_service, "run_with_deadline", lambda func, args, *rest: func(*args))
+    monkeypatch.setenv(local_processor_service.MAX_ATTEMPTS_ENV_VAR, "3")
+    yield transport, pdf
+    transport.close()
+
+
+def eventos_de_estado(transport):
+    eventos = []
+    transport.drain(STATUS_QUEUE_NAME, lambda body, headers: eventos.append(json.loads(body)))
+    return eventos
+
+
+def consumir_hasta_vaciar(transport, redelivered=False):
+    stop = threading.Event()
+
+    def callback(ch, method, properties, body):
+        if redelivered:
+            method.redelivered = True
+        local_processor_service.handle_message(ch, method, properties, body)
+        if not transport.queue_stats(COLA)[0]:
+            stop.set()
+
+    hilo = threading.Thread(target=transport.consume, args=(COLA, callback, stop))
+    hilo.start()
+    hilo.join(5)
+    assert not hilo.is_alive()
+
+
+def test_failing_document_is_retried_until_the_cap_and_then_acked(servicio):
+    transport, pdf = servicio
+    transport.publish(COLA, json.dumps({"pdf_path": str(pdf), "extractor_name": "extract_GDU", "pages": 1, "job_id": "job-1"}), {"traceparent": "t1"})
+
+    consumir_hasta_vaciar(transport)
+
+    eventos = eventos_de_estado(transport)
+    assert [(e["type"], e["attempt"]) for e in eventos] == [("pdf_processing_retry", 1), ("pdf_processing_retry", 2), ("pdf_processing_error", 3)]
+    assert eventos[-1]["error_message"] == "tabla ilegible"
+    assert transport.queue_stats(COLA) == (0, 0)
+
+
+def test_redelivery_by_the_broker_counts_as_an_attempt(servicio):
+    transport, pdf = servicio
+    headers = {local_processor_service.ATTEMPT_HEADER: 1}
+    transport.publish(COLA, json.dumps({"pdf_path": str(pdf), "extractor_name": "extract_GDU", "pages": 1}), headers)
+
+    consumir_hasta_vaciar(transport, redelivered=True)
+
+    assert [e["type"] for e in eventos_de_estado(transport)] == ["pdf_processing_error"]
@@ -0,0 +1,84 @@
+import shutil
+import time
+
+import pytest
+
+import supervisor
+from supervisor import Supervisor
+from worker_status import WorkerStatusReporter
+
+
+class ProcesoFalso:
+    def __init__(self, pid: int, exit_code: int = None):
+        self.pid = pid
+        self.exit_code = exit_code
+
+    def poll(self):
+        return self.exit_code
+
+
+@pytest.fixture
+def sup(monkeypatch):
+    monkeypatch.setattr(supervisor, "job_queue_stats", lambda extractores: (0, 1))
+    instancia = Supervisor({"min_workers": 1, "max_workers": 4, "scale_down_cooldown_seconds": 0, "restart_backoff_seconds": 60})
+    iniciados = []
+
+    def spawn(reason):
+        worker_id = f"n{len(iniciados) + 1}"
+        iniciados.append(reason)
+        instancia.workers[worker_id] = ProcesoFalso(1000 + len(iniciados))
+        return worker_id
+
+    monkeypatch.setattr(instancia, "spawn", spawn)
+    instancia.iniciados = iniciados
+    yield instancia
+    shutil.rmtree(instancia.status_dir, ignore_errors=True)
+
+
+def test_message_age_is_reset_when_worker_goes_idle(tmp_path):
+    reporter = WorkerStatusReporter(str(tmp_path), "w1")
+    reporter.begin(time.time() - 30)
+    assert reporter.state["last_message_age_seconds"] >= 30
+    reporter.end()
+    assert reporter.state["last_message_age_seconds"] is None
+
+
+def test_worker_without_status_is_starting_and_not_retired(sup):
+    sup.workers = {"w1": ProcesoFalso(1), "w2": ProcesoFalso(2)}
+    WorkerStatusReporter(str(sup.status_dir), "w1").ready()
+    retirados = []
+    sup.retire = lambda worker_id, reason: retirados.append(worker_id)
+
+    observation = sup.observe()
+    assert observation["idle_workers"] == ["w1"]
+    assert observation["starting_workers"] == ["w2"]
+
+    sup._last_busy = {"w1": 0.0}
+    sup.evaluate()
+    assert retirados == ["w1"]
+
+
+def test_only_starting_workers_are_never_retired(sup):
+    sup.workers = {"w1": ProcesoFalso(1), "w2": ProcesoFalso(2)}
+    retirados = []
+    sup.retire = lambda worker_id, reason: retirados.append(worker_id)
+    sup.evaluate()
+    sup.evaluate()
+    assert retirados == []
+
+
+def test_reap_defers_restarts_within_backoff_without_sleeping(sup):
+    sup.workers = {"w1": ProcesoFalso(1, exit_code=1), "w2": ProcesoFalso(2, exit_code=1)}
+
+    inicio = time.monotonic()
+    sup.reap()
+
+    assert time.monotonic() - inicio < 1
+    assert sup.iniciados == ["reinicio"]
+    assert sup._pending_restarts == 1
+    assert sup.worker_count() == 2
+
+    sup._last_restart -= 60
+    sup.reap()
+    assert sup.iniciados == ["reinicio", "reinicio"]
+    assert sup._pending_restarts == 0
@@ -0,0 +1,221 @@
+import json
+import threading
+import time
+
+import pytest
+from prometheus_client import REGISTRY
+
+from backpressure import job_queue_stats
+from transport import LEGACY_JOB_QUEUE_NAME, STATUS_QUEUE_NAME, LocalTransport, job_queue_name, reroute_legacy_jobs
+
+COLA = job_queue_name("extract_GDU")
+
+
+def consume_until(transport, queue_names, cantidad, handler=None):
+    recibidos = []
+    stop = threading.Event()
+
+    def callback(ch, method, properties, body):
+        recibidos.append((method.routing_key, body))
+        (handler or (lambda ch, method: ch.basic_ack(method.delivery_tag)))(ch, method)
+        if len(recibidos) >= cantidad:
+            stop.set()
+
+    hilo = threading.Thread(target=transport.consume, args=(queue_names, callback, stop))
+    hilo.start()
+    hilo.join(5)
+    assert not hilo.is_alive()
+    return recibidos
+
+
+@pytest.fixture
+def transport():
+    transport = LocalTransport(status_queue_size=3)
+    yield transport
+    transport.close()
+
+
+def test_worker_only_receives_jobs_of_its_extractors(transport):
+    transport.publish(job_queue_name("extract_tata"), "tata")
+    transport.publish(job_queue_name("extract_GDU"), "gdu-1")
+    transport.publish(job_queue_name("extract_GDU"), "gdu-2")
+
+    recibidos = consume_until(transport, [job_queue_name("extract_GDU")], 2)
+
+    assert recibidos == [(job_queue_name("extract_GDU"), "gdu-1"), (job_queue_name("extract_GDU"), "gdu-2")]
+    assert transport.queue_stats(job_queue_name("extract_tata")) == (1, 0)
+
+
+def test_consumer_of_several_queues_alternates_between_them(transport):
+    for numero in range(2):
+        transport.publish(job_queue_name("extract_GDU"), f"gdu-{numero}")
+        transport.publish(job_queue_name("extract_tata"), f"tata-{numero}")
+
+    recibidos = consume_until(transport, [job_queue_name("extract_GDU"), job_queue_name("extract_tata")], 4)
+
+    assert [body for _, body in recibidos] == ["gdu-0", "tata-0", "gdu-1", "tata-1"]
+
+
+def test_publish_and_consume_keeps_body_and_headers(transport):
+    headers = {"traceparent": "00-abc-def-01"}
+    transport.publish(COLA, "mensaje", headers)
+    headers["traceparent"] = "modificado"
+    recibidos = []
+    stop = threading.Event()
+
+    def callback(ch, method, properties, body):
+        recibidos.append((body, properties.headers, method.redelivered))
+        ch.basic_ack(method.delivery_tag)
+        stop.set()
+
+    transport.consume(COLA, callback, stop)
+
+    assert recibidos == [("mensaje", {"traceparent": "00-abc-def-01"}, False)]
+    assert transport.queue_stats(COLA) == (0, 0)
+
+
+def test_nack_with_requeue_redelivers_at_the_front(transport):
+    transport.publish(COLA, "a")
+    transport.publish(COLA, "b")
+    entregas = []
+
+    def nack_primera_vez(ch, method):
+        entregas.append(method.redelivered)
+        if len(entregas) == 1:
+            ch.basic_nack(method.delivery_tag, requeue=True)
+        else:
+            ch.basic_ack(method.delivery_tag)
+
+    recibidos = consume_until(transport, COLA, 3, nack_primera_vez)
+
+    assert [body for _, body in recibidos] == ["a", "a", "b"]
+    assert entregas == [False, True, False]
+
+
+def test_nack_without_requeue_discards(transport):
+    transport.publish(COLA, "a")
+    consume_until(transport, COLA, 1, lambda ch, method: ch.basic_nack(method.delivery_tag, requeue=False))
+    assert transport.queue_stats(COLA) == (0, 0)
+
+
+def test_unacked_messages_are_requeued_when_consumer_stops(transport):
+    transport.publish(COLA, "a")
+    transport.publish(COLA, "b")
+
+    # El worker deja de consumir sin confirmar (ej. se recicla): el mensaje vuelve a la cola.
+    consume_until(transport, COLA, 1, lambda ch, method: ch.stop_consuming())
+    assert transport.queue_stats(COLA) == (2, 0)
+
+    entregas = []
+
+    def confirmar(ch, method):
+        entregas.append(method.redelivered)
+        ch.basic_ack(method.delivery_tag)
+
+    consume_until(transport, COLA, 2, confirmar)
+    assert entregas == [True, False]
+
+
+@pytest.mark.parametrize("prefetch", [1, 2])
+def test_prefetch_limits_unacked_messages(transport, prefetch):
+    for numero in range(3):
+        transport.publish(COLA, f"m{numero}")
+    recibidos = []
+    pendientes = []
+    entregados = threading.Semaphore(0)
+    stop = threading.Event()
+
+    def callback(ch, method, properties, body):
+        recibidos.append(body)
+        pendientes.append((ch, method.delivery_tag))
+        entregados.release()
+
+    hilo = threading.Thread(target=transport.consume, args=(COLA, callback, stop, prefetch))
+    hilo.start()
+    try:
+        for _ in range(prefetch):
+            assert entregados.acquire(timeout=5)
+        assert not entregados.acquire(timeout=0.3)
+        assert recibidos == [f"m{numero}" for numero in range(prefetch)]
+        assert transport.queue_stats(COLA) == (3 - prefetch, 1)
+
+        ch, delivery_tag = pendientes.pop(0)
+        ch.basic_ack(delivery_tag)
+        assert entregados.acquire(timeout=5)
+        assert recibidos[-1] == f"m{prefetch}"
+    finally:
+        stop.set()
+        hilo.join(5)
+    assert not hilo.is_alive()
+    # Lo que quedó sin confirmar al parar vuelve a la cola.
+    assert transport.queue_stats(COLA) == (len(pendientes) + 3 - len(recibidos), 0)
+
+
+def test_queue_stats_counts_depth_and_consumers(transport):
+    assert transport.queue_stats(COLA) == (0, 0)
+    transport.publish(COLA, "a")
+    transport.publish(COLA, "b")
+    stop = threading.Event()
+    hilo = threading.Thread(target=transport.consume, args=(job_queue_name("extract_tata"), lambda *args: None, stop))
+    hilo.start()
+    try:
+        for _ in range(50):
+            if transport.queue_stats(job_queue_name("extract_tata"))[1]:
+                break
+            time.sleep(0.02)
+        assert transport.queue_stats(job_queue_name("extract_tata")) == (0, 1)
+        assert transport.queue_stats(COLA) == (2, 0)
+    finally:
+        stop.set()
+        hilo.join(5)
+    assert transport.queue_stats(job_queue_name("extract_tata")) == (0, 0)
+
+
+def test_status_queue_drops_oldest_events_when_full(transport):
+    descartados = REGISTRY.get_sample_value("pdf_pipeline_transport_messages_dropped_total", {"queue": STATUS_QUEUE_NAME}) or 0
+    for numero in range(5):
+        transport.publish(STATUS_QUEUE_NAME, f"evento-{numero}")
+        transport.publish(COLA, f"trabajo-{numero}")
+
+    # Solo la cola de estado es acotada: los trabajos nunca se descartan.
+    assert transport.queue_stats(STATUS_QUEUE_NAME) == (3, 0)
+    assert transport.queue_stats(COLA) == (5, 0)
+    assert REGISTRY.get_sample_value("pdf_pipeline_transport_messages_dropped_total", {"queue": STATUS_QUEUE_NAME}) == descartados + 2
+    assert [body for _, body in consume_until(transport, STATUS_QUEUE_NAME, 3)] == ["evento-2", "evento-3", "evento-4"]
+
+
+def test_status_queue_never_drops_persistent_events(transport):
+    transport.publish(STATUS_QUEUE_NAME, "completed-1", persistent=True)
+    for numero in range(3):
+        transport.publish(STATUS_QUEUE_NAME, f"started-{numero}")
+    transport.publish(STATUS_QUEUE_NAME, "completed-2", persistent=True)
+    transport.publish(STATUS_QUEUE_NAME, "completed-3", persistent=True)
+    transport.publish(STATUS_QUEUE_NAME, "started-3")
+
+    # Se descartan los no persistentes más viejos y, con la cola llena de persistentes, el nuevo; los terminales pasan del tope.
+    assert [body for _, body in consume_until(transport, STATUS_QUEUE_NAME, 3)] == ["completed-1", "completed-2", "completed-3"]
+    assert transport.queue_stats(STATUS_QUEUE_NAME) == (0, 0)
+
+
+def test_legacy_queue_jobs_are_rerouted_to_their_extractor_queue(transport):
+    transport.publish(LEGACY_JOB_QUEUE_NAME, json.dumps({"pdf_path": "a.pdf", "extractor_name": "extract_GDU"}), {"traceparent": "t1"})
+    transport.publish(LEGACY_JOB_QUEUE_NAME, json.dumps({"pdf_path": "b.pdf", "extractor_name": "extract_tata"}))
+    transport.publish(LEGACY_JOB_QUEUE_NAME, "no es json")
+
+    assert reroute_legacy_jobs(transport) == 2
+
+    assert transport.queue_stats(LEGACY_JOB_QUEUE_NAME) == (0, 0)
+    recibidos = []
+    transport.drain(COLA, lambda body, headers: recibidos.append((json.loads(body)["pdf_path"], headers)))
+    assert recibidos == [("a.pdf", {"traceparent": "t1"})]
+    assert transport.queue_stats(job_queue_name("extract_tata")) == (1, 0)
+    assert reroute_legacy_jobs(transport) == 0
+
+
+def test_job_queue_stats_sums_depth_of_the_served_queues(transport, monkeypatch):
+    monkeypatch.setattr("backpressure.get_transport", lambda: transport)
+    transport.publish(job_queue_name("extract_GDU"), "a")
+    transport.publish(job_queue_name("extract_tata"), "b")
+    transport.publish(job_queue_name("extract_bowerey"), "c")
+
+    assert job_queue_stats(["extract_GDU", "extract_tata"]) == (2, 0)
@@ -3,17 +3,30 @@ import pandas as pd
 import pdfplumber
 import io
 from pathlib import Path
-import pika
 import json
 import datetime
+import time
+import sys
 
 from prometheus_client import Counter, Gauge, generate_latest, Histogram, make_wsgi_app
 from werkzeug.middleware.dispatcher import DispatcherMiddleware
 
+# El perfilado por documento es el de extractors_sft/src/profiler.py: mismas variables FINEXTRACT_PROFILE*,
+# mismo filtro por extractor y un solo documento perfilado a la vez aunque Flask atienda con varios hilos.
+EXTRACTORS_SFT_SRC = Path(__file__).resolve().parent.parent / "extractors_sft" / "src"
+if str(EXTRACTORS_SFT_SRC) not in sys.path:
+    sys.path.insert(0, str(EXTRACTORS_SFT_SRC))
+from profiler import configure_profiling, profile_document, profiling_status
+from job_ledger import PERSISTENT_EVENTS
+from main import load_config
+from transport import LOCAL_BACKEND, STATUS_QUEUE_NAME, configure_transport, get_transport
+
 app = Flask(__name__)
 
-RABBITMQ_HOST = 'localhost'
-RABBITMQ_STATUS_QUEUE_NAME = 'system_status_queue'
+# Mismo transporte que main y el servicio local: bloque "transport" de config.json, con prioridad de las variables
+# FINEXTRACT_TRANSPORT y FINEXTRACT_RABBITMQ_HOST. Con el transporte local las colas viven dentro del proceso de
+# main/GUI, que ya publica los eventos de estado de los documentos que manda acá; este servicio no publica.
+PUBLISH_STATUS_EVENTS = configure_transport(load_config().get("transport"))["backend"] != LOCAL_BACKEND
 
 HENDERSON_PDF_PROCESSING_TOTAL = Counter(
     'henderson_pdf_processing_total',
@@ -36,15 +49,39 @@ HENDERSON_PROCESSING_DURATION_SECONDS = Histogram(
     'Duración del procesamiento de PDF por el microservicio Henderson en segundos.'
 )
 
+HENDERSON_STAGE_DURATION_SECONDS = Histogram(
+    'henderson_pdf_stage_duration_seconds',
+    'Duración de cada etapa del microservicio Henderson (pdf_parse, row_extraction, publish_status, serialization) en segundos.',
+    ['stage'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+
+HENDERSON_PDF_PAGES = Histogram(
+    'henderson_pdf_pages',
+    'Cantidad de páginas por PDF procesado por el microservicio Henderson.',
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+)
+
+HENDERSON_EXTRACTED_ROWS = Histogram(
+    'henderson_pdf_extracted_rows',
+    'Cantidad de filas extraídas por PDF por el microservicio Henderson.',
+    buckets=(0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+)
+
 app.wsgi_app = DispatcherMiddleware(app.wsgi_app, {
     '/metrics': make_wsgi_app()
 })
 
 def extract_henderson_logic(pdf_content_bytes: bytes) -> pd.DataFrame:
     rows = []
+    start_time = time.perf_counter()
+    parse_seconds = 0.0
     with pdfplumber.open(io.BytesIO(pdf_content_bytes)) as pdf:
+        HENDERSON_PDF_PAGES.observe(len(pdf.pages))
         for page in pdf.pages:
+            parse_start = time.perf_counter()
             table = page.extract_table()
+            parse_seconds += time.perf_counter() - parse_start
             if not table:
                 continue
 
@@ -58,31 +95,48 @@ def extract_henderson_logic(pdf_content_bytes: bytes) -> pd.DataFrame:
                         rows.append({"Referencia": numero, "Monto": monto_float})
                     except ValueError:
                         continue
+
+    HENDERSON_STAGE_DURATION_SECONDS.labels(stage='pdf_parse').observe(parse_seconds)
+    HENDERSON_STAGE_DURATION_SECONDS.labels(stage='row_extraction').observe(max(time.perf_counter() - start_time - parse_seconds, 0.0))
+    HENDERSON_EXTRACTED_ROWS.observe(len(rows))
     return pd.DataFrame(rows)
 
-def publish_status_event(event_type: str, pdf_path: str, extractor_name: str = "call_henderson_microservice", error_message: str = None):
+def trace_fields(traceparent: str, started_at: float) -> dict:
+    # El header traceparent (W3C) lo manda main; los eventos llevan la misma traza que el resto del documento.
+    partes = (traceparent or "").split("-")
+    if len(partes) != 4 or len(partes[1]) != 32:
+        return {}
+    return {"trace_id": partes[1], "traceparent": traceparent, "duration_seconds": round(time.perf_counter() - started_at, 6)}
+
+def publish_status_event(event_type: str, pdf_path: str, extractor_name: str = "call_henderson_microservice", error_message: str = None, trace: dict = None):
+    if not PUBLISH_STATUS_EVENTS:
+        return
+    start_time = time.perf_counter()
     try:
         event_payload = {
             "type": event_type,
             "pdf_path": pdf_path,
             "extractor_name": extractor_name,
             "timestamp": datetime.datetime.now().isoformat(),
+            **(trace or {}),
         }
         if error_message:
             event_payload['error_message'] = error_message
 
-        connection = pika.BlockingConnection(pika.ConnectionParameters(host=RABBITMQ_HOST))
-        channel = connection.channel()
-        channel.queue_declare(queue=RABBITMQ_STATUS_QUEUE_NAME, durable=True)
-        channel.basic_publish(
-            exchange='',
-            routing_key=RABBITMQ_STATUS_QUEUE_NAME,
-            body=json.dumps(event_payload)
-        )
-        connection.close()
+        get_transport().publish(STATUS_QUEUE_NAME, json.dumps(event_payload), persistent=event_type in PERSISTENT_EVENTS)
         print(f"DEBUG Henderson: Publicado evento '{event_type}' para PDF: {pdf_path}")
     except Exception as e:
-        print(f"ERROR: No se pudo publicar evento de estado desde el microservicio Henderson a la cola '{RABBITMQ_STATUS_QUEUE_NAME}': {e}")
+        print(f"ERROR: No se pudo publicar evento de estado desde el microservicio Henderson a la cola '{STATUS_QUEUE_NAME}': {e}")
+    finally:
+        HENDERSON_STAGE_DURATION_SECONDS.labels(stage='publish_status').observe(time.perf_counter() - start_time)
+
+
+@app.route('/profiling', methods=['GET', 'POST'])
+def profiling_toggle():
+    if request.method == 'POST':
+        body = request.get_json(silent=True) or {}
+        configure_profiling(enabled=body.get('enabled'), rate=body.get('rate'), extractors=body.get('extractors'))
+    return jsonify(profiling_status()), 200
 
 
 @app.route('/extract/henderson', methods=['POST'])
@@ -91,6 +145,8 @@ def extract_henderson_api():
         return jsonify({"error": "No se proporcionó archivo PDF"}), 400
 
     pdf_identifier_for_events = request.form.get('pdf_original_path')
+    traceparent = request.headers.get('traceparent')
+    started_at = time.perf_counter()
 
     if not pdf_identifier_for_events:
         pdf_identifier_for_events = request.files['pdf_file'].filename
@@ -104,21 +160,24 @@ def extract_henderson_api():
     if pdf_file and pdf_file.filename.endswith('.pdf'):
         with HENDERSON_PROCESSING_DURATION_SECONDS.time():
             try:
-                publish_status_event("pdf_processing_started", pdf_identifier_for_events, "call_henderson_microservice")
+                publish_status_event("pdf_processing_started", pdf_identifier_for_events, "call_henderson_microservice", trace=trace_fields(traceparent, started_at))
 
-                df = extract_henderson_logic(pdf_file.read())
+                with profile_document(pdf_file.filename, "extract_henderson"):
+                    df = extract_henderson_logic(pdf_file.read())
 
                 HENDERSON_PDF_PROCESSING_TOTAL.labels(status='completed').inc()
                 HENDERSON_PDF_COMPLETED_TOTAL.inc()
 
-                publish_status_event("pdf_processing_completed", pdf_identifier_for_events, "call_henderson_microservice")
-                return jsonify(df.to_dict(orient='records')), 200
+                publish_status_event("pdf_processing_completed", pdf_identifier_for_events, "call_henderson_microservice", trace=trace_fields(traceparent, started_at))
+                with HENDERSON_STAGE_DURATION_SECONDS.labels(stage='serialization').time():
+                    response = jsonify(df.to_dict(orient='records'))
+                return response, 200
             except Exception as e:
                 error_msg = f"Error al procesar el PDF: {str(e)}"
                 HENDERSON_PDF_PROCESSING_TOTAL.labels(status='error').inc()
                 HENDERSON_PDF_ERROR_TOTAL.inc()
 
-                publish_status_event("pdf_processing_error", pdf_identifier_for_events, "call_henderson_microservice", error_msg)
+                publish_status_event("pdf_processing_error", pdf_identifier_for_events, "call_henderson_microservice", error_msg, trace=trace_fields(traceparent, started_at))
                 return jsonify({"error": error_msg}), 500
     else:
         return jsonify({"error": "Tipo de archivo no soportado. Se esperaba un archivo PDF."}), 400